@@ -1,9 +1,7 @@
 class Jso(dict):
     def __init__(self,*args):
         assert(len(args) < 2)
-        dic = args[0] if args else {}
-        for k,v in dic.iteritems():
-            self[k] = v
+        dict.__init__(self,*args)
 
     def __getattr__(self,value):
         return self[value] if value in self else None
@@ -0,0 +1,215 @@
+"""Throughput and latency of RedisClient against a local RESP server.
+
+    python -m tornado_redis.benchmarks.client_bench [--out results.json]
+        [--baseline previous.json] [--ops 5000] [--redis host:port]
+
+By default it starts the testing.RespServer stand-in in a child process
+on --port, so no Redis is needed; --redis points it at a real server
+instead. The stand-in is pure Python and usually the bottleneck, so its
+numbers are for comparing client versions, not for absolute figures.
+Every workload (set, get, mget, hgetall, pipeline, pubsub) runs
+at each concurrency level (commands kept in flight) and value size, and
+reports ops/s, p50/p99 latency in milliseconds and bytes on the wire per
+op. Pipeline ops are the individual commands of 10-command pipelines
+and its latency is per pipeline; pub/sub latency runs from PUBLISH to
+the subscriber receiving the message.
+
+Results are written as JSON with --out. Given --baseline, each result
+is compared with the matching one from an earlier run and throughput
+drops or p99 increases beyond --tolerance are flagged.
+"""
+from tornado_redis.client import RedisClient
+from tornado_redis.metrics import Histogram
+from tornado_redis.testing import ServerProcess
+from tornado.ioloop import IOLoop
+import argparse
+import itertools
+import json
+import platform
+import time
+
+WORKLOADS = ("set","get","mget","hgetall","pipeline","pubsub")
+CONCURRENCY = (1,16,64)
+VALUE_SIZES = (16,1024,16384)
+
+MGET_KEYS = 10
+HASH_FIELDS = 10
+PIPELINE_DEPTH = 10
+KEYS = 100
+CHANNEL = "bench:channel"
+
+def connect(options):
+    io_loop = IOLoop.instance()
+    client = RedisClient(options.port,options.host,parser=options.parser)
+    client.on("ready",io_loop.stop)
+    io_loop.start()
+    return client
+
+def close(client):
+    client.closing = True
+    client.end()
+    if client.stream.socket:
+        client.stream.close()
+
+def run_loop(io_loop,setup):
+    """Runs the IOLoop until `setup(done)` has called done()."""
+    setup(io_loop.stop)
+    io_loop.start()
+
+def ignore(reply,error=None):
+    pass
+
+def preload(client,size):
+    value = "x" * size
+    fields = list(itertools.chain.from_iterable(("f%d" % i,value) for i in xrange(HASH_FIELDS)))
+    pipeline = client.pipeline()
+    for i in xrange(KEYS):
+        pipeline.set("bench:%d" % i,value)
+    pipeline.hmset(*(["bench:hash"] + fields))
+    run_loop(IOLoop.instance(),lambda done: pipeline.execute(lambda replies,error=None: done()))
+
+def make_issue(workload,client,size):
+    """Returns issue(callback), which sends one operation, and the commands it counts as."""
+    value = "x" * size
+    keys = itertools.cycle(["bench:%d" % i for i in xrange(KEYS)])
+    if workload == "set":
+        return lambda callback: client.set(next(keys),value,callback),1
+    if workload == "get":
+        return lambda callback: client.get(next(keys),callback),1
+    if workload == "mget":
+        return lambda callback: client.mget(*([next(keys) for i in xrange(MGET_KEYS)] + [callback])),1
+    if workload == "hgetall":
+        return lambda callback: client.hgetall("bench:hash",callback),1
+    if workload == "pipeline":
+        def issue(callback):
+            pipeline = client.pipeline()
+            for i in xrange(PIPELINE_DEPTH):
+                pipeline.set(next(keys),value)
+            pipeline.execute(callback)
+        return issue,PIPELINE_DEPTH
+    raise ValueError(workload)
+
+def run(options,workload,concurrency,size):
+    io_loop = IOLoop.instance()
+    client = connect(options)
+    clients = [client]
+    if workload in ("get","mget","hgetall"):
+        preload(client,size)
+
+    if workload == "pubsub":
+        subscriber = connect(options)
+        clients.append(subscriber)
+        subscriber.on("subscribe",lambda *args: io_loop.stop())
+        subscriber.subscribe(CHANNEL)
+        io_loop.start()
+        pending = {}
+        ids = itertools.count()
+        payload = "x" * size
+        def on_message(channel,message):
+            pending.pop(message[:message.index(":")])()
+        subscriber.on("message",on_message)
+        def issue(callback):
+            id = str(next(ids))
+            pending[id] = callback
+            client.publish(CHANNEL,id + ":" + payload,ignore)
+        weight = 1
+    else:
+        issue,weight = make_issue(workload,client,size)
+
+    rounds = max(options.ops // weight,concurrency)
+    histogram = Histogram()
+    state = {"started": 0,"finished": 0}
+    before = sum(c.stream.bytes_written + c.stream.bytes_read for c in clients)
+
+    def start(done):
+        state["started"] += 1
+        sent_at = time.time()
+        issue(lambda *args,**kwargs: finish(done,sent_at))
+
+    def finish(done,sent_at):
+        histogram.record(time.time() - sent_at)
+        state["finished"] += 1
+        if state["started"] < rounds:
+            start(done)
+        elif state["finished"] == rounds:
+            done()
+
+    def setup(done):
+        for i in xrange(concurrency):
+            start(done)
+
+    began = time.time()
+    run_loop(io_loop,setup)
+    elapsed = time.time() - began
+    transferred = sum(c.stream.bytes_written + c.stream.bytes_read for c in clients) - before
+    for c in clients:
+        close(c)
+
+    ops = rounds * weight
+    return {"workload": workload,"concurrency": concurrency,"size": size,"ops": ops,
+            "seconds": elapsed,"ops_per_sec": ops / elapsed,
+            "p50_ms": histogram.percentile(50) * 1000,"p99_ms": histogram.percentile(99) * 1000,
+            "bytes_per_op": float(transferred) / ops}
+
+def compare(results,baseline,tolerance):
+    previous = dict(((r["workload"],r["concurrency"],r["size"]),r) for r in baseline["results"])
+    print
+    print "%-9s %5s %6s %10s %10s  %s" % ("workload","conc","size","ops/s","p99","")
+    for result in results:
+        old = previous.get((result["workload"],result["concurrency"],result["size"]))
+        if old is None:
+            continue
+        throughput = result["ops_per_sec"] / old["ops_per_sec"]
+        p99 = result["p99_ms"] / old["p99_ms"] if old["p99_ms"] else 1.0
+        flag = "REGRESSION" if throughput < 1 - tolerance or p99 > 1 + tolerance else ""
+        print "%-9s %5d %6d %9.2fx %9.2fx  %s" % (result["workload"],result["concurrency"],
+                                                 result["size"],throughput,p99,flag)
+
+def main():
+    parser = argparse.ArgumentParser(description="RedisClient throughput and latency benchmark")
+    parser.add_argument("--ops",type=int,default=5000,help="operations per run")
+    parser.add_argument("--workloads",default=",".join(WORKLOADS))
+    parser.add_argument("--concurrency",default=",".join(map(str,CONCURRENCY)))
+    parser.add_argument("--sizes",default=",".join(map(str,VALUE_SIZES)))
+    parser.add_argument("--parser",default=None,help="reply parser backend")
+    parser.add_argument("--port",type=int,default=17300,help="port for the RESP stand-in")
+    parser.add_argument("--redis",default=None,help="host:port of a real server to use instead")
+    parser.add_argument("--out",default=None,help="write the results to this JSON file")
+    parser.add_argument("--baseline",default=None,help="JSON results to compare against")
+    parser.add_argument("--tolerance",type=float,default=0.2)
+    options = parser.parse_args()
+
+    server = None
+    if options.redis:
+        options.host,port = options.redis.rsplit(":",1)
+        options.port = int(port)
+    else:
+        options.host = "127.0.0.1"
+        server = ServerProcess(options.port)
+
+    results = []
+    print "%-9s %5s %6s %10s %9s %9s %10s" % ("workload","conc","size","ops/s","p50 ms","p99 ms","bytes/op")
+    try:
+        for workload in options.workloads.split(","):
+            for concurrency in map(int,options.concurrency.split(",")):
+                for size in map(int,options.sizes.split(",")):
+                    result = run(options,workload,concurrency,size)
+                    results.append(result)
+                    print "%-9s %5d %6d %10.0f %9.3f %9.3f %10.1f" % (workload,concurrency,size,
+                        result["ops_per_sec"],result["p50_ms"],result["p99_ms"],result["bytes_per_op"])
+    finally:
+        if server:
+            server.stop()
+
+    report = {"python": platform.python_version(),"platform": platform.platform(),
+              "server": options.redis or "stand-in","parser": options.parser,
+              "time": time.time(),"results": results}
+    if options.out:
+        with open(options.out,"w") as f:
+            json.dump(report,f,indent=2,sort_keys=True)
+    if options.baseline:
+        with open(options.baseline) as f:
+            compare(results,json.load(f),options.tolerance)
+
+if __name__ == "__main__":
+    main()
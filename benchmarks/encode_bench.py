@@ -0,0 +1,43 @@
+"""Measures command encoding throughput for typical command shapes.
+
+    python -m tornado_redis.benchmarks.encode_bench
+"""
+from tornado_redis.client import COMMANDS
+from tornado_redis.encoder import Encoder
+from itertools import imap
+import timeit
+
+SHAPES = [
+    ("set", ["user:1000:name","some value of moderate length"]),
+    ("hset", ["user:1000","field:12",12345]),
+    ("mget", ["user:%d:name" % i for i in range(20)]),
+    ("set", ["blob:1","x" * 4096]),
+]
+
+def format_pack(command,args):
+    """The previous send_command encoding, kept as a baseline."""
+    args = [command] + list(args)
+    parts = ['$%s\r\n%s\r\n' % (len(enc_value), enc_value)
+             for enc_value in imap(str, args)]
+    return '*%s\r\n%s' % (len(parts), ''.join(parts))
+
+def format_pack_logged(command,args):
+    """format_pack plus the debug message send_command used to build for every command."""
+    command_str = format_pack(command,args)
+    "send %s:%s fd %s: %s" % ("127.0.0.1",6379,7,command_str)
+    return command_str
+
+def main():
+    encoder = Encoder(COMMANDS)
+    number = 100000
+    print "%-6s %-6s %14s %14s %14s %8s" % ("cmd","args","old+log ops/s","format ops/s","encoder ops/s","speedup")
+    for command,args in SHAPES:
+        assert format_pack(command,args) == encoder.pack(command,args)
+        logged = min(timeit.repeat(lambda: format_pack_logged(command,args),number=number,repeat=3))
+        old = min(timeit.repeat(lambda: format_pack(command,args),number=number,repeat=3))
+        new = min(timeit.repeat(lambda: encoder.pack(command,args),number=number,repeat=3))
+        print "%-6s %-6d %14.0f %14.0f %14.0f %7.2fx" % (command,len(args),number / logged,number / old,
+                                                        number / new,logged / new)
+
+if __name__ == "__main__":
+    main()
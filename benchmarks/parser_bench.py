@@ -0,0 +1,42 @@
+"""Compares the reply parser backends on large multi-bulk replies.
+
+    python -m tornado_redis.benchmarks.parser_bench
+"""
+from tornado_redis.parser import PARSERS
+import timeit
+
+def multi_bulk(count,size):
+    value = "x" * size
+    item = "$%d\r\n%s\r\n" % (size,value)
+    return "*%d\r\n%s" % (count,item * count)
+
+def chunked(data,chunk_size):
+    return [data[i:i+chunk_size] for i in xrange(0,len(data),chunk_size)]
+
+def parse(reader_class,chunks,**options):
+    reader = reader_class(**options)
+    for chunk in chunks:
+        reader.feed(chunk)
+        while reader.gets() is not False:
+            pass
+
+def main():
+    cases = [(10000,10),(1000,1000),(100,100000)]
+    print "%-10s %-8s %-8s %-22s %10s %10s" % ("backend","items","size","options","ms/reply","MB/s")
+    for count,size in cases:
+        data = multi_bulk(count,size)
+        chunks = chunked(data,65536)
+        for name,reader_class in sorted(PARSERS.items()):
+            variants = [{}]
+            if name == "python":
+                variants.append({"bulk_as_memoryview": True})
+            for options in variants:
+                runs = 5
+                elapsed = min(timeit.repeat(lambda: parse(reader_class,chunks,**options),
+                                            number=runs,repeat=3)) / runs
+                print "%-10s %-8d %-8d %-22s %10.2f %10.1f" % (
+                    name,count,size,",".join(options) or "-",elapsed * 1000,
+                    len(data) / elapsed / 1e6)
+
+if __name__ == "__main__":
+    main()
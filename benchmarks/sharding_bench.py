@@ -0,0 +1,43 @@
+"""Key distribution and rebalance movement of the consistent hash ring.
+
+    python -m tornado_redis.benchmarks.sharding_bench
+
+For each ring size it reports how evenly 100k keys spread over the nodes
+(largest and smallest share relative to the mean, and the coefficient
+of variation) and the fraction of keys that move when one node is
+added, next to the ideal 1/(n+1) and what modulo hashing would move.
+"""
+from tornado_redis.sharding import HashRing,ketama_points
+import collections
+import math
+
+KEYS = ["user:%d:profile" % i for i in xrange(100000)]
+
+def spread(assignments,nodes):
+    counts = collections.Counter(assignments)
+    mean = float(len(assignments)) / len(nodes)
+    values = [counts[node] for node in nodes]
+    stddev = math.sqrt(sum((v - mean) ** 2 for v in values) / len(values))
+    return max(values) / mean,min(values) / mean,stddev / mean
+
+def moved(before,after):
+    return sum(1 for b,a in zip(before,after) if b != a) / float(len(before))
+
+def main():
+    print "%-6s %-9s %8s %8s %8s %10s %8s %8s" % ("nodes","replicas","max/avg","min/avg","cv",
+                                                  "moved","ideal","modulo")
+    hashes = [ketama_points(key)[0] for key in KEYS]
+    for n in (3,8,16):
+        nodes = [("10.0.0.%d" % i,6379) for i in xrange(n)]
+        for replicas in (40,160,640):
+            ring = HashRing(nodes,replicas)
+            before = [ring.get_node(key) for key in KEYS]
+            high,low,cv = spread(before,nodes)
+            ring.add_node(("10.0.1.0",6379))
+            after = [ring.get_node(key) for key in KEYS]
+            modulo = moved([h % n for h in hashes],[h % (n + 1) for h in hashes])
+            print "%-6d %-9d %8.3f %8.3f %8.3f %10.3f %8.3f %8.3f" % (n,replicas,high,low,cv,
+                                                                     moved(before,after),1.0 / (n + 1),modulo)
+
+if __name__ == "__main__":
+    main()
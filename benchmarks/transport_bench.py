@@ -0,0 +1,107 @@
+"""Round trip latency of RedisClient over TCP loopback and a unix socket.
+
+    python -m tornado_redis.benchmarks.transport_bench [--ops 5000]
+        [--redis-server /usr/local/bin/redis-server]
+
+Each transport sends --ops GETs one at a time, so the figures are pure
+round trips, and reports ops/s and p50/p99 latency in microseconds.
+By default two testing.RespServer stand-ins serve --port and --path;
+with --redis-server that binary is started listening on both instead,
+which gives the more meaningful comparison since the stand-in's own
+overhead dwarfs the difference between the transports.
+"""
+from tornado_redis.client import RedisClient
+from tornado_redis.metrics import Histogram
+from tornado_redis.testing import ServerProcess
+from tornado.ioloop import IOLoop
+import argparse
+import os
+import socket
+import subprocess
+import tempfile
+import time
+
+def connect(*args,**options):
+    io_loop = IOLoop.instance()
+    client = RedisClient(*args,**options)
+    client.on("ready",io_loop.stop)
+    io_loop.start()
+    return client
+
+def run(client,ops,size):
+    io_loop = IOLoop.instance()
+    histogram = Histogram()
+    state = {"remaining": ops}
+
+    def issue():
+        sent = time.time()
+        def on_reply(reply,error=None):
+            histogram.record(time.time() - sent)
+            state["remaining"] -= 1
+            if state["remaining"]:
+                issue()
+            else:
+                io_loop.stop()
+        client.get("bench:transport",on_reply)
+
+    client.set("bench:transport","x" * size)
+    start = time.time()
+    io_loop.add_callback(issue)
+    io_loop.start()
+    elapsed = time.time() - start
+    return ops / elapsed,histogram.percentile(50) * 1e6,histogram.percentile(99) * 1e6
+
+def start_redis(binary,port,path):
+    process = subprocess.Popen([binary,"--port",str(port),"--unixsocket",path,
+                                "--save","","--appendonly","no"],
+                               stdout=open(os.devnull,"w"))
+    deadline = time.time() + 5
+    while True:
+        try:
+            socket.create_connection(("127.0.0.1",port)).close()
+            if os.path.exists(path):
+                return process
+        except socket.error:
+            pass
+        if time.time() > deadline:
+            process.terminate()
+            raise RuntimeError("redis-server did not start")
+        time.sleep(.05)
+
+def main():
+    parser = argparse.ArgumentParser(description="TCP versus unix socket latency benchmark")
+    parser.add_argument("--ops",type=int,default=5000,help="GETs per transport")
+    parser.add_argument("--size",type=int,default=64,help="value size in bytes")
+    parser.add_argument("--port",type=int,default=17310)
+    parser.add_argument("--path",default=os.path.join(tempfile.gettempdir(),"tornado_redis_bench.sock"))
+    parser.add_argument("--redis-server",default=None,help="redis-server binary to start instead of the stand-in")
+    options = parser.parse_args()
+
+    if options.redis_server:
+        servers = [start_redis(options.redis_server,options.port,options.path)]
+    else:
+        servers = [ServerProcess(options.port),ServerProcess(path=options.path)]
+
+    transports = [("tcp",{"args": (options.port,"127.0.0.1")}),
+                  ("unix",{"args": (),"unix_socket_path": options.path})]
+    print "%-6s %10s %10s %10s" % ("", "ops/s","p50 us","p99 us")
+    try:
+        for name,transport in transports:
+            client = connect(*transport.pop("args"),**transport)
+            try:
+                print "%-6s %10.0f %10.1f %10.1f" % ((name,) + run(client,options.ops,options.size))
+            finally:
+                client.closing = True
+                client.end()
+                if client.stream.socket:
+                    client.stream.close()
+    finally:
+        for server in servers:
+            if isinstance(server,subprocess.Popen):
+                server.terminate()
+                server.wait()
+            else:
+                server.stop()
+
+if __name__ == "__main__":
+    main()
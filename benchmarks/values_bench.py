@@ -0,0 +1,49 @@
+"""Bytes saved by value compression against the CPU it costs.
+
+    python -m tornado_redis.benchmarks.values_bench
+
+For each payload and codec, compares no compression with zlib at a few
+levels: the stored size, the share of bytes saved, and the microseconds
+spent encoding (dumps) and decoding (loads) one value. Random bytes show
+the worst case, where compression is skipped after costing a try.
+"""
+from tornado_redis.values import ValueCodec
+import json
+import os
+import random
+import timeit
+
+def records(n):
+    rng = random.Random(1)
+    return [{"id": i,"name": "user%d" % i,"email": "user%d@example.com" % i,
+             "score": rng.random(),"tags": ["a","b","c"][:i % 4]} for i in xrange(n)]
+
+PAYLOADS = [
+    ("records-100","json",records(100)),
+    ("records-5000","json",records(5000)),
+    ("records-5000","pickle",records(5000)),
+    ("text-64k","raw",json.dumps(records(500))[:65536]),
+    ("random-64k","raw",os.urandom(65536)),
+]
+LEVELS = (None,1,6,9)
+
+def main():
+    print "%-13s %-7s %5s %10s %8s %11s %11s" % ("payload","codec","zlib","bytes","saved","dumps us","loads us")
+    for name,serializer,value in PAYLOADS:
+        plain = None
+        for level in LEVELS:
+            if level is None:
+                codec = ValueCodec(serializer)
+            else:
+                codec = ValueCodec(serializer,compress_threshold=0,compress_level=level)
+            data = codec.dumps(value)
+            assert codec.loads(data) == value
+            plain = plain or len(data)
+            number = max(1,200000 // len(data))
+            dumps = min(timeit.repeat(lambda: codec.dumps(value),number=number,repeat=3)) / number
+            loads = min(timeit.repeat(lambda: codec.loads(data),number=number,repeat=3)) / number
+            print "%-13s %-7s %5s %10d %7.1f%% %11.1f %11.1f" % (name,serializer,level or "-",len(data),
+                100.0 * (plain - len(data)) / plain,dumps * 1e6,loads * 1e6)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+from client import RedisClient,COMMANDS,pop_callback
+from events import EventEmitter
+from Jso import Jso
+from tornado.ioloop import IOLoop
+import collections
+import functools
+import logging
+import operator
+import time
+
+# Read commands whose reply depends only on the key named by their first
+# argument, and so can be served from the cache until that key changes.
+CACHEABLE_COMMANDS = set(["get","strlen","exists","getrange","hget","hmget","hgetall","hkeys","hvals",
+    "hlen","hexists","smembers","sismember","scard","zscore","zrank","zrevrank","zcard","zrange",
+    "zrevrange","zrangebyscore","zrevrangebyscore","zcount","lrange","llen","lindex","type"])
+
+class ReadCache(EventEmitter):
+    """In-process LRU/TTL cache in front of a RedisClient's read commands.
+
+    Replies to CACHEABLE_COMMANDS are kept per key, for at most
+    `max_keys` keys and `ttl` seconds (no expiry if ttl is None). Every
+    other command goes straight to the client; write commands sent
+    through the cache also drop the cached key.
+
+    Changes made by other clients are picked up on a second, subscriber
+    connection. By default it listens to keyspace notifications for
+    database `db`, which requires notify-keyspace-events to include "K"
+    and the relevant event classes on the server. If `channel` is given,
+    it subscribes to that channel instead and treats every message as
+    the name of a key to drop. While the subscriber is not subscribed,
+    replies are not cached, so missed invalidations cannot leave stale
+    entries behind.
+
+    Cached replies are shared between callers and must not be modified.
+    """
+    def __init__(self,client,max_keys=10000,ttl=None,channel=None,db=0):
+        self.client = client
+        self.max_keys = max_keys
+        self.ttl = ttl
+        self.channel = channel
+        self.db = db
+        self.io_loop = client.options.io_loop or IOLoop.instance()
+        self.entries = collections.OrderedDict()
+        self.pending = {}
+        self.listening = False
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+        self.subscriber = RedisClient(client.port,client.host,**client.options)
+        self.subscriber.on("error",functools.partial(self.emit,"error"))
+        self.subscriber.on("end",self.on_subscriber_end)
+        self.subscriber.on("ready",self.on_subscriber_ready)
+        if channel:
+            self.subscriber.on("subscribe",self.on_subscribed)
+            self.subscriber.on("message",self.on_message)
+        else:
+            self.prefix = "__keyspace@%d__:" % db
+            self.subscriber.on("psubscribe",self.on_subscribed)
+            self.subscriber.on("pmessage",self.on_keyspace_event)
+
+    #### Subscriber Callbacks ####
+
+    def on_subscriber_ready(self):
+        if self.channel:
+            self.subscriber.subscribe(self.channel)
+        else:
+            self.subscriber.psubscribe(self.prefix + "*")
+
+    def on_subscribed(self,channel,count):
+        logging.debug("tornado-redis cache: listening for invalidations on " + channel)
+        self.listening = True
+
+    def on_subscriber_end(self):
+        logging.debug("tornado-redis cache: subscriber connection lost, clearing cache")
+        self.listening = False
+        self.clear()
+
+    def on_message(self,channel,key):
+        self.invalidate(key)
+
+    def on_keyspace_event(self,pattern,channel,event):
+        self.invalidate(channel[len(self.prefix):])
+
+    #### Cache ####
+
+    def invalidate(self,key):
+        if key in self.pending:
+            self.pending[key][1] = True
+        if self.entries.pop(key,None) is not None:
+            self.invalidations += 1
+
+    def clear(self):
+        self.entries.clear()
+        for pending in self.pending.itervalues():
+            pending[1] = True
+
+    def lookup(self,key,request):
+        entry = self.entries.get(key)
+        if entry is None:
+            return False,None
+        expires,replies = entry
+        if expires is not None and expires < time.time():
+            del self.entries[key]
+            return False,None
+        if request not in replies:
+            return False,None
+        # move to the most recently used end
+        del self.entries[key]
+        self.entries[key] = entry
+        return True,replies[request]
+
+    def store(self,key,request,reply):
+        entry = self.entries.get(key)
+        if entry is None:
+            expires = time.time() + self.ttl if self.ttl is not None else None
+            entry = self.entries[key] = (expires,{})
+            if len(self.entries) > self.max_keys:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+        entry[1][request] = reply
+
+    def stats(self):
+        return Jso({"hits": self.hits,"misses": self.misses,"evictions": self.evictions,
+                    "invalidations": self.invalidations,"size": len(self.entries)})
+
+    #### Send Command ####
+
+    def __getattr__(self,name):
+        if name in COMMANDS:
+            return functools.partial(self.send_command,name)
+        else:
+            raise AttributeError(name)
+
+    def send_command(self,command,*args):
+        if not args or operator.isCallable(args[0]):
+            return self.client.send_command(command,*args)
+        if command not in CACHEABLE_COMMANDS:
+            # drop our own writes right away rather than waiting for the notification
+            if command == "del":
+                keys = args[:-1] if operator.isCallable(args[-1]) else args
+            elif command in ("mset","msetnx"):
+                keys = args[::2]
+            else:
+                keys = args[:1]
+            for key in keys:
+                self.invalidate(key)
+            return self.client.send_command(command,*args)
+
+        args = list(args)
+        callback,future = pop_callback(args)
+        key = args[0]
+        request = (command,) + tuple(args[1:])
+
+        hit,reply = self.lookup(key,request)
+        if hit:
+            self.hits += 1
+            self.io_loop.add_callback(functools.partial(callback,reply,error=None))
+            return future
+        self.misses += 1
+
+        if not self.listening:
+            self.client.send_command(command,*(args + [callback]))
+            return future
+
+        pending = self.pending.get(key)
+        if pending is None:
+            pending = self.pending[key] = [0,False]
+        pending[0] += 1
+
+        def on_reply(reply,error=None):
+            pending[0] -= 1
+            if not error and not pending[1]:
+                self.store(key,request,reply)
+            if pending[0] == 0 and self.pending.get(key) is pending:
+                del self.pending[key]
+            callback(reply,error=error)
+
+        self.client.send_command(command,*(args + [on_reply]))
+        return future
+
+    def end(self):
+        self.listening = False
+        self.clear()
+        self.subscriber.closing = True
+        if self.subscriber.connected:
+            self.subscriber.end()
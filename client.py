@@ -1,18 +1,26 @@
 from parser import Parser
+from encoder import Encoder
+from decoders import DECODERS,decode_info
 from events import EventEmitter
-from stream import Stream
+from metrics import ClientMetrics,export
+from scan import ScanIterator
+from stream import Stream,create_socket,set_socket_options
 from Jso import Jso
 import collections
+import hashlib
 import operator
+import random
 import socket
 import functools
-from itertools import imap
 import logging
+from tornado.concurrent import Future
 from tornado.ioloop import IOLoop
 import time
 import sys
 import traceback
 
+logger = logging.getLogger()
+
 COMMANDS = set(["get", "set", "setnx", "setex", "append", "strlen", "del", "exists", "setbit", "getbit", "setrange", "getrange", "substr",
     "incr", "decr", "mget", "rpush", "lpush", "rpushx", "lpushx", "linsert", "rpop", "lpop", "brpop", "brpoplpush", "blpop", "llen", "lindex",
     "lset", "lrange", "ltrim", "lrem", "rpoplpush", "sadd", "srem", "smove", "sismember", "scard", "spop", "srandmember", "sinter", "sinterstore",
@@ -22,9 +30,18 @@ COMMANDS = set(["get", "set", "setnx", "setex", "append", "strlen", "del", "exis
     "randomkey", "select", "move", "rename", "renamenx", "expire", "expireat", "keys", "dbsize", "auth", "ping", "echo", "save", "bgsave",
     "bgrewriteaof", "shutdown", "lastsave", "type", "multi", "exec", "discard", "sync", "flushdb", "flushall", "sort", "info", "monitor", "ttl",
     "persist", "slaveof", "debug", "config", "subscribe", "unsubscribe", "psubscribe", "punsubscribe", "publish", "watch", "unwatch", "cluster",
-    "restore", "migrate", "dump", "object", "client", "eval", "evalsha"])
+    "restore", "migrate", "dump", "object", "client", "eval", "evalsha", "script",
+    "scan", "hscan", "sscan", "zscan"])
 
 class Command(object):
+    # set when metrics are enabled
+    queued_at = None
+    written_at = None
+    # when the command entered the offline queue
+    offline_at = None
+    # the commands queued with it by send_commands, as one unit
+    group = None
+
     def __init__(self,*args):
         self.command = args[0]
         self.args = args[1]
@@ -49,6 +66,59 @@ class Command(object):
 class ReplyParserError(Exception):
     pass
 
+class RedisError(Exception):
+    pass
+
+class QueueFullError(RedisError):
+    pass
+
+class ConnectionLostError(RedisError):
+    """A queued command was never sent: it expired or the client stopped reconnecting."""
+    pass
+
+class WatchError(RedisError):
+    pass
+
+# Read-only commands whose reply is the same for every caller sending
+# the same arguments at the same time, so identical ones in flight can
+# share one request when coalesce_reads is on.
+COALESCED_COMMANDS = frozenset(["get","strlen","exists","getbit","getrange","substr","mget","llen","lindex",
+    "lrange","sismember","scard","sinter","sunion","sdiff","smembers","zrange","zrangebyscore",
+    "zrevrangebyscore","zcount","zrevrange","zcard","zscore","zrank","zrevrank","hget","hmget","hlen",
+    "hkeys","hvals","hgetall","hexists","keys","dbsize","type","ttl","echo"])
+
+# What happens to a command that finds the offline queue full: "reject"
+# fails it right away, "drop_oldest" fails the oldest queued commands to
+# make room and "wait" holds it until there is room. The commands of a
+# pipeline or transaction are queued, dropped or rejected together.
+OVERFLOW_POLICIES = ("reject","wait","drop_oldest")
+
+# Default for max_waiting: at most this many commands are held by the
+# "wait" policy; past that they are rejected like with "reject".
+MAX_WAITING = 1000
+
+def future_callback(future):
+    """Returns a command callback that resolves `future` with the reply or error."""
+    def callback(reply,error=None):
+        if error is None:
+            future.set_result(reply)
+        elif isinstance(error,Exception):
+            future.set_exception(error)
+        else:
+            future.set_exception(RedisError(error))
+    return callback
+
+def pop_callback(args):
+    """Pops the trailing callback off the argument list `args`.
+
+    Returns (callback, None). When there is no callback, returns a
+    callback that resolves a new Future, and that Future.
+    """
+    if args and operator.isCallable(args[-1]):
+        return args.pop(-1),None
+    future = Future()
+    return future_callback(future),future
+
 class DeferredException(Exception):
     def __init__(self,e,exc_info):
         self.e = e
@@ -62,27 +132,72 @@ class RedisClient(EventEmitter):
     def __init__(self,*args,**options):
         self.host = "127.0.0.1" if len(args) < 2 else args[1]
         self.port = 6379 if len(args) < 1 else args[0]
-        
-        sock = socket.socket(socket.AF_INET,socket.SOCK_STREAM,0)
 
         self.options = Jso(options)
-        self.stream = Stream(sock,io_loop=self.options.io_loop)
-        self.stream.connect((self.host,self.port))
-
+        # a unix socket path replaces host and port
+        self.path = self.options.unix_socket_path
+        self.endpoint = self.path or "%s:%s" % (self.host,self.port)
+        self.high_water_mark = self.options.high_water_mark or self.options.max_write_buffer
+        self.stream = None
+        self.bytes_written_before = 0
+        self.bytes_read_before = 0
 
         self.connected = False
         self.ready = False
-        self.send_anyway = True
+        self.send_anyway = False
         self.connections = 0
-        self.attempts = 1
+        self.attempts = 0
         self.command_queue = collections.deque()
         self.offline_queue = collections.deque()
+        # Limits on unsent commands (max_offline_queue), commands awaiting
+        # a reply (max_pending) and buffered bytes (max_write_buffer).
+        # Commands over the write limits wait in the offline queue; the
+        # overflow policy decides what happens when that is full too
+        # ("wait" holds up to max_waiting more).
+        self.waiting = collections.deque()
+        self.max_offline_queue = self.options.max_offline_queue
+        self.max_pending = self.options.max_pending
+        self.max_write_buffer = self.options.max_write_buffer
+        self.overflow = self.options.overflow or "reject"
+        self.max_waiting = MAX_WAITING if self.options.max_waiting is None else self.options.max_waiting
+        if self.overflow not in OVERFLOW_POLICIES:
+            raise ValueError("overflow must be one of %s" % ", ".join(OVERFLOW_POLICIES))
+        self.throttled = False
+        self.rejected = 0
+        self.dropped = 0
         self.commands_sent = 0
-        self.retry_delay = .25
-        self.retry_timer = None
+        # requests in flight to the callbacks waiting on them, with coalesce_reads
+        self.coalescing = {} if self.options.coalesce_reads else None
+        self.coalesced = 0
+        self.in_multi = False
+        # With batch_reads, GETs (and HGETs of one hash with batch_hget)
+        # made in one IOLoop iteration go out as one MGET (HMGET) of at
+        # most max_batch keys.
+        self.batching = None
+        if self.options.batch_reads:
+            self.batching = frozenset(["get","hget"] if self.options.batch_hget else ["get"])
+        self.max_batch = self.options.max_batch or 100
+        self.batches = collections.OrderedDict()
+        self.batch_scheduled = False
+        self.sending_batch = False
+        self.batched = 0
+        self.metrics = ClientMetrics() if self.options.metrics else None
+        self.scripts = collections.OrderedDict()
+        self.watch_queue = collections.deque()
+        # Reconnects wait retry_delay * retry_backoff ** attempt, capped at
+        # retry_max_delay and shortened by up to retry_jitter of itself so
+        # clients dropped together do not come back together.
+        self.retry_delay = self.options.retry_delay or .25
+        self.retry_backoff = self.options.retry_backoff or 1.7
+        self.retry_max_delay = self.options.retry_max_delay or 30
+        self.retry_jitter = .5 if self.options.retry_jitter is None else self.options.retry_jitter
+        self.max_attempts = self.options.max_attempts
+        self.max_offline_age = self.options.max_offline_age
+        self.retry_time = None
+        self.expire_timer = None
+        self.expired = 0
         self.emitted_end = False
         self.current_retry_delay = self.retry_delay
-        self.retry_backoff = 1.7
         self.subscriptions = False
         self.monitoring = False
         self.closing = False
@@ -90,18 +205,49 @@ class RedisClient(EventEmitter):
         self.auth_pass = None
         self.encoding = self.options.encoding or 'utf-8'
         self.encoding_error = self.options.encoding_error or 'strict'
+        self.encoder = Encoder(COMMANDS,self.encoding,self.encoding_error)
 
-        self.reply_parser = Parser()
+        self.decoders = dict(DECODERS)
+        self.reply_parser = Parser(name=self.options.parser,
+                                   bulk_as_memoryview=self.options.bulk_as_memoryview,
+                                   encoding=self.encoding if self.options.decode_replies else None,
+                                   encoding_errors=self.encoding_error)
         self.reply_parser.on("reply_error",self.return_error)
         self.reply_parser.on("reply",self.return_reply)
         self.reply_parser.on("error",self.return_error_unrecoverable)
 
-        self.stream.on("connect",self.on_connect)
-        self.stream.on("data",self.on_data)
+        self.connect_stream()
+
+    def connect_stream(self):
+        """Opens a new socket and Stream to the server; used for every (re)connect."""
+        old = self.stream
+        if old is not None:
+            self.bytes_written_before += old.bytes_written
+            self.bytes_read_before += old.bytes_read
+            old._events = {}
+
+        sock,address = create_socket(self.path or (self.host,self.port))
+        options = self.options
+        set_socket_options(sock,nodelay=options.tcp_nodelay is not False,
+                           keepalive=bool(options.tcp_keepalive),
+                           keepalive_idle=options.tcp_keepalive_idle,
+                           keepalive_interval=options.tcp_keepalive_interval,
+                           keepalive_count=options.tcp_keepalive_count,
+                           send_buffer_size=options.send_buffer_size,
+                           receive_buffer_size=options.receive_buffer_size)
+        stream = self.stream = Stream(sock,io_loop=options.io_loop,
+                                      low_water_mark=options.low_water_mark or 0,
+                                      direct_dispatch=bool(options.direct_dispatch))
+        self.reply_parser.reset()
+
+        stream.on("connect",self.on_connect)
+        stream.on("data",self.on_data)
+        stream.on("drain",self.on_drain)
         #TODO: create error event
         #self.stream.on("error",self.on_error)
-        self.stream.on("close",functools.partial(self.connection_gone,"close"))
-        self.stream.on("end",functools.partial(self.connection_gone,"end"))
+        stream.on("close",functools.partial(self.stream_gone,stream,"close"))
+        stream.on("end",functools.partial(self.stream_gone,stream,"end"))
+        stream.connect(address)
         
 
     #### Parser Callbacks ####
@@ -112,9 +258,13 @@ class RedisClient(EventEmitter):
 
     def return_error(self,err):
         command_obj = self.command_queue.popleft()
+        if self.metrics is not None:
+            self.metrics.record(command_obj,time.time(),error=True)
 
         if not self.subscriptions and len(self.command_queue) == 0:
             self.emit("idle")
+        if (self.offline_queue or self.waiting) and self.ready:
+            self.send_offline_queue()
 
         if command_obj and operator.isCallable(command_obj.callback):
             command_obj.call_callback(None,err)
@@ -123,33 +273,40 @@ class RedisClient(EventEmitter):
             #IOLoop.instance().add_callback(functools.partial(self.raise_error,err))
 
 
+    def decode_reply(self,command_obj,reply):
+        """Applies the command's decoder; returns (reply, error) so a failing decoder only fails its command."""
+        decoder = self.decoders.get(command_obj.command.lower())
+        if decoder is None or reply is None:
+            return reply,None
+        try:
+            return decoder(reply,command_obj.args),None
+        except Exception,e:
+            logging.debug("tornado-redis: decoding the %s reply failed: %s" % (command_obj.command,e))
+            return None,e
+
     def return_reply(self,reply):
         command_obj = self.command_queue.popleft() if len(self.command_queue) > 0 else None
+        if self.metrics is not None and command_obj is not None and not command_obj.sub_command:
+            self.metrics.record(command_obj,time.time())
 
         if not self.subscriptions and len(self.command_queue) == 0:
             self.emit("idle")
+        if (self.offline_queue or self.waiting) and self.ready:
+            self.send_offline_queue()
 
         if command_obj and not command_obj.sub_command:
             if operator.isCallable(command_obj.callback):
-                if reply and command_obj.command.lower() == 'hgetall':
-                    i = 0
-                    obj = Jso()
-                    while i < len(reply):
-                        key = str(reply[i])
-                        val = reply[i+1]
-                        obj[key] = val
-                    reply = obj
-
-                command_obj.call_callback(reply,None)
+                reply,error = self.decode_reply(command_obj,reply)
+                command_obj.call_callback(reply,error)
             else:
                 logging.debug("no callback for reply: %s" % reply)
 
         elif self.subscriptions or (command_obj and command_obj.sub_command):
             if isinstance(reply,list):
-                if reply[0] in ["subscribe","unsubscribe","psubscribe"] and reply[2] == 0:
+                if reply[0] in ["subscribe","unsubscribe","psubscribe","punsubscribe"] and reply[2] == 0:
                     self.subscriptions = False
                     logging.debug("All subscriptions removed, exiting pub/sub mode")
-                if reply[0] not in ["message","pmessage","subscribe","unsubscribe","psubscribe"]:
+                if reply[0] not in ["message","pmessage","subscribe","unsubscribe","psubscribe","punsubscribe"]:
                     raise TypeError("subscriptions are active but unknow reply type %s" % reply[0])
 
                 try:
@@ -174,7 +331,7 @@ class RedisClient(EventEmitter):
     #### Stream Callbacks ####
 
     def on_connect(self):
-        logging.debug("Stream connected %s:%d fd %s" % (self.host,self.port,self.stream.socket.fileno()))
+        logging.debug("Stream connected %s fd %s" % (self.endpoint,self.stream.socket.fileno()))
 
         self.connected = True
         self.ready = False
@@ -182,29 +339,41 @@ class RedisClient(EventEmitter):
         self.connections += 1
 
 
-        self.current_retry_delay = self.retry_timer
-        #TODO: implement stream retry delay
+        self.current_retry_delay = self.retry_delay
+        self.emitted_end = False
 
         if self.auth_pass:
             self.do_auth()
         else:
             self.emit("connect")
             if self.options.no_ready_check:
-                self.ready = True
-                self.send_offline_queue()
+                self.set_ready()
             else:
                 self.ready_check()
 
 
     def on_data(self,data):
-        logging.debug("net read %s:%d fd %s %s" % (self.host,self.port,self.stream.socket.fileno(),str(data)))
+        if logger.isEnabledFor(logging.DEBUG):
+            logging.debug("net read %s fd %s %s" % (self.endpoint,self.stream.socket.fileno(),str(data)))
         try:
             self.reply_parser.execute(data)
         except Exception,e:
             self.emit("error",e)
 
+    def on_drain(self):
+        if self.throttled:
+            self.throttled = False
+            self.emit("low_water")
+        if (self.offline_queue or self.waiting) and self.ready:
+            self.send_offline_queue()
+
+    def stream_gone(self,stream,why):
+        # a replaced stream may still deliver its last events
+        if stream is self.stream:
+            self.connection_gone(why)
+
     def connection_gone(self,why):
-        if self.retry_timer: return
+        if self.retry_time: return
 
         self.stream.close()
 
@@ -214,6 +383,7 @@ class RedisClient(EventEmitter):
         self.ready = False
         self.subscriptions = False
         self.monitoring = False
+        self.in_multi = False
 
         if not self.emitted_end:
             self.emit("end")
@@ -228,16 +398,23 @@ class RedisClient(EventEmitter):
             self.retry_time = None
             return
 
-        self.current_retry_delay = self.retry_delay * self.retry_backoff
-        logging.debug("Retry connection in " + str(self.current_retry_delay) + " ms")
         self.attempts += 1
+        if self.max_attempts and self.attempts > self.max_attempts:
+            logging.debug("Giving up on the connection after %d attempts" % self.max_attempts)
+            self.fail_offline(ConnectionLostError("gave up reconnecting after %d attempts" % self.max_attempts))
+            self.emit("error","Connection lost, gave up after %d reconnect attempts" % self.max_attempts)
+            return
+
+        delay = min(self.retry_delay * self.retry_backoff ** self.attempts,self.retry_max_delay)
+        self.current_retry_delay = delay * (1 - self.retry_jitter * random.random())
+        logging.debug("Retry connection in " + str(self.current_retry_delay) + " s")
         self.emit("reconnecting",Jso({'delay': self.current_retry_delay,'attempt': self.attempts}))
-        self.retry_time = IOLoop.instance().add_timeout(
+        self.retry_time = self.stream.io_loop.add_timeout(
             time.time()+self.current_retry_delay,self.reconnect)
 
     def reconnect(self):
-        self.stream.connect((self.host,self.port))
         self.retry_time = None
+        self.connect_stream()
 
     #### Helpers #####
 
@@ -249,7 +426,7 @@ class RedisClient(EventEmitter):
             self.send_command("auth",args)
             
     def do_auth(self):
-        logging.debug("Sending auth to %s:%s fd %s" % (self.host,str(self.port),self.stream.socket.fileno()))
+        logging.debug("Sending auth to %s fd %s" % (self.endpoint,self.stream.socket.fileno()))
         self.send_anyway = True
         self.send_command("auth", [self.auth_pass],self.auth_ack)
         self.send_anyway = False
@@ -266,15 +443,14 @@ class RedisClient(EventEmitter):
             return self.emit("error", "Auth failed: " + str(res))
 
 
-        logging.debug("Auth succeeded %s:%s fd %s" % (self.host,self.port,self.stream.socket.fileno()))
+        logging.debug("Auth succeeded %s fd %s" % (self.endpoint,self.stream.socket.fileno()))
         if self.auth_callback:
             self.auth_callback(res,error=err)
             self.auth_callback = None
 
         self.emit("connect")
         if self.options.no_ready_check:
-            self.ready = True
-            self.send_offline_queue()
+            self.set_ready()
         else:
             self.ready_check()
 
@@ -286,14 +462,9 @@ class RedisClient(EventEmitter):
 
     def info_ack(self,res,error=None):
         if (error):
-            return self.emit("error", "Ready check failed: " + err)
+            return self.emit("error", "Ready check failed: " + str(error))
 
-        lines = str(res).split("\r\n")
-        obj = Jso()
-        for line in lines:
-            parts = line.split(":")
-            if len(parts) == 2:
-                obj[parts[0]] = parts[1]
+        obj = res if isinstance(res,dict) else decode_info(res)
 
         obj.versions = []
         for num in obj.redis_version.split("."):
@@ -301,24 +472,156 @@ class RedisClient(EventEmitter):
 
         self.server_info = obj
 
-        if not obj.loading or not (obj.loading and obj.loading == "0"):
+        if not obj.loading or obj.loading == "0":
             logging.debug("Redis server ready")
 
-            self.ready = True
-            self.send_offline_queue()
+            self.set_ready()
             self.emit("ready")
         else:
-            retry_time = obj.loading_eta_seconds
-            if retry_time > 1:
-                retry_time = 1
-            logging.debug("Redis server still loading, try again in " + retry_time)
+            retry_time = min(float(obj.loading_eta_seconds or 1),1)
+            logging.debug("Redis server still loading, try again in %s" % retry_time)
             IOLoop.instance().add_timeout(time.time()+retry_time, self.ready_check)
 
+    def set_ready(self):
+        self.ready = True
+        self.load_scripts()
+        self.send_offline_queue()
+
     def send_offline_queue(self):
-        while self.offline_queue:
-            command_obj = self.offline_queue.popleft()
-            logging.debug("Sending offline command: " + command_obj.command)
-            self.send_command(command_obj.command,command_obj.args,command_obj.callback)
+        """Sends as many queued commands as the limits allow in one write."""
+        self.expire_offline()
+        batch = []
+        while (self.offline_queue or self.waiting) and not self.saturated(len(batch)):
+            if not self.offline_queue:
+                # everything was held by the "wait" policy (max_offline_queue 0, or taken over)
+                self.offline_queue.extend(self.pop_queued(self.waiting))
+            # a pipeline goes out whole, even past the limits
+            for command_obj in self.pop_queued(self.offline_queue):
+                logging.debug("Sending offline command: " + command_obj.command)
+                batch.append(command_obj)
+        while self.waiting:
+            unit = self.waiting[0].group or (self.waiting[0],)
+            if not self.offline_room(len(unit)):
+                break
+            self.offline_queue.extend(self.pop_queued(self.waiting))
+        if batch:
+            self.write_commands(batch)
+
+    #### Limits ####
+
+    def saturated(self,extra=0):
+        """True if no more commands may be written until replies or a drain free room."""
+        if self.max_pending and len(self.command_queue) + extra >= self.max_pending:
+            return True
+        if self.max_write_buffer and self.stream._write_buffer_size >= self.max_write_buffer:
+            return True
+        return False
+
+    def offline_room(self,count):
+        return self.max_offline_queue is None or len(self.offline_queue) + count <= self.max_offline_queue
+
+    def queue_offline(self,*command_objs):
+        """Queues unsent commands, applying `max_offline_queue` and the overflow policy.
+
+        Several commands, from send_commands, are one unit: all of them
+        are queued, dropped or rejected, never only some.
+        """
+        if self.max_attempts and self.attempts > self.max_attempts:
+            # no longer reconnecting, so it would never be sent
+            error = ConnectionLostError("gave up reconnecting after %d attempts" % self.max_attempts)
+            for command_obj in command_objs:
+                self.fail_command(command_obj,error)
+            return
+        now = time.time()
+        for command_obj in command_objs:
+            command_obj.offline_at = now
+            if len(command_objs) > 1:
+                command_obj.group = command_objs
+        if self.max_offline_age and self.expire_timer is None:
+            self.schedule_expiry(now)
+        count = len(command_objs)
+        if self.waiting or not self.offline_room(count):
+            if self.overflow == "wait" and len(self.waiting) + count <= self.max_waiting:
+                self.waiting.extend(command_objs)
+                return
+            if self.overflow != "drop_oldest" or (self.max_offline_queue is not None and count > self.max_offline_queue):
+                # also when "wait" holds max_waiting commands, or when
+                # dropping everything older would not make room
+                self.rejected += count
+                error = QueueFullError("offline queue is full")
+                for command_obj in command_objs:
+                    self.fail_command(command_obj,error)
+                return
+            while self.offline_queue and not self.offline_room(count):
+                for command_obj in self.pop_queued(self.offline_queue):
+                    self.dropped += 1
+                    self.fail_command(command_obj,QueueFullError("dropped from a full offline queue"))
+        self.offline_queue.extend(command_objs)
+
+    def pop_queued(self,queue):
+        """Pops the first command of `queue`, with the rest of its unit."""
+        command_obj = queue.popleft()
+        group = [command_obj]
+        while command_obj.group is not None and queue and queue[0].group is command_obj.group:
+            group.append(queue.popleft())
+        return group
+
+    def take_queued(self,client):
+        """Moves the unsent commands of `client`, which is being replaced, to this client."""
+        self.offline_queue.extend(client.offline_queue)
+        self.waiting.extend(client.waiting)
+        client.offline_queue.clear()
+        client.waiting.clear()
+        queue = self.offline_queue or self.waiting
+        if queue and self.max_offline_age and self.expire_timer is None:
+            self.schedule_expiry(queue[0].offline_at)
+
+    def schedule_expiry(self,oldest):
+        self.expire_timer = self.stream.io_loop.add_timeout(
+            oldest + self.max_offline_age,self.on_expire_timer)
+
+    def on_expire_timer(self):
+        self.expire_timer = None
+        self.expire_offline()
+        queue = self.offline_queue or self.waiting
+        if queue:
+            self.schedule_expiry(queue[0].offline_at)
+
+    def expire_offline(self):
+        """Fails queued commands older than `max_offline_age` instead of sending them late."""
+        if not self.max_offline_age:
+            return
+        deadline = time.time() - self.max_offline_age
+        for queue in (self.offline_queue,self.waiting):
+            while queue and queue[0].offline_at <= deadline:
+                self.expired += 1
+                self.fail_command(queue.popleft(),
+                                  ConnectionLostError("not sent within %s s" % self.max_offline_age))
+
+    def fail_offline(self,error):
+        for queue in (self.offline_queue,self.waiting):
+            while queue:
+                self.fail_command(queue.popleft(),error)
+
+    def fail_command(self,command_obj,error):
+        if operator.isCallable(command_obj.callback):
+            self.stream.io_loop.add_callback(
+                functools.partial(command_obj.call_callback,None,error))
+
+    def check_high_water(self):
+        if (not self.throttled and self.high_water_mark
+                and self.stream._write_buffer_size >= self.high_water_mark):
+            self.throttled = True
+            self.emit("high_water")
+
+    def when_writable(self):
+        """Returns a Future that resolves once the client is below its low-water mark."""
+        future = Future()
+        if self.throttled:
+            self.once("low_water",functools.partial(future.set_result,None))
+        else:
+            future.set_result(None)
+        return future
 
 
 
@@ -338,20 +641,203 @@ class RedisClient(EventEmitter):
             raise TypeError("First argument to send_command must be the command name string, not " + type(command))
 
         args = list(args)
-        if len(args) > 0 and operator.isCallable(args[-1]):
-            callback = args.pop(-1)
-        else:
-            callback = None
+        callback,future = pop_callback(args)
+        if command in ["subscribe","psubscribe","unsubscribe","punsubscribe"]:
+            callback = self.acknowledged(command,args,callback)
+
+        if self.batching is not None and not self.sending_batch:
+            if command in self.batching and not self.in_multi and len(args) == (1 if command == "get" else 2):
+                self.add_to_batch(command,args,callback)
+                return future
+            if self.batches and not self.send_anyway:
+                # batched reads were called first, so they go first
+                self.flush_batches()
+
+        if self.batching is not None or self.coalescing is not None:
+            # commands between MULTI and EXEC answer QUEUED, not the value,
+            # so they are neither batched nor coalesced
+            if command == "multi":
+                self.in_multi = True
+            elif command in ("exec","discard"):
+                self.in_multi = False
+
+        if self.coalescing is not None:
+            if command in COALESCED_COMMANDS and not self.in_multi:
+                request = (command,) + tuple(args)
+                waiters = self.coalescing.get(request)
+                if waiters is not None:
+                    waiters.append(callback)
+                    self.coalesced += 1
+                    return future
+                waiters = self.coalescing[request] = [callback]
+                callback = functools.partial(self.coalesced_reply,request,waiters)
+            elif self.coalescing:
+                # this may change what those reads return, so later
+                # ones must not take their replies
+                self.coalescing.clear()
 
         command_obj = Command(command,args,False,callback)
+        if self.metrics is not None:
+            command_obj.queued_at = time.time()
 
         if (not self.ready and not self.send_anyway) or not stream.writable:
             if not stream.writable:
                 logging.debug("send command: stream is not writeable")
             logging.debug("Queueing " + command + " for next server connection.")
-            self.offline_queue.append(command_obj)
+            self.queue_offline(command_obj)
+            return future
+
+        if self.ready and (self.offline_queue or self.waiting or self.saturated()):
+            # keep the order of commands already waiting for room;
+            # the auth and ready check commands before ready go first
+            self.queue_offline(command_obj)
+            return future
+
+        self.prepare_command(command_obj)
+        stream.write(self.encoder.pack(command,args))
+        if self.high_water_mark:
+            self.check_high_water()
+        return future
+
+    def acknowledged(self,command,args,callback):
+        """Calls `callback` once the server acknowledged a (p)(un)subscribe.
+
+        These commands have no reply of their own: the callback gets the
+        subscription count from the acknowledgement of the last channel
+        in `args`, or from the first one when there are no args. Returns
+        the callback for the Command, which is only called if it fails.
+        """
+        remaining = set(self.encode(arg) for arg in args)
+        done = []
+        def on_ack(channel,count):
+            if type(channel) is memoryview:
+                channel = channel.tobytes()
+            remaining.discard(channel)
+            if not remaining:
+                finish(count,None)
+        def finish(reply,error):
+            if not done:
+                done.append(True)
+                self.removeListener(command,on_ack)
+                callback(reply,error=error)
+        self.on(command,on_ack)
+        return lambda reply,error=None: finish(reply,error)
+
+    def coalesced_reply(self,request,waiters,reply,error=None):
+        """Passes one reply to every caller of a coalesced request; they share it, so must not modify it."""
+        if self.coalescing.get(request) is waiters:
+            del self.coalescing[request]
+        for callback in waiters:
+            try:
+                callback(reply,error=error)
+            except Exception:
+                logging.error("Uncaught exceptions in command callback.",exc_info=True)
+
+    def add_to_batch(self,command,args,callback):
+        if command == "get":
+            batch_key,item = "get",(args[0],callback)
+        else:
+            batch_key,item = ("hget",args[0]),(args[1],callback)
+        batch = self.batches.get(batch_key)
+        if batch is None:
+            batch = self.batches[batch_key] = []
+        batch.append(item)
+        if len(batch) >= self.max_batch:
+            self.send_batch(batch_key)
+        elif not self.batch_scheduled:
+            self.batch_scheduled = True
+            self.stream.io_loop.add_callback(self.flush_batches)
+
+    def flush_batches(self):
+        """Sends the batched reads now instead of at the end of the IOLoop iteration."""
+        self.batch_scheduled = False
+        while self.batches:
+            self.send_batch(next(iter(self.batches)))
+
+    def send_batch(self,batch_key):
+        batch = self.batches.pop(batch_key)
+        if batch_key == "get":
+            command,args = "get",[]
+        else:
+            command,args = "hget",[batch_key[1]]
+        self.sending_batch = True
+        try:
+            if len(batch) == 1:
+                name,callback = batch[0]
+                self.send_command(command,*(args + [name,callback]))
+            else:
+                self.batched += len(batch) - 1
+                names = [name for name,callback in batch]
+                callbacks = [callback for name,callback in batch]
+                self.send_command("mget" if command == "get" else "hmget",
+                                  *(args + names + [functools.partial(self.batch_reply,callbacks,
+                                                                      names if command == "get" else None)]))
+        finally:
+            self.sending_batch = False
+
+    def batch_reply(self,callbacks,names,reply,error=None):
+        """Hands each caller of a batched MGET/HMGET its own value.
+
+        MGET answers nil for a key holding another type, where GET fails
+        with WRONGTYPE, so each of `names` that came back nil is sent
+        again as a GET to find out which it was (unless a MULTI has been
+        sent since, which would queue it).
+        """
+        for i,callback in enumerate(callbacks):
+            if names is not None and error is None and reply[i] is None and not self.in_multi:
+                self.sending_batch = True
+                try:
+                    self.send_command("get",names[i],functools.partial(self.checked_nil,callback))
+                finally:
+                    self.sending_batch = False
+                continue
+            try:
+                callback(reply[i] if error is None else None,error=error)
+            except Exception:
+                logging.error("Uncaught exceptions in command callback.",exc_info=True)
+
+    def checked_nil(self,callback,reply,error=None):
+        # Only an error is news: a value was written after the MGET, and
+        # the caller's GET was answered before that write.
+        callback(None,error=error)
+
+    def send_commands(self,command_objs):
+        """Sends a batch of Command objects with a single stream write."""
+        stream = self.stream
+        if self.batches:
+            self.flush_batches()
+        if self.coalescing:
+            self.coalescing.clear()
+        if self.metrics is not None:
+            now = time.time()
+            for command_obj in command_objs:
+                command_obj.queued_at = command_obj.queued_at or now
+
+        if (not self.ready and not self.send_anyway) or not stream.writable:
+            if not stream.writable:
+                logging.debug("send commands: stream is not writeable")
+            logging.debug("Queueing %d commands for next server connection." % len(command_objs))
+            self.queue_offline(*command_objs)
             return False
 
+        if self.ready and (self.offline_queue or self.waiting or self.saturated()):
+            self.queue_offline(*command_objs)
+            return
+
+        self.write_commands(command_objs)
+
+    def write_commands(self,command_objs):
+        out = []
+        for command_obj in command_objs:
+            self.prepare_command(command_obj)
+            self.encoder.pack_into(out,command_obj.command,command_obj.args)
+        self.stream.write(''.join(out))
+        if self.high_water_mark:
+            self.check_high_water()
+
+    def prepare_command(self,command_obj):
+        command = command_obj.command
+
         if command in ["subscribe","psubscribe","unsubscribe","punsubscribe"]:
             if not self.subscriptions:
                 logging.debug("Entering pub/sub mode from " + command)
@@ -363,24 +849,350 @@ class RedisClient(EventEmitter):
             raise ValueError("Connection in pub/sub mode, only pub/sub commands may be used")
         self.command_queue.append(command_obj)
         self.commands_sent += 1
+        if self.metrics is not None:
+            command_obj.written_at = time.time()
+
+        if logger.isEnabledFor(logging.DEBUG):
+            logging.debug("send %s fd %s: %s %s" % (self.endpoint,self.stream.socket.fileno(),
+                                                        command,command_obj.args))
+
+    def pipeline(self,transaction=False):
+        """Returns a Pipeline, or a Transaction if `transaction` is true."""
+        return Transaction(self) if transaction else Pipeline(self)
+
+    def transaction(self,func,*keys,**kwargs):
+        """Runs `func` as an optimistic transaction over the watched `keys`.
+
+        WATCHes `keys`, then calls func(transaction), which may read
+        the keys through this client and queues its writes on the
+        Transaction it is given; if it returns a Future, that is waited
+        for first. The transaction is then executed. If a watched key
+        changed in the meantime, everything is tried again, up to
+        `retries` times, waiting `backoff` seconds before the first
+        retry and twice as long before each one after.
+
+        Watch transactions on one client run one at a time, since a
+        WATCH covers the whole connection. Returns a Future for the
+        EXEC replies, or passes them to the `callback` keyword argument;
+        after the last retry it fails with WatchError.
+        """
+        callback = kwargs.get("callback")
+        future = None
+        if callback is None:
+            future = Future()
+            callback = future_callback(future)
+        retries = kwargs.get("retries",10)
+        backoff = kwargs.get("backoff",.01)
+        io_loop = self.stream.io_loop
+
+        def attempt(tries):
+            tx = Transaction(self)
+            self.send_command("watch",*(list(keys) + [functools.partial(on_watch,tx,tries)]))
+
+        def on_watch(tx,tries,reply,error=None):
+            if error is not None:
+                return finish(None,error)
+            try:
+                result = func(tx)
+            except Exception,e:
+                return abort(e)
+            if isinstance(result,Future):
+                result.add_done_callback(functools.partial(on_func,tx,tries))
+            else:
+                tx.execute(functools.partial(on_exec,tries))
+
+        def on_func(tx,tries,result):
+            if result.exception() is not None:
+                return abort(result.exception())
+            tx.execute(functools.partial(on_exec,tries))
+
+        def abort(error):
+            self.send_command("unwatch",lambda reply,error=None: None)
+            finish(None,error)
+
+        def on_exec(tries,replies,error=None):
+            if isinstance(error,WatchError) and tries < retries:
+                delay = backoff * 2 ** tries
+                logging.debug("tornado-redis: watched keys changed, retrying in %s s" % delay)
+                io_loop.add_timeout(time.time() + delay,functools.partial(attempt,tries + 1))
+                return
+            finish(replies,error)
+
+        def finish(replies,error):
+            self.watch_queue.popleft()
+            if self.watch_queue:
+                self.watch_queue[0]()
+            callback(replies,error=error)
+
+        self.watch_queue.append(functools.partial(attempt,0))
+        if len(self.watch_queue) == 1:
+            attempt(0)
+        return future
+
+    def register_decoder(self,command,decoder):
+        """Sets the decoder for `command` replies on this client; None removes it.
+
+        The decoder is called as decoder(reply, args) and returns the
+        value passed to the command's callback.
+        """
+        if decoder is None:
+            self.decoders.pop(command.lower(),None)
+        else:
+            self.decoders[command.lower()] = decoder
+
+    #### Scanning ####
 
-        args.insert(0,command)
-        command = ['$%s\r\n%s\r\n' % (len(enc_value), enc_value)
-                   for enc_value in imap(self.encode, args)]
-        command_str = '*%s\r\n%s' % (len(command), ''.join(command))
-        logging.debug("send %s:%s fd %s: %s" % (self.host,self.port,self.stream.socket.fileno(), command_str))
-        stream.write(command_str)
+    def scan_iter(self,match=None,count=None):
+        """Returns a ScanIterator over the keys matching `match`, `count` at a time."""
+        return ScanIterator(self,"scan",None,match,count)
+
+    def hscan_iter(self,key,match=None,count=None):
+        return ScanIterator(self,"hscan",key,match,count)
+
+    def sscan_iter(self,key,match=None,count=None):
+        return ScanIterator(self,"sscan",key,match,count)
+
+    def zscan_iter(self,key,match=None,count=None):
+        return ScanIterator(self,"zscan",key,match,count)
+
+    #### Scripts ####
+
+    def register_script(self,source):
+        """Returns a Script for the Lua `source`, loaded on every (re)connect."""
+        script = Script(self,source)
+        if script.sha not in self.scripts:
+            self.scripts[script.sha] = script
+            if self.ready:
+                self.send_command("script","load",script.source,script.on_load)
+        return self.scripts[script.sha]
+
+    def load_scripts(self):
+        """Sends SCRIPT LOAD for every registered script in one write.
+
+        Called when the connection becomes ready; the loads go ahead of
+        any queued commands, so queued EVALSHAs find their scripts.
+        """
+        if not self.scripts or not self.connected:
+            return
+        self.write_commands([Command("script",["load",script.source],False,script.on_load)
+                             for script in self.scripts.itervalues()])
+
+    def gather(self,*commands,**kwargs):
+        """Sends several commands in one write and collects their replies.
+
+        Each command is a tuple of the command name and its arguments.
+        Returns a Future for the list of replies in command order (or
+        calls the `callback` keyword argument with it); a failed command
+        has its error in place of the reply.
+        """
+        pipeline = self.pipeline()
+        for command in commands:
+            pipeline.send_command(*command)
+        return pipeline.execute(kwargs.get("callback"))
+
+    def stats(self):
+        """Returns a snapshot of the client's queues, counters and, with metrics on, latencies."""
+        stream = self.stream
+        stats = Jso({"in_flight": len(self.command_queue),
+                     "offline": len(self.offline_queue) + len(self.waiting),
+                     "commands_sent": self.commands_sent,
+                     "bytes_written": self.bytes_written_before + stream.bytes_written,
+                     "bytes_read": self.bytes_read_before + stream.bytes_read,
+                     "write_buffer": stream._write_buffer_size,
+                     "connections": self.connections,
+                     "reconnects": max(self.connections - 1,0),
+                     "rejected": self.rejected,
+                     "dropped": self.dropped,
+                     "coalesced": self.coalesced,
+                     "batched": self.batched,
+                     "expired": self.expired})
+        if self.metrics is not None:
+            stats.commands = self.metrics.snapshot()
+        return stats
+
+    def export_stats(self,exporter,interval=10):
+        """Passes `stats()` to `exporter` every `interval` seconds; returns the PeriodicCallback."""
+        return export(self,exporter,interval)
 
     def encode(self,value):
-        if isinstance(value, unicode):
-            return value.encode(self.encoding, self.encoding_errors)
-        return str(value)
+        return self.encoder.encode(value)
 
     def end(self):
+        io_loop = self.stream.io_loop
+        for timer in (self.retry_time,self.expire_timer):
+            if timer is not None:
+                io_loop.remove_timeout(timer)
+        self.retry_time = self.expire_timer = None
         self.stream._events = {}
         self.connected = False
         self.ready = False
-        self.stream.end()
+        if self.stream.socket:
+            self.stream.end()
+
+
+class Pipeline(object):
+    """Collects commands and sends them to the server in one write.
+
+    Commands are queued with the same call signature as RedisClient,
+    including the optional trailing per-command callback. `execute`
+    writes the whole batch at once and calls its callback with the
+    replies in command order; a command that failed has its error in
+    place of the reply.
+    """
+    def __init__(self,client):
+        self.client = client
+        self.commands = []
+
+    def __getattr__(self,name):
+        if name in COMMANDS:
+            return functools.partial(self.send_command,name)
+        else:
+            raise AttributeError(name)
+
+    def __len__(self):
+        return len(self.commands)
+
+    def send_command(self,command,*args):
+        args = list(args)
+        if len(args) > 0 and operator.isCallable(args[-1]):
+            callback = args.pop(-1)
+        else:
+            callback = None
+
+        self.commands.append(Command(command,args,False,callback))
+        return self
+
+    def execute(self,callback=None):
+        """Sends the queued commands and passes the replies to `callback`.
+
+        Returns a Future for the replies when no callback is given.
+        """
+        future = None
+        if callback is None:
+            future = Future()
+            callback = future_callback(future)
+
+        commands, self.commands = self.commands, []
+        if not commands:
+            callback([],error=None)
+            return future
+
+        replies = [None] * len(commands)
+        pending = [len(commands)]
+
+        def collect(i,command_callback):
+            def collector(reply,error=None):
+                replies[i] = error if error else reply
+                pending[0] -= 1
+                try:
+                    if command_callback:
+                        command_callback(reply,error=error)
+                finally:
+                    if pending[0] == 0 and callback:
+                        callback(replies,error=None)
+            return collector
+
+        for i,command_obj in enumerate(commands):
+            command_obj.callback = collect(i,command_obj.callback)
+
+        sent = self.client.send_commands(commands)
+        return future if future is not None else sent
+
+
+class Transaction(Pipeline):
+    """Collects commands and runs them as one MULTI ... EXEC.
+
+    MULTI, the queued commands and EXEC go out in a single write. Each
+    command's callback gets its own result from the EXEC reply. If the
+    transaction does not run, because a watched key changed (WatchError)
+    or a command was rejected while queueing (EXECABORT), every callback
+    gets the error instead.
+    """
+    def execute(self,callback=None):
+        """Sends the transaction and passes the EXEC replies to `callback`.
+
+        Returns a Future for the replies when no callback is given. A
+        command that failed inside the transaction has its error in
+        place of the reply.
+        """
+        future = None
+        if callback is None:
+            future = Future()
+            callback = future_callback(future)
+
+        commands, self.commands = self.commands, []
+        client = self.client
+        queue_errors = {}
+
+        def on_queued(i,reply,error=None):
+            if error is not None:
+                queue_errors[i] = error
+
+        def on_exec(replies,error=None):
+            if error is None and replies is None:
+                error = WatchError("watched keys changed, transaction not executed")
+            for i,command_obj in enumerate(commands):
+                if error is not None:
+                    result,command_error = None,queue_errors.get(i,error)
+                elif isinstance(replies[i],Exception):
+                    result,command_error = None,replies[i]
+                else:
+                    result,command_error = client.decode_reply(command_obj,replies[i])
+                    replies[i] = result if command_error is None else command_error
+                if command_obj.callback:
+                    command_obj.call_callback(result,command_error)
+            if error is not None:
+                callback(None,error=error)
+            else:
+                callback(replies,error=None)
+
+        batch = [Command("multi",[],False,lambda reply,error=None: None)]
+        for i,command_obj in enumerate(commands):
+            batch.append(Command(command_obj.command,command_obj.args,False,
+                                 functools.partial(on_queued,i)))
+        batch.append(Command("exec",[],False,on_exec))
+
+        sent = self.client.send_commands(batch)
+        return future if future is not None else sent
+
+
+class Script(object):
+    """A Lua script sent by SHA1 with EVALSHA.
+
+    Calling it runs the script with the given keys and arguments and
+    returns a Future for the reply, or passes the reply to `callback`.
+    If the server does not have the script (a NOSCRIPT error, e.g. after
+    SCRIPT FLUSH or a restart) it is sent once more with EVAL, which
+    also caches it on the server.
+    """
+    def __init__(self,client,source):
+        self.client = client
+        if isinstance(source,unicode):
+            source = source.encode('utf-8')
+        self.source = source
+        self.sha = hashlib.sha1(source).hexdigest()
+        self.fallbacks = 0
+
+    def __call__(self,keys=(),args=(),callback=None):
+        future = None
+        if callback is None:
+            future = Future()
+            callback = future_callback(future)
+        params = [len(keys)] + list(keys) + list(args)
+        self.client.send_command("evalsha",self.sha,
+                                 *(params + [functools.partial(self.on_reply,params,callback)]))
+        return future
+
+    def on_reply(self,params,callback,reply,error=None):
+        if error is not None and str(error).startswith("NOSCRIPT"):
+            self.fallbacks += 1
+            self.client.send_command("eval",self.source,*(params + [callback]))
+            return
+        callback(reply,error=error)
+
+    def on_load(self,reply,error=None):
+        if error is not None:
+            logging.warning("tornado-redis: SCRIPT LOAD failed for %s: %s" % (self.sha,error))
 
 
 def redis_print(reply,error=None):
@@ -0,0 +1,257 @@
+from client import RedisClient,COMMANDS,ConnectionLostError,pop_callback
+from events import EventEmitter
+from Jso import Jso
+from tornado.ioloop import IOLoop
+import collections
+import functools
+import logging
+import time
+
+CLUSTER_SLOTS = 16384
+
+def _crc16_table():
+    table = []
+    for byte in xrange(256):
+        crc = byte << 8
+        for i in xrange(8):
+            crc = (crc << 1) ^ 0x1021 if crc & 0x8000 else crc << 1
+        table.append(crc & 0xffff)
+    return table
+
+CRC16_TABLE = _crc16_table()
+
+def crc16(data):
+    """CRC16-CCITT (XMODEM), the checksum Redis Cluster uses for key slots."""
+    crc = 0
+    for c in data:
+        crc = ((crc << 8) & 0xff00) ^ CRC16_TABLE[((crc >> 8) ^ ord(c)) & 0xff]
+    return crc
+
+def hash_tag(key):
+    """Returns the part of `key` that is hashed: the first non-empty {tag}, or the whole key."""
+    if isinstance(key,unicode):
+        key = key.encode('utf-8')
+    else:
+        key = str(key)
+    start = key.find('{')
+    if start != -1:
+        end = key.find('}',start + 1)
+        if end > start + 1:
+            return key[start+1:end]
+    return key
+
+def key_slot(key):
+    """Returns the cluster hash slot of `key`, honouring {hash tags}."""
+    return crc16(hash_tag(key)) % CLUSTER_SLOTS
+
+# Commands that take no key and can go to any node.
+KEYLESS_COMMANDS = set(["ping","echo","info","dbsize","randomkey","flushdb","flushall","save","bgsave",
+    "bgrewriteaof","lastsave","config","cluster","publish","keys","debug","client","time","script","scan"])
+
+# Multi-key commands that are split by slot and sent to the nodes in
+# parallel, with the step between keys in their arguments.
+SPLIT_COMMANDS = {"mget": 1,"del": 1,"mset": 2}
+
+def split_command(command,args,group_of,send_group,callback):
+    """Splits a SPLIT_COMMANDS command into one command per group of keys.
+
+    `group_of` maps a key to its group and `send_group(group, command,
+    args, callback)` sends the part for one group. The parts run in
+    parallel and `callback` gets the combined reply: mget values in
+    argument order, the summed del count, or OK for mset. If any part
+    fails, the first error is passed on instead.
+    """
+    step = SPLIT_COMMANDS[command]
+    groups = collections.OrderedDict()
+    for i in xrange(0,len(args),step):
+        groups.setdefault(group_of(args[i]),[]).append(i)
+
+    if len(groups) <= 1:
+        return send_group(groups.keys()[0] if groups else None,command,args,callback)
+
+    replies = [None] * (len(args) // step)
+    state = {"remaining": len(groups),"error": None,"total": 0}
+
+    def collect(positions,reply,error=None):
+        state["remaining"] -= 1
+        if error:
+            state["error"] = state["error"] or error
+        elif command == "mget":
+            for position,value in zip(positions,reply):
+                replies[position] = value
+        elif command == "del":
+            state["total"] += reply
+        if state["remaining"] == 0 and callback:
+            if state["error"]:
+                callback(None,error=state["error"])
+            elif command == "mget":
+                callback(replies,error=None)
+            elif command == "del":
+                callback(state["total"],error=None)
+            else:
+                callback("OK",error=None)
+
+    for group,indexes in groups.iteritems():
+        group_args = [args[i+j] for i in indexes for j in xrange(step)]
+        positions = [i // step for i in indexes]
+        send_group(group,command,group_args,functools.partial(collect,positions))
+
+class ClusterClient(EventEmitter):
+    """Routes commands to the nodes of a Redis Cluster by hash slot.
+
+    The slot map is loaded with CLUSTER SLOTS from the first reachable
+    address in `startup_nodes`; commands sent before it arrives are
+    queued. One RedisClient is kept per master node. MOVED replies
+    update the slot and trigger a background refresh of the map; ASK
+    replies retry once on the named node after ASKING. Either is
+    followed at most `max_redirects` times per command. mget, del and
+    mset are split by slot and the parts sent in parallel.
+    """
+    def __init__(self,startup_nodes,**options):
+        self.startup_nodes = [tuple(node) for node in startup_nodes]
+        self.max_redirects = options.pop("max_redirects",5)
+        self.client_options = options
+        self.options = Jso(options)
+        self.io_loop = self.options.io_loop or IOLoop.instance()
+        self.nodes = {}
+        self.slots = [None] * CLUSTER_SLOTS
+        self.ready = False
+        # address the slot map is being loaded from, or False
+        self.refreshing = False
+        self.refresh_attempt = 0
+        self.refresh_id = 0
+        self.pending = []
+        self.redirects = 0
+        self.refresh_slots()
+
+    def get_node(self,address):
+        client = self.nodes.get(address)
+        if client is None:
+            client = self.nodes[address] = RedisClient(address[1],address[0],**self.client_options)
+            client.on("error",functools.partial(self.emit,"error"))
+            client.on("end",functools.partial(self.node_gone,address))
+        return client
+
+    def node_gone(self,address):
+        client = self.nodes.pop(address,None)
+        if client:
+            client.closing = True
+            # nothing would ever send what is still queued for it
+            client.fail_offline(ConnectionLostError("cluster node %s:%d is gone" % address))
+        if self.refreshing == address:
+            # its CLUSTER SLOTS is lost with it; ask the next address
+            self.refreshing = False
+            self.io_loop.add_timeout(time.time()+.1,
+                                     functools.partial(self.refresh_slots,self.refresh_attempt+1))
+        else:
+            self.refresh_slots()
+
+    #### Slot Map ####
+
+    def refresh_slots(self,attempt=0):
+        if self.refreshing:
+            return
+        known = self.startup_nodes + [a for a in self.nodes if a not in self.startup_nodes]
+        address = known[attempt % len(known)]
+        self.refreshing = address
+        self.refresh_attempt = attempt
+        self.refresh_id += 1
+        logging.debug("tornado-redis cluster: loading slots from %s:%d" % address)
+        self.get_node(address).send_command("cluster","slots",
+                                            functools.partial(self.on_slots,attempt,self.refresh_id))
+
+    def on_slots(self,attempt,refresh_id,reply,error=None):
+        if refresh_id != self.refresh_id:
+            # a refresh abandoned by node_gone; a newer one is under way
+            return
+        self.refreshing = False
+        if error:
+            logging.warning("tornado-redis cluster: CLUSTER SLOTS failed: %s" % error)
+            self.io_loop.add_timeout(time.time()+.1,functools.partial(self.refresh_slots,attempt+1))
+            return
+
+        slots = [None] * CLUSTER_SLOTS
+        for entry in reply:
+            start,end,master = entry[0],entry[1],entry[2]
+            address = (master[0],int(master[1]))
+            slots[start:end+1] = [address] * (end - start + 1)
+        self.slots = slots
+
+        if not self.ready:
+            self.ready = True
+            pending, self.pending = self.pending, []
+            for command,args,callback in pending:
+                self.send_command(command,*(args + [callback]))
+            self.emit("ready")
+
+    def node_for(self,command,args):
+        if command in ("eval","evalsha") and len(args) > 2 and int(args[1]) > 0:
+            key = args[2]
+        elif command in KEYLESS_COMMANDS or not args:
+            key = None
+        else:
+            key = args[0]
+        if key is None:
+            return self.startup_nodes[0]
+        return self.slots[key_slot(key)] or self.startup_nodes[0]
+
+    #### Send Command ####
+
+    def __getattr__(self,name):
+        if name in COMMANDS:
+            return functools.partial(self.send_command,name)
+        else:
+            raise AttributeError(name)
+
+    def send_command(self,command,*args):
+        args = list(args)
+        callback,future = pop_callback(args)
+
+        if not self.ready:
+            self.pending.append((command,args,callback))
+        elif command in SPLIT_COMMANDS:
+            self.send_split(command,args,callback)
+        else:
+            self.execute(self.node_for(command,args),command,args,callback)
+        return future
+
+    def execute(self,address,command,args,callback,redirects=0,asking=False):
+        on_reply = functools.partial(self.on_reply,command,args,callback,redirects)
+        client = self.get_node(address)
+        if asking:
+            pipeline = client.pipeline()
+            pipeline.send_command("asking")
+            pipeline.send_command(command,*(args + [on_reply]))
+            pipeline.execute()
+        else:
+            client.send_command(command,*(args + [on_reply]))
+
+    def on_reply(self,command,args,callback,redirects,reply,error=None):
+        if error and redirects < self.max_redirects:
+            message = str(error)
+            if message.startswith("MOVED ") or message.startswith("ASK "):
+                kind,slot,target = message.split(" ")
+                host,port = target.rsplit(":",1)
+                address = (host,int(port))
+                self.redirects += 1
+                if kind == "MOVED":
+                    self.slots[int(slot)] = address
+                    self.refresh_slots()
+                self.execute(address,command,args,callback,redirects + 1,kind == "ASK")
+                return
+        if callback:
+            callback(reply,error=error)
+
+    def send_split(self,command,args,callback):
+        split_command(command,args,key_slot,self.send_slot,callback)
+
+    def send_slot(self,slot,command,args,callback):
+        address = self.slots[slot] if slot is not None else None
+        self.execute(address or self.startup_nodes[0],command,args,callback)
+
+    def end(self):
+        nodes, self.nodes = self.nodes, {}
+        for client in nodes.itervalues():
+            client.closing = True
+            if client.connected:
+                client.end()
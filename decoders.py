@@ -0,0 +1,64 @@
+"""Reply decoders, applied by RedisClient to replies before their callbacks.
+
+A decoder is called as decoder(reply, args) with the parsed reply and
+the arguments the command was sent with, and returns the value passed
+to the command's callback. DECODERS maps lower-case command names to
+decoders and is copied by every client, which can change its own copy
+with RedisClient.register_decoder. Nil replies are never decoded.
+"""
+from Jso import Jso
+import itertools
+
+def to_bytes(value):
+    """Copies a memoryview reply (bulk_as_memoryview) to a string; other values are returned as-is."""
+    return value.tobytes() if type(value) is memoryview else value
+
+def decode_hash(reply,args=()):
+    """Field/value pairs to a Jso; memoryview fields are copied to strings."""
+    it = iter(reply)
+    if reply and type(reply[0]) is memoryview:
+        return Jso(zip(itertools.imap(memoryview.tobytes,it),it))
+    return Jso(zip(it,it))
+
+def decode_config(reply,args=()):
+    if args and str(args[0]).lower() == "get":
+        it = itertools.imap(to_bytes,reply)
+        return dict(zip(it,it))
+    return reply
+
+def decode_scores(reply,args=()):
+    """(member, float score) pairs when the command was sent WITHSCORES."""
+    for arg in args:
+        if isinstance(arg,basestring) and arg.lower() == "withscores":
+            it = iter(reply)
+            return [(member,float(to_bytes(score))) for member,score in zip(it,it)]
+    return reply
+
+def decode_info(reply,args=()):
+    """INFO text to a Jso of strings.
+
+    Values made of comma-separated name=value items, like the keyspace
+    lines (db0:keys=1,expires=0) and replica lines, become dicts.
+    """
+    reply = to_bytes(reply)
+    info = Jso()
+    for line in reply.splitlines():
+        if not line or line[0] == "#":
+            continue
+        key,sep,value = line.partition(":")
+        if not sep:
+            continue
+        if "=" in value:
+            value = dict(item.split("=",1) for item in value.split(",") if "=" in item)
+        info[key] = value
+    return info
+
+DECODERS = {
+    "hgetall": decode_hash,
+    "config": decode_config,
+    "zrange": decode_scores,
+    "zrevrange": decode_scores,
+    "zrangebyscore": decode_scores,
+    "zrevrangebyscore": decode_scores,
+    "info": decode_info,
+}
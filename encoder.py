@@ -0,0 +1,61 @@
+"""RESP request encoder.
+
+The array and bulk length headers for small sizes, the bulk strings of
+small ints and the encoded name of every known command are built once,
+so packing a command is mostly list appends.
+"""
+
+# Length headers below this size come from a table instead of % formatting.
+HEADER_CACHE_SIZE = 1024
+
+ARRAY_HEADERS = ['*%d\r\n' % i for i in xrange(HEADER_CACHE_SIZE)]
+BULK_HEADERS = ['$%d\r\n' % i for i in xrange(HEADER_CACHE_SIZE)]
+# Complete bulk strings for the small non-negative ints.
+INT_BULKS = ['$%d\r\n%d\r\n' % (len(str(i)),i) for i in xrange(HEADER_CACHE_SIZE)]
+
+def _command_prefix(command):
+    return '$%d\r\n%s\r\n' % (len(command),command)
+
+class Encoder(object):
+    def __init__(self,commands=(),encoding='utf-8',encoding_errors='strict'):
+        self.encoding = encoding
+        self.encoding_errors = encoding_errors
+        self.prefixes = dict((command,_command_prefix(command)) for command in commands)
+
+    def encode(self,value):
+        t = type(value)
+        if t is str:
+            return value
+        if t is unicode:
+            return value.encode(self.encoding,self.encoding_errors)
+        return str(value)
+
+    def pack_into(self,out,command,args):
+        """Appends the RESP encoding of `command` with `args` to the list `out`."""
+        n = len(args) + 1
+        out.append(ARRAY_HEADERS[n] if n < HEADER_CACHE_SIZE else '*%d\r\n' % n)
+
+        prefix = self.prefixes.get(command)
+        if prefix is None:
+            prefix = self.prefixes[command] = _command_prefix(self.encode(command))
+        out.append(prefix)
+
+        append = out.append
+        for arg in args:
+            t = type(arg)
+            if t is not str:
+                if t is int and 0 <= arg < HEADER_CACHE_SIZE:
+                    append(INT_BULKS[arg])
+                    continue
+                if t is unicode:
+                    arg = arg.encode(self.encoding,self.encoding_errors)
+                else:
+                    arg = str(arg)
+            n = len(arg)
+            append(BULK_HEADERS[n] if n < HEADER_CACHE_SIZE else '$%d\r\n' % n)
+            append(arg)
+            append('\r\n')
+        return out
+
+    def pack(self,command,args):
+        return ''.join(self.pack_into([],command,args))
@@ -22,8 +22,11 @@ class EventEmitter(object):
     def removeListener(self,name,fn):
         if hasattr(self,'_events') and name in self._events:
             ls = self._events[name]
-            ls.remove(name)
-            if not ls:
+            if isinstance(ls,list):
+                ls.remove(fn)
+                if not ls:
+                    self._events.pop(name)
+            elif ls is fn:
                 self._events.pop(name)
 
     def removeAllListeners(self,name):
@@ -43,7 +46,7 @@ class EventEmitter(object):
         return self._events[name]
 
     def emit(self,name,*args):
-        if not self._events:
+        if not getattr(self,'_events',None):
             return False
 
         if name not in self._events:
@@ -51,7 +54,8 @@ class EventEmitter(object):
 
         handler = self._events[name]
         if isinstance(handler,list):
-            for listener in handler:
+            # copied, since a "once" listener removes itself
+            for listener in handler[:]:
                 listener(*args)
         else:
             handler(*args)
@@ -0,0 +1,114 @@
+"""Latency histograms and counters for RedisClient.
+
+Metrics are off by default; with the client option `metrics=True` every
+command is timed from the moment it is sent (or queued) to when it is
+written to the stream and from there to its reply, in one Histogram
+per command name. `RedisClient.stats()` combines them with the queue,
+byte and connection counters the client always keeps.
+"""
+from tornado.ioloop import PeriodicCallback
+import logging
+
+# Each power of two is split into this many linear buckets, which keeps
+# the relative error of a percentile under 1/SUB_BUCKETS.
+SUB_BUCKETS = 16
+SUB_BUCKET_BITS = 4
+
+# Histogram values are recorded in whole microseconds.
+RESOLUTION = 1e-6
+
+def bucket_index(value):
+    """Returns the log-linear bucket for the non-negative integer `value`."""
+    if value < SUB_BUCKETS:
+        return value
+    shift = value.bit_length() - SUB_BUCKET_BITS - 1
+    return (shift + 1) * SUB_BUCKETS + (value >> shift) - SUB_BUCKETS
+
+def bucket_bounds(index):
+    """Returns the (lower, upper) integer bounds of bucket `index`, upper exclusive."""
+    if index < SUB_BUCKETS:
+        return index,index + 1
+    shift = index // SUB_BUCKETS - 1
+    base = index % SUB_BUCKETS + SUB_BUCKETS
+    return base << shift,(base + 1) << shift
+
+class Histogram(object):
+    """Log-linear histogram of durations in seconds."""
+    def __init__(self):
+        self.counts = []
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self,seconds):
+        index = bucket_index(max(int(seconds / RESOLUTION),0))
+        counts = self.counts
+        if index >= len(counts):
+            counts.extend([0] * (index + 1 - len(counts)))
+        counts[index] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def percentile(self,p):
+        """Returns the upper bound of the bucket holding the `p`th percentile, in seconds."""
+        if not self.count:
+            return 0.0
+        rank = p / 100.0 * self.count
+        seen = 0
+        for index,n in enumerate(self.counts):
+            seen += n
+            if n and seen >= rank:
+                return min(bucket_bounds(index)[1] * RESOLUTION,self.max)
+        return self.max
+
+    def snapshot(self):
+        return {"count": self.count,
+                "mean": self.total / self.count if self.count else 0.0,
+                "p50": self.percentile(50),
+                "p90": self.percentile(90),
+                "p99": self.percentile(99),
+                "max": self.max}
+
+class CommandMetrics(object):
+    def __init__(self):
+        self.queued = Histogram()
+        self.reply = Histogram()
+        self.errors = 0
+
+    def snapshot(self):
+        return {"queued": self.queued.snapshot(),"reply": self.reply.snapshot(),
+                "errors": self.errors}
+
+class ClientMetrics(object):
+    """Per-command histograms of queue time (send to write) and reply time (write to reply)."""
+    def __init__(self):
+        self.commands = {}
+
+    def record(self,command_obj,now,error=False):
+        metrics = self.commands.get(command_obj.command)
+        if metrics is None:
+            metrics = self.commands[command_obj.command] = CommandMetrics()
+        written = command_obj.written_at or now
+        metrics.queued.record(written - (command_obj.queued_at or written))
+        metrics.reply.record(now - written)
+        if error:
+            metrics.errors += 1
+
+    def snapshot(self):
+        return dict((command,metrics.snapshot()) for command,metrics in self.commands.iteritems())
+
+def export(client,exporter,interval=10,io_loop=None):
+    """Calls `exporter(client.stats())` every `interval` seconds.
+
+    Returns the started PeriodicCallback; stop it to stop exporting.
+    """
+    def run():
+        try:
+            exporter(client.stats())
+        except Exception:
+            logging.error("Uncaught exception in metrics exporter.",exc_info=True)
+    callback = PeriodicCallback(run,interval * 1000,io_loop=io_loop or client.stream.io_loop)
+    callback.start()
+    return callback
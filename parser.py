@@ -1,30 +1,165 @@
-import hiredis
 from events import EventEmitter
 from Jso import Jso
 
+try:
+    import hiredis
+except ImportError:
+    hiredis = None
+
+
+class ReplyError(Exception):
+    pass
+
+class ProtocolError(Exception):
+    pass
+
+# Returned by PythonReader._read when the buffer ends mid-frame.
+_INCOMPLETE = object()
+
+class PythonReader(object):
+    """Pure-Python RESP reader with the same feed/gets interface as hiredis.Reader.
+
+    Input is appended to one reusable bytearray and replies are parsed
+    in place. A multi-bulk reply that is split across reads keeps its
+    partially built arrays on a stack, so bytes are never parsed twice.
+    With `bulk_as_memoryview` bulk strings come back as memoryviews over
+    the buffer instead of copies. With an `encoding`, bulk and status
+    strings are decoded to unicode instead, as hiredis does.
+    """
+    ReplyError = ReplyError
+
+    def __init__(self,bulk_as_memoryview=False,encoding=None,errors="strict"):
+        self.bulk_as_memoryview = bulk_as_memoryview
+        self.encoding = encoding
+        self.errors = errors
+        self.buf = bytearray()
+        self.pos = 0
+        self.stack = []
+
+    def feed(self,data):
+        if self.pos:
+            try:
+                del self.buf[:self.pos]
+            except BufferError:
+                # memoryview replies still point into the buffer
+                self.buf = self.buf[self.pos:]
+            self.pos = 0
+        try:
+            self.buf += data
+        except BufferError:
+            self.buf = self.buf + data
+
+    def gets(self):
+        stack = self.stack
+        while True:
+            reply = self._read()
+            if reply is _INCOMPLETE:
+                return False
+            while stack:
+                array,remaining = stack[-1]
+                array.append(reply)
+                if remaining == 1:
+                    stack.pop()
+                    reply = array
+                else:
+                    stack[-1][1] = remaining - 1
+                    break
+            else:
+                return reply
+
+    def _read(self):
+        buf = self.buf
+        pos = self.pos
+        while True:
+            end = buf.find(b"\r\n",pos)
+            if end == -1:
+                return _INCOMPLETE
+            kind = buf[pos]
+
+            if kind == 36: # $
+                length = int(buf[pos+1:end])
+                if length == -1:
+                    self.pos = end + 2
+                    return None
+                start = end + 2
+                stop = start + length
+                if len(buf) < stop + 2:
+                    return _INCOMPLETE
+                self.pos = stop + 2
+                if self.encoding:
+                    return buf[start:stop].decode(self.encoding,self.errors)
+                if self.bulk_as_memoryview:
+                    return memoryview(buf)[start:stop]
+                return bytes(buf[start:stop])
+
+            self.pos = end + 2
+            if kind == 42: # *
+                length = int(buf[pos+1:end])
+                if length == -1:
+                    return None
+                if length == 0:
+                    return []
+                self.stack.append([[],length])
+                pos = self.pos
+            elif kind == 58: # :
+                return int(buf[pos+1:end])
+            elif kind == 43: # +
+                if self.encoding:
+                    return buf[pos+1:end].decode(self.encoding,self.errors)
+                return bytes(buf[pos+1:end])
+            elif kind == 45: # -
+                return ReplyError(bytes(buf[pos+1:end]))
+            else:
+                raise ProtocolError("Protocol error, got %r as reply type byte" % chr(kind))
+
+
+# Reader backends by name. A backend is a class with hiredis.Reader's
+# feed/gets interface and a ReplyError attribute.
+PARSERS = {"python": PythonReader}
+
+if hiredis:
+    class HiredisReader(object):
+        ReplyError = hiredis.ReplyError
+
+        def __init__(self,bulk_as_memoryview=False,encoding=None,errors="strict"):
+            if encoding:
+                self.reader = hiredis.Reader(encoding=encoding,errors=errors)
+            else:
+                self.reader = hiredis.Reader()
+            self.feed = self.reader.feed
+            self.gets = self.reader.gets
+
+    PARSERS["hiredis"] = HiredisReader
+    DEFAULT_PARSER = "hiredis"
+else:
+    DEFAULT_PARSER = "python"
+
+
 class Parser(EventEmitter):
     def __init__(self,**options):
-        self.name = "hiredis"
         self.options = Jso(options)
+        self.name = self.options.name or DEFAULT_PARSER
+        if self.name not in PARSERS:
+            raise ValueError("Unknown reply parser %s, expected one of %s" % (self.name,", ".join(PARSERS)))
         self.reset()
 
 
     def reset(self):
-        self.reader = hiredis.Reader()
+        self.reader = PARSERS[self.name](bulk_as_memoryview=bool(self.options.bulk_as_memoryview),
+                                         encoding=self.options.encoding,
+                                         errors=self.options.encoding_errors or "strict")
 
     def execute(self,data):
         self.reader.feed(data)
         try:
             while True:
                 reply = self.reader.gets()
-                if reply is None or reply is False: break
+                if reply is False: break
 
-                if isinstance(reply,hiredis.ReplyError):
-                    self.emit("reply error",reply)
+                if isinstance(reply,self.reader.ReplyError):
+                    self.emit("reply_error",reply)
                 else:
                     self.emit("reply",reply)
 
         except Exception,e:
             self.emit("error",e)
-                
-        
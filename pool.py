@@ -0,0 +1,114 @@
+from client import RedisClient,COMMANDS
+from events import EventEmitter
+from Jso import Jso
+from tornado.ioloop import IOLoop
+import functools
+import logging
+import time
+
+# Commands that change the state of the connection they are sent on. A
+# pool spreads commands over several connections, so these need a
+# dedicated RedisClient.
+CONNECTION_COMMANDS = set(["subscribe","unsubscribe","psubscribe","punsubscribe","monitor",
+    "select","auth","multi","exec","discard","watch","unwatch","quit"])
+
+class RedisPool(EventEmitter):
+    """Spreads commands over `size` connections to the same server.
+
+    Each command goes to the connection with the fewest commands in
+    flight, so one slow reply only holds up the commands queued behind
+    it on that connection. All connections are opened up front. A
+    connection that goes away is replaced by a fresh RedisClient after
+    `replace_delay` seconds, and its offline queue moves to the new
+    client.
+    """
+    def __init__(self,*args,**options):
+        self.args = args
+        self.size = options.pop("size",4)
+        self.replace_delay = options.pop("replace_delay",.25)
+        self.client_options = options
+        self.options = Jso(options)
+        self.io_loop = self.options.io_loop or IOLoop.instance()
+        self.ready = False
+        self.replacements = 0
+        self._next = 0
+        self.clients = [self.create_client() for i in range(self.size)]
+
+    def create_client(self):
+        client = RedisClient(*self.args,**self.client_options)
+        client.on("error",functools.partial(self.emit,"error"))
+        client.on("ready",functools.partial(self.client_ready,client))
+        client.on("end",functools.partial(self.client_gone,client))
+        return client
+
+    def client_ready(self,client):
+        if not self.ready and all(c.ready for c in self.clients):
+            logging.debug("tornado-redis pool: %d connections ready" % self.size)
+            self.ready = True
+            self.emit("ready")
+
+    def client_gone(self,client):
+        if client not in self.clients:
+            return
+        # stop the client from scheduling its own reconnect
+        client.closing = True
+        logging.debug("tornado-redis pool: replacing connection in %s s" % self.replace_delay)
+        self.io_loop.add_timeout(time.time()+self.replace_delay,
+                                 functools.partial(self.replace_client,client))
+
+    def replace_client(self,client):
+        if client not in self.clients:
+            return
+        replacement = self.create_client()
+        replacement.take_queued(client)
+        self.clients[self.clients.index(client)] = replacement
+        self.replacements += 1
+        self.emit("replaced",replacement)
+
+    def get_client(self):
+        """Returns the connected client with the fewest commands in flight."""
+        clients = self.clients
+        n = len(clients)
+        start = self._next
+        self._next = (start + 1) % n
+
+        best = None
+        best_depth = None
+        for i in xrange(n):
+            client = clients[(start + i) % n]
+            if not client.connected:
+                continue
+            depth = len(client.command_queue)
+            if depth == 0:
+                return client
+            if best is None or depth < best_depth:
+                best = client
+                best_depth = depth
+
+        if best is None:
+            # nothing is connected; queue on whichever client has the least waiting
+            best = min(clients,key=lambda c: len(c.offline_queue))
+        return best
+
+    #### Send Command ####
+
+    def __getattr__(self,name):
+        if name in COMMANDS:
+            return functools.partial(self.send_command,name)
+        else:
+            raise AttributeError(name)
+
+    def send_command(self,command,*args):
+        if command in CONNECTION_COMMANDS:
+            raise ValueError("%s changes connection state and cannot be sent through a pool" % command)
+        return self.get_client().send_command(command,*args)
+
+    def pipeline(self):
+        return self.get_client().pipeline()
+
+    def end(self):
+        clients, self.clients = self.clients, []
+        for client in clients:
+            client.closing = True
+            if client.connected:
+                client.end()
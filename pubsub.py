@@ -0,0 +1,103 @@
+from client import RedisClient
+from events import EventEmitter
+import functools
+import logging
+
+class PubSubHub(EventEmitter):
+    """Multiplexes many subscribers over one pub/sub connection.
+
+    Handlers are registered per channel with `subscribe` and per pattern
+    with `psubscribe`, and are called as handler(channel, message). The
+    hub keeps a count of handlers for every channel and pattern and only
+    sends SUBSCRIBE / PSUBSCRIBE when a count goes from 0 to 1, and
+    UNSUBSCRIBE / PUNSUBSCRIBE when it drops back to 0. Messages are
+    routed with a dict lookup on the channel, or on the pattern Redis
+    reports as matched, so each one only reaches its own handlers.
+    Subscriptions are sent again whenever the connection becomes ready.
+    """
+    def __init__(self,*args,**options):
+        self.client = RedisClient(*args,**options)
+        self.client.on("error",functools.partial(self.emit,"error"))
+        self.client.on("ready",self.on_ready)
+        self.client.on("message",self.on_message)
+        self.client.on("pmessage",self.on_pmessage)
+        # handler tuples are replaced rather than changed, so dispatch can
+        # iterate them while handlers subscribe and unsubscribe
+        self.channels = {}
+        self.patterns = {}
+        self.messages = 0
+        self.dropped = 0
+
+    def on_ready(self):
+        if self.channels:
+            self.client.subscribe(*self.channels.keys())
+        if self.patterns:
+            self.client.psubscribe(*self.patterns.keys())
+
+    #### Registry ####
+
+    def add(self,registry,command,name,handler):
+        handlers = registry.get(name)
+        if handlers is None:
+            registry[name] = (handler,)
+            if self.client.ready:
+                self.client.send_command(command,name)
+        else:
+            registry[name] = handlers + (handler,)
+
+    def remove(self,registry,command,name,handler):
+        handlers = registry.get(name)
+        if handlers is None or handler not in handlers:
+            return False
+        i = handlers.index(handler)
+        handlers = handlers[:i] + handlers[i+1:]
+        if handlers:
+            registry[name] = handlers
+        else:
+            del registry[name]
+            if self.client.ready:
+                self.client.send_command(command,name)
+        return True
+
+    def subscribe(self,channel,handler):
+        self.add(self.channels,"subscribe",channel,handler)
+
+    def unsubscribe(self,channel,handler):
+        return self.remove(self.channels,"unsubscribe",channel,handler)
+
+    def psubscribe(self,pattern,handler):
+        self.add(self.patterns,"psubscribe",pattern,handler)
+
+    def punsubscribe(self,pattern,handler):
+        return self.remove(self.patterns,"punsubscribe",pattern,handler)
+
+    def subscribers(self,channel):
+        return len(self.channels.get(channel,()))
+
+    #### Dispatch ####
+
+    def dispatch(self,handlers,channel,message):
+        self.messages += 1
+        if not handlers:
+            # a message already in flight when the last handler left
+            self.dropped += 1
+            return
+        for handler in handlers:
+            try:
+                handler(channel,message)
+            except Exception:
+                logging.error("Uncaught exception in subscription handler.",
+                              exc_info=True)
+
+    def on_message(self,channel,message):
+        self.dispatch(self.channels.get(channel),channel,message)
+
+    def on_pmessage(self,pattern,channel,message):
+        self.dispatch(self.patterns.get(pattern),channel,message)
+
+    def end(self):
+        self.channels = {}
+        self.patterns = {}
+        self.client.closing = True
+        if self.client.connected:
+            self.client.end()
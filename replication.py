@@ -0,0 +1,165 @@
+from cache import CACHEABLE_COMMANDS
+from client import RedisClient,COMMANDS
+from events import EventEmitter
+from Jso import Jso
+from tornado.ioloop import IOLoop,PeriodicCallback
+import functools
+import logging
+import time
+
+# Commands that only read, and so may be answered by a replica. SCAN and
+# its kin are not among them: a cursor is only valid on the server that
+# returned it, and the next page could be sent to another replica.
+READ_COMMANDS = CACHEABLE_COMMANDS | set(["mget","ttl","randomkey","srandmember","sinter","sunion",
+    "sdiff","dbsize","keys","echo"])
+
+class Replica(object):
+    """Health and load figures for one replica connection."""
+    def __init__(self,address,client):
+        self.address = address
+        self.client = client
+        self.rtt = None
+        self.link_up = False
+        self.offset = None
+        self.lag = None
+        self.healthy = False
+        self.reads = 0
+
+    def load(self):
+        """Routing cost: smoothed RTT scaled by the commands already in flight."""
+        return self.rtt * (1 + len(self.client.command_queue))
+
+class ReplicatedClient(EventEmitter):
+    """Sends writes to a primary and spreads reads over its replicas.
+
+    READ_COMMANDS go to the healthy replica with the lowest load, its
+    smoothed PING round trip time multiplied by one plus its commands
+    in flight; everything else, and any read while no replica is
+    healthy, goes to the primary.
+    Every `check_interval` seconds each replica is PINGed, its RTT
+    folded into an exponential moving average with weight `rtt_alpha`,
+    and INFO replication read from it and the primary. A replica is
+    healthy while it is connected, reports master_link_status:up and
+    its replication offset is at most `max_lag` bytes behind the
+    primary's. "replica_up" and "replica_down" are emitted with the
+    replica's address on every change.
+
+    Reads from replicas may be stale by up to `max_lag`; send commands
+    that must see their own writes, and transactions, to `primary`.
+    SCAN, HSCAN, SSCAN and ZSCAN always go to the primary.
+    """
+    def __init__(self,primary,replicas,**options):
+        self.max_lag = options.pop("max_lag",1024 * 1024)
+        self.check_interval = options.pop("check_interval",1.0)
+        self.rtt_alpha = options.pop("rtt_alpha",.2)
+        self.options = Jso(options)
+        self.io_loop = self.options.io_loop or IOLoop.instance()
+        self.primary_offset = None
+
+        self.client_options = options
+        self.primary_address = tuple(primary)
+        self.primary = self.create_client(self.primary_address)
+        self.replicas = [Replica(tuple(address),self.create_client(tuple(address)))
+                         for address in replicas]
+        self.checker = PeriodicCallback(self.check_replicas,self.check_interval * 1000,
+                                        io_loop=self.io_loop)
+        self.checker.start()
+        self.check_replicas()
+
+    def create_client(self,address):
+        client = RedisClient(address[1],address[0],**self.client_options)
+        client.on("error",functools.partial(self.emit,"error"))
+        client.closing = True # lost connections are replaced by the health checks
+        return client
+
+    def replace_client(self,client,address):
+        logging.debug("tornado-redis replication: reconnecting to %s:%d" % address)
+        replacement = self.create_client(address)
+        replacement.take_queued(client)
+        return replacement
+
+    #### Health Checks ####
+
+    def check_replicas(self):
+        if self.primary.stream.socket is None:
+            self.primary = self.replace_client(self.primary,self.primary_address)
+        self.primary.send_command("info","replication",self.on_primary_info)
+        for replica in self.replicas:
+            if replica.client.stream.socket is None:
+                self.set_health(replica,False)
+                replica.client = self.replace_client(replica.client,replica.address)
+                continue
+            replica.client.send_command("ping",functools.partial(self.on_ping,replica,time.time()))
+            replica.client.send_command("info","replication",functools.partial(self.on_replica_info,replica))
+
+    def on_primary_info(self,info,error=None):
+        if error is None and info.master_repl_offset is not None:
+            self.primary_offset = int(info.master_repl_offset)
+
+    def on_ping(self,replica,sent,reply,error=None):
+        if error is not None:
+            return
+        sample = time.time() - sent
+        if replica.rtt is None:
+            replica.rtt = sample
+        else:
+            replica.rtt += self.rtt_alpha * (sample - replica.rtt)
+
+    def on_replica_info(self,replica,info,error=None):
+        if error is not None:
+            self.set_health(replica,False)
+            return
+        replica.link_up = info.master_link_status == "up"
+        replica.offset = int(info.slave_repl_offset) if info.slave_repl_offset is not None else None
+        if replica.offset is not None and self.primary_offset is not None:
+            replica.lag = max(self.primary_offset - replica.offset,0)
+        else:
+            replica.lag = None
+        self.set_health(replica,replica.link_up and replica.rtt is not None
+                        and replica.lag is not None and replica.lag <= self.max_lag)
+
+    def set_health(self,replica,healthy):
+        if healthy != replica.healthy:
+            replica.healthy = healthy
+            logging.debug("tornado-redis replication: replica %s:%d is %s" %
+                          (replica.address + ("up" if healthy else "down",)))
+            self.emit("replica_up" if healthy else "replica_down",replica.address)
+
+    #### Routing ####
+
+    def pick_replica(self):
+        """Returns the healthy replica with the least load, or None."""
+        best = None
+        best_load = None
+        for replica in self.replicas:
+            if not replica.healthy or not replica.client.connected:
+                continue
+            load = replica.load()
+            if best is None or load < best_load:
+                best = replica
+                best_load = load
+        return best
+
+    def __getattr__(self,name):
+        if name in COMMANDS:
+            return functools.partial(self.send_command,name)
+        else:
+            raise AttributeError(name)
+
+    def send_command(self,command,*args):
+        if command in READ_COMMANDS:
+            replica = self.pick_replica()
+            if replica is not None:
+                replica.reads += 1
+                return replica.client.send_command(command,*args)
+        return self.primary.send_command(command,*args)
+
+    def pipeline(self,transaction=False):
+        return self.primary.pipeline(transaction)
+
+    def end(self):
+        self.checker.stop()
+        for client in [self.primary] + [replica.client for replica in self.replicas]:
+            client.closing = True
+            if client.connected:
+                client.end()
@@ -0,0 +1,112 @@
+from decoders import to_bytes
+from tornado.concurrent import Future
+import collections
+import logging
+
+class ScanIterator(object):
+    """Walks a SCAN, HSCAN, SSCAN or ZSCAN cursor one page at a time.
+
+    `next()` returns a Future for the next non-empty batch, or for None
+    once the cursor is exhausted, so a coroutine can loop with
+    `batch = yield it.next()`. `each(callback, done)` pushes every batch
+    to `callback` instead and calls done(error=None) at the end.
+
+    The next page is requested as soon as the current one is handed
+    out, so the server round trip overlaps with its processing. At most
+    one page is held at a time, whatever the size of the keyspace.
+    HSCAN batches are (field, value) pairs and ZSCAN batches (member,
+    score) pairs. As with SCAN itself, an element may be returned more
+    than once.
+    """
+    def __init__(self,client,command,key=None,match=None,count=None):
+        self.client = client
+        self.command = command
+        self.key = key
+        self.match = match
+        self.count = count
+        self.cursor = "0"
+        self.done = False
+        self.error = None
+        self.fetching = False
+        self.pages = collections.deque()
+        self.waiter = None
+
+    def fetch(self):
+        args = [self.cursor] if self.key is None else [self.key,self.cursor]
+        if self.match is not None:
+            args += ["match",self.match]
+        if self.count is not None:
+            args += ["count",self.count]
+        self.fetching = True
+        self.client.send_command(self.command,*(args + [self.on_page]))
+
+    def on_page(self,reply,error=None):
+        self.fetching = False
+        if error is not None:
+            self.error = error
+        else:
+            cursor,items = reply
+            self.cursor = str(to_bytes(cursor))
+            self.done = self.cursor == "0"
+            if items:
+                try:
+                    self.pages.append(self.convert(items))
+                except Exception,e:
+                    self.error = e
+            elif not self.done:
+                self.fetch()
+                return
+        if self.waiter is not None:
+            waiter, self.waiter = self.waiter, None
+            self.resolve(waiter)
+
+    def convert(self,items):
+        if self.command == "hscan":
+            it = iter(items)
+            return zip(it,it)
+        if self.command == "zscan":
+            it = iter(items)
+            return [(member,float(to_bytes(score))) for member,score in zip(it,it)]
+        return items
+
+    def resolve(self,future):
+        if self.pages:
+            future.set_result(self.pages.popleft())
+        elif self.error is not None:
+            error = self.error
+            future.set_exception(error if isinstance(error,Exception) else Exception(error))
+        else:
+            future.set_result(None)
+            return
+        if not self.done and not self.fetching and self.error is None:
+            self.fetch()
+
+    def next(self):
+        if self.waiter is not None:
+            raise RuntimeError("next() called while a batch is still pending")
+        future = Future()
+        if self.pages or self.error is not None or self.done:
+            self.resolve(future)
+        else:
+            self.waiter = future
+            if not self.fetching:
+                self.fetch()
+        return future
+
+    def each(self,callback,done=None):
+        """Calls callback(batch) for every batch, then done(error=None)."""
+        def on_batch(future):
+            error = future.exception()
+            batch = None if error is not None else future.result()
+            if batch is None:
+                if done:
+                    done(error=error)
+                elif error is not None:
+                    logging.error("tornado-redis: %s failed: %s" % (self.command,error))
+                return
+            try:
+                callback(batch)
+            except Exception:
+                logging.error("Uncaught exception in scan callback.",exc_info=True)
+            self.next().add_done_callback(on_batch)
+        self.next().add_done_callback(on_batch)
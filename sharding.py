@@ -0,0 +1,110 @@
+from client import RedisClient,COMMANDS,pop_callback
+from cluster import KEYLESS_COMMANDS,SPLIT_COMMANDS,hash_tag,split_command
+from events import EventEmitter
+import bisect
+import functools
+import hashlib
+import operator
+import struct
+
+# Commands that are not about one key, or that change connection state,
+# and so have no single shard to go to.
+UNSHARDABLE_COMMANDS = KEYLESS_COMMANDS | set(["subscribe","unsubscribe","psubscribe","punsubscribe",
+    "monitor","select","auth","multi","exec","discard","watch","unwatch","quit","sync","shutdown",
+    "slaveof","sort","eval","evalsha","msetnx","rename","renamenx","smove","rpoplpush","brpoplpush",
+    "sinter","sinterstore","sunion","sunionstore","sdiff","sdiffstore","zunionstore","zinterstore",
+    "blpop","brpop"])
+
+def ketama_points(data):
+    """Returns the four 32-bit ring points ketama takes from the md5 of `data`."""
+    return struct.unpack("<IIII",hashlib.md5(data).digest())
+
+class HashRing(object):
+    """Ketama-style consistent hash ring.
+
+    Each node is placed at `replicas` points on a 32-bit ring (rounded
+    up to a multiple of four, as ketama takes four points per md5), and
+    a key belongs to the first node point at or after the key's hash.
+    Adding or removing a node only moves the keys on its own arcs.
+    """
+    def __init__(self,nodes=(),replicas=160):
+        self.replicas = replicas
+        self.ring = {}
+        self.points = []
+        for node in nodes:
+            self.add_node(node)
+
+    def node_name(self,node):
+        return "%s:%s" % node if isinstance(node,tuple) else str(node)
+
+    def add_node(self,node):
+        name = self.node_name(node)
+        for i in xrange((self.replicas + 3) // 4):
+            for point in ketama_points("%s-%d" % (name,i)):
+                self.ring[point] = node
+        self.points = sorted(self.ring)
+
+    def remove_node(self,node):
+        for point,owner in self.ring.items():
+            if owner == node:
+                del self.ring[point]
+        self.points = sorted(self.ring)
+
+    def get_node(self,key):
+        point = ketama_points(hash_tag(key))[0]
+        i = bisect.bisect_left(self.points,point)
+        if i == len(self.points):
+            i = 0
+        return self.ring[self.points[i]]
+
+class ShardedClient(EventEmitter):
+    """Spreads keys over independent Redis servers with a HashRing.
+
+    `nodes` is a list of (host, port) pairs, one RedisClient is kept per
+    node. Commands have the same call signature as RedisClient and go to
+    the node that owns their first key; {hash tags} keep related keys on
+    one node. mget, mset and del are split per node, sent concurrently
+    and their replies reassembled in argument order. Commands that do
+    not name a single key are rejected; use `clients` directly for those.
+    """
+    def __init__(self,nodes,**options):
+        self.ring = HashRing([tuple(node) for node in nodes],options.pop("replicas",160))
+        self.clients = {}
+        for node in nodes:
+            node = tuple(node)
+            client = self.clients[node] = RedisClient(node[1],node[0],**options)
+            client.on("error",functools.partial(self.emit,"error"))
+
+    def client_for(self,key):
+        return self.clients[self.ring.get_node(key)]
+
+    #### Send Command ####
+
+    def __getattr__(self,name):
+        if name in COMMANDS:
+            return functools.partial(self.send_command,name)
+        else:
+            raise AttributeError(name)
+
+    def send_command(self,command,*args):
+        if command in UNSHARDABLE_COMMANDS or not args or operator.isCallable(args[0]):
+            raise ValueError("%s does not name a single key and cannot be sharded" % command)
+
+        if command in SPLIT_COMMANDS:
+            args = list(args)
+            callback,future = pop_callback(args)
+            split_command(command,args,self.ring.get_node,self.send_node,callback)
+            return future
+
+        return self.client_for(args[0]).send_command(command,*args)
+
+    def send_node(self,node,command,args,callback):
+        if callback:
+            args = args + [callback]
+        self.clients[node].send_command(command,*args)
+
+    def end(self):
+        for client in self.clients.itervalues():
+            client.closing = True
+            if client.connected:
+                client.end()
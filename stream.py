@@ -6,19 +6,82 @@ import sys
 from tornado import ioloop
 from tornado import stack_context
 import collections
+import itertools
 import logging
+import time
+
+# Upper bound on the number of buffers passed to one sendmsg call
+# (IOV_MAX is 1024 on linux and the BSDs).
+IOV_MAX = 1024
+
+# Number of consecutive reads using under a quarter of the read buffer
+# before it is halved.
+SHRINK_AFTER = 16
+
+# Upper bound on the bytes joined together for one send call when
+# sendmsg is unavailable.
+WRITE_CHUNK_SIZE = 128 * 1024
+
+def create_socket(address):
+    """Returns a non-connected socket and the address to connect it to.
+
+    `address` is a unix socket path, or a (host, port) pair where the
+    host may be a name, an IPv4 or an IPv6 address.
+    """
+    if isinstance(address,basestring):
+        return socket.socket(socket.AF_UNIX,socket.SOCK_STREAM),address
+    family,socktype,proto,canonname,sockaddr = socket.getaddrinfo(
+        address[0],address[1],socket.AF_UNSPEC,socket.SOCK_STREAM)[0]
+    return socket.socket(family,socktype,proto),sockaddr
+
+def set_socket_options(sock,nodelay=True,keepalive=False,keepalive_idle=None,
+                       keepalive_interval=None,keepalive_count=None,
+                       send_buffer_size=None,receive_buffer_size=None):
+    """Applies the TCP and buffer options to `sock`.
+
+    The keepalive timings are only set where the platform has them
+    (TCP_KEEPIDLE, TCP_KEEPINTVL and TCP_KEEPCNT on linux); nodelay and
+    keepalive are skipped for unix sockets.
+    """
+    if sock.family in (socket.AF_INET,socket.AF_INET6):
+        if nodelay:
+            sock.setsockopt(socket.IPPROTO_TCP,socket.TCP_NODELAY,1)
+        if keepalive:
+            sock.setsockopt(socket.SOL_SOCKET,socket.SO_KEEPALIVE,1)
+            for name,value in (("TCP_KEEPIDLE",keepalive_idle),("TCP_KEEPINTVL",keepalive_interval),
+                               ("TCP_KEEPCNT",keepalive_count)):
+                if value is not None and hasattr(socket,name):
+                    sock.setsockopt(socket.IPPROTO_TCP,getattr(socket,name),int(value))
+    if send_buffer_size:
+        sock.setsockopt(socket.SOL_SOCKET,socket.SO_SNDBUF,send_buffer_size)
+    if receive_buffer_size:
+        sock.setsockopt(socket.SOL_SOCKET,socket.SO_RCVBUF,receive_buffer_size)
 
 class Stream(EventEmitter):
     def __init__(self,socket,io_loop=None,max_buffer_size=104857600,
-                 read_chunk_size=4096):
+                 read_chunk_size=4096,flush_window=0,
+                 write_high_water_mark=65536,low_water_mark=0,
+                 direct_dispatch=False):
         self.socket = socket
         self.socket.setblocking(False)
         self.io_loop = io_loop or ioloop.IOLoop.instance()
         self.max_buffer_size = max_buffer_size
         self.read_chunk_size = read_chunk_size
+        self.flush_window = flush_window
+        self.write_high_water_mark = write_high_water_mark
+        self.low_water_mark = low_water_mark
+        self.direct_dispatch = direct_dispatch
+        self.read_syscalls = 0
+        self.bytes_read = 0
+        self.bytes_written = 0
+        self._read_size = read_chunk_size
+        self._read_buffer = bytearray(read_chunk_size)
+        self._small_reads = 0
         self.writable = True
         self._write_buffer = collections.deque()
+        self._write_buffer_size = 0
         self._write_buffer_frozen = False
+        self._flush_pending = None
         self._connecting = False
         self._state = None
         self._pending_emits = 0
@@ -49,17 +112,48 @@ class Stream(EventEmitter):
         try:
             self.socket.connect(address)
         except socket.error,e:
-            if e.args[0] not in (errno.EINPROGRESS, errno.EWOULDBLOCK): raise
+            if e.args[0] not in (errno.EINPROGRESS, errno.EWOULDBLOCK):
+                # unix sockets fail right away; report it like a failed TCP connect
+                logging.warning("Connect error on fd %d: %s",self.socket.fileno(),e)
+                self.close()
+                return
 
         self._add_io_state(self.io_loop.WRITE)
 
     def write(self,data):
+        """Buffers `data` to be sent with the rest of this iteration's writes.
+
+        Writes are flushed together on the next IOLoop iteration, or
+        after `flush_window` seconds if it is set. Once the buffered
+        bytes reach `write_high_water_mark` they are flushed right away.
+        """
         self._check_closed()
         self._write_buffer.append(data)
+        self._write_buffer_size += len(data)
+        if self._write_buffer_size >= self.write_high_water_mark:
+            self.flush()
+        elif self._flush_pending is None and not self._write_buffer_frozen:
+            with stack_context.NullContext():
+                if self.flush_window:
+                    self._flush_pending = self.io_loop.add_timeout(
+                        time.time()+self.flush_window,self.flush)
+                else:
+                    self._flush_pending = True
+                    self.io_loop.add_callback(self.flush)
+        self._maybe_add_error_listener()
+
+    def flush(self):
+        """Sends everything buffered by `write` now."""
+        self._cancel_flush()
+        if not self.socket or not self._write_buffer:
+            return
+        if self._connecting:
+            # _handle_events flushes once the connection completes
+            self._add_io_state(self.io_loop.WRITE)
+            return
         self._handle_write()
         if self._write_buffer:
             self._add_io_state(self.io_loop.WRITE)
-        self._maybe_add_error_listener()
 
     def writing(self):
         return bool(self._write_buffer)
@@ -87,6 +181,8 @@ class Stream(EventEmitter):
             if events & self.io_loop.WRITE:
                 if self._connecting:
                     self._handle_connect()
+                    if not self.socket:
+                        return
                 self._handle_write()
             if not self.socket:
                 return
@@ -126,11 +222,46 @@ class Stream(EventEmitter):
         self.emit("connect")
         self._connecting = False
 
+    def _cancel_flush(self):
+        if self._flush_pending is not None:
+            if self._flush_pending is not True:
+                self.io_loop.remove_timeout(self._flush_pending)
+            self._flush_pending = None
+
+    def _send_buffer(self):
+        """Sends as much of the write buffer as one syscall takes.
+
+        Returns the number of bytes the kernel accepted, which may be
+        fewer than were offered.
+        """
+        buf = self._write_buffer
+        if len(buf) > 1 and hasattr(self.socket,'sendmsg'):
+            return self.socket.sendmsg(list(itertools.islice(buf,0,IOV_MAX)))
+        if len(buf) > 1:
+            _merge_prefix(buf,WRITE_CHUNK_SIZE)
+        return self.socket.send(buf[0])
+
+    def _consume(self,sent):
+        buf = self._write_buffer
+        self._write_buffer_size -= sent
+        self.bytes_written += sent
+        while buf and sent >= len(buf[0]):
+            sent -= len(buf.popleft())
+        if sent:
+            buf[0] = buf[0][sent:]
+
     def _handle_write(self):
+        """Sends buffered data until the socket would block.
+
+        "drain" is emitted when this brings the buffer down to
+        `low_water_mark` bytes (by default, when it empties).
+        """
+        self._cancel_flush()
+        buffered = self._write_buffer_size
         while self._write_buffer:
             try:
-                self.socket.send(self._write_buffer[0])
-                self._write_buffer.popleft()
+                self._consume(self._send_buffer())
+                self._write_buffer_frozen = False
             except socket.error, e:
                 if e.args[0] in (errno.EWOULDBLOCK, errno.EAGAIN):
                     self._write_buffer_frozen = True
@@ -140,35 +271,115 @@ class Stream(EventEmitter):
                                     self.socket.fileno(), e)
                     self.close()
                     return
-        if not self._write_buffer:
+        if buffered > self.low_water_mark >= self._write_buffer_size:
             self.emit("drain")
+        if not self._write_buffer:
             self._add_io_state(self.io_loop.READ)
             
 
     def _handle_read(self):
+        """Reads everything available on the socket.
+
+        Each chunk is emitted as its own deferred "data" event, unless
+        `direct_dispatch` is set (see `_handle_read_direct`).
+        """
+        if self.direct_dispatch:
+            self._handle_read_direct()
+            return
+
         while True:
             try:
-                result = self._read_from_socket()
+                chunk = self._read_from_socket()
             except Exception:
                 self.close()
                 return
-            if result is None: break
+            if chunk is None: break
+            if not chunk:
+                self.emit("end")
+                self.close()
+                return
+            self.emit("data",chunk)
+
+    def _handle_read_direct(self):
+        """Reads into the reusable read buffer and dispatches it synchronously.
+
+        The buffer doubles whenever a read fills it, up to
+        `max_buffer_size`. The "data" listeners get one memoryview over
+        the bytes read in this call; it is only valid until the listener
+        returns, since the next read reuses the buffer.
+        """
+        buf = self._read_buffer
+        filled = 0
+        eof = False
+        while True:
+            if filled == len(buf):
+                if filled >= self.max_buffer_size: break
+                buf.extend(bytearray(min(filled,self.max_buffer_size - filled)))
+            try:
+                self.read_syscalls += 1
+                n = self.socket.recv_into(memoryview(buf)[filled:])
+            except socket.error, e:
+                if e.args[0] in (errno.EWOULDBLOCK, errno.EAGAIN):
+                    break
+                self.close()
+                return
+            if not n:
+                eof = True
+                break
+            filled += n
+            self.bytes_read += n
+
+        if filled:
+            EventEmitter.emit(self,"data",memoryview(buf)[:filled])
+
+        size = self._adapt_read_size(filled,len(buf))
+        if size < len(buf):
+            try:
+                del buf[size:]
+            except BufferError:
+                # a listener kept a view of the old buffer
+                self._read_buffer = bytearray(size)
+
+        if eof:
+            self.emit("end")
+            self.close()
 
     def _read_from_socket(self):
+        """Returns the next chunk, "" at end of stream or None if nothing is ready."""
         try:
-            chunk = self.socket.recv(self.read_chunk_size)
+            self.read_syscalls += 1
+            chunk = self.socket.recv(self._read_size)
         except socket.error, e:
             if e.args[0] in (errno.EWOULDBLOCK, errno.EAGAIN):
                 return None
             else:
                 raise
-        if not chunk:
-            self.emit("end")
-            self.close()
-            return None
+        self.bytes_read += len(chunk)
+        self._read_size = self._adapt_read_size(len(chunk),self._read_size)
+        return chunk
+
+    def _adapt_read_size(self,used,size):
+        """Returns the read size to use after a read of `used` bytes into `size`.
+
+        A read that fills the buffer doubles it, up to `max_buffer_size`.
+        After SHRINK_AFTER reads in a row that used less than a quarter
+        of it, it is halved, down to `read_chunk_size`.
+        """
+        if used >= size:
+            self._small_reads = 0
+            return min(size * 2,self.max_buffer_size)
+        if used < size // 4 and size > self.read_chunk_size:
+            self._small_reads += 1
+            if self._small_reads >= SHRINK_AFTER:
+                self._small_reads = 0
+                return max(size // 2,self.read_chunk_size)
         else:
-            self.emit("data",chunk)
-            return chunk
+            self._small_reads = 0
+        return size
+
+    def bytes_per_read(self):
+        """Average number of bytes returned per recv syscall."""
+        return float(self.bytes_read) / self.read_syscalls if self.read_syscalls else 0.0
 
     def _check_closed(self):
         if not self.socket:
@@ -213,17 +424,23 @@ class Stream(EventEmitter):
 
     def close(self):
         if self.socket is not None:
+            self._cancel_flush()
             if self._state is not None:
                 self.io_loop.remove_handler(self.socket.fileno())
             self.socket.close()
             self.socket = None
             self.emit("close")
-        
-
 
 
-            
-
-            
-
-    
+def _merge_prefix(deque,size):
+    """Replaces the first entries in `deque` with one string of up to `size` bytes."""
+    prefix = []
+    remaining = size
+    while deque and remaining > 0:
+        chunk = deque.popleft()
+        if len(chunk) > remaining:
+            deque.appendleft(chunk[remaining:])
+            chunk = chunk[:remaining]
+        prefix.append(chunk)
+        remaining -= len(chunk)
+    deque.appendleft(''.join(prefix))
@@ -0,0 +1,171 @@
+from tornado.concurrent import Future
+from tornado.testing import AsyncTestCase,gen_test
+from tornado import gen
+import socket
+import threading
+import unittest
+
+from tornado_redis.client import RedisClient,QueueFullError
+
+
+class BackpressureTestCase(AsyncTestCase):
+    """Runs the client against a listening socket the test answers by hand."""
+    def setUp(self):
+        super(BackpressureTestCase,self).setUp()
+        self.listener = socket.socket(socket.AF_INET,socket.SOCK_STREAM)
+        self.listener.bind(("127.0.0.1",0))
+        self.listener.listen(1)
+        self.conn = None
+
+    def tearDown(self):
+        self.client.end()
+        if self.conn:
+            self.conn.close()
+        self.listener.close()
+        super(BackpressureTestCase,self).tearDown()
+
+    @gen.coroutine
+    def connect(self,**options):
+        self.client = RedisClient(self.listener.getsockname()[1],no_ready_check=True,
+                                  io_loop=self.io_loop,**options)
+        connected = Future()
+        self.client.on("connect",lambda: connected.set_result(None))
+        yield connected
+
+    def answer(self,*replies):
+        if self.conn is None:
+            self.conn,_ = self.listener.accept()
+        self.conn.sendall("".join(["$%d\r\n%s\r\n" % (len(r),r) for r in replies]))
+
+    @gen_test
+    def test_reject(self):
+        yield self.connect(max_pending=1,max_offline_queue=1,overflow="reject")
+        first = self.client.get("a")
+        second = self.client.get("b")
+        with self.assertRaises(QueueFullError):
+            yield self.client.get("c")
+        self.assertEqual(self.client.rejected,1)
+        self.answer("1")
+        self.assertEqual((yield first),"1")
+        self.answer("2")
+        self.assertEqual((yield second),"2")
+
+    @gen_test
+    def test_drop_oldest(self):
+        yield self.connect(max_pending=1,max_offline_queue=1,overflow="drop_oldest")
+        first = self.client.get("a")
+        second = self.client.get("b")
+        third = self.client.get("c")
+        with self.assertRaises(QueueFullError):
+            yield second
+        self.answer("1","3")
+        self.assertEqual((yield [first,third]),["1","3"])
+        self.assertEqual(self.client.dropped,1)
+
+    @gen_test
+    def test_drop_oldest_with_no_offline_queue(self):
+        yield self.connect(max_pending=1,max_offline_queue=0,overflow="drop_oldest")
+        first = self.client.get("a")
+        with self.assertRaises(QueueFullError):
+            yield self.client.get("b")
+        self.assertEqual((self.client.rejected,self.client.dropped),(1,0))
+        self.answer("1")
+        self.assertEqual((yield first),"1")
+
+    @gen_test
+    def test_transaction_rejected_whole(self):
+        yield self.connect(max_pending=1,max_offline_queue=2,overflow="reject")
+        first = self.client.get("a")
+        tx = self.client.pipeline(transaction=True)
+        tx.incr("n")
+        tx.incr("n")
+        with self.assertRaises(QueueFullError):
+            yield tx.execute()
+        self.assertEqual(self.client.rejected,4)
+        self.assertEqual(len(self.client.offline_queue),0)
+        self.answer("1")
+        self.assertEqual((yield first),"1")
+        # MULTI was never sent, so the next command gets its own reply
+        second = self.client.get("b")
+        self.answer("2")
+        self.assertEqual((yield second),"2")
+
+    @gen_test
+    def test_transaction_dropped_whole(self):
+        yield self.connect(max_pending=1,max_offline_queue=4,overflow="drop_oldest")
+        first = self.client.get("a")
+        second = self.client.get("b")
+        tx = self.client.pipeline(transaction=True)
+        tx.incr("n")
+        tx.incr("n")
+        executed = tx.execute()
+        with self.assertRaises(QueueFullError):
+            yield second
+        self.assertEqual(len(self.client.offline_queue),4)
+        # making room for one more command drops the whole transaction
+        third = self.client.get("c")
+        with self.assertRaises(QueueFullError):
+            yield executed
+        self.assertEqual(self.client.dropped,5)
+        self.answer("1","3")
+        self.assertEqual((yield [first,third]),["1","3"])
+
+    @gen_test
+    def test_queued_transaction_sent_whole(self):
+        yield self.connect(max_pending=1,max_offline_queue=4,overflow="reject")
+        first = self.client.get("a")
+        tx = self.client.pipeline(transaction=True)
+        tx.incr("n")
+        tx.incr("n")
+        executed = tx.execute()
+        self.answer("1")
+        self.assertEqual((yield first),"1")
+        self.conn.sendall("+OK\r\n+QUEUED\r\n+QUEUED\r\n*2\r\n:1\r\n:2\r\n")
+        self.assertEqual((yield executed),[1,2])
+
+    @gen_test
+    def test_wait(self):
+        yield self.connect(max_pending=1,max_offline_queue=1,overflow="wait")
+        futures = [self.client.get(key) for key in "abc"]
+        self.assertEqual(len(self.client.offline_queue),1)
+        self.assertEqual(len(self.client.waiting),1)
+        self.answer("1","2","3")
+        self.assertEqual((yield futures),["1","2","3"])
+
+    @gen_test
+    def test_wait_is_bounded(self):
+        yield self.connect(max_pending=1,max_offline_queue=1,overflow="wait",max_waiting=1)
+        futures = [self.client.get(key) for key in "abc"]
+        with self.assertRaises(QueueFullError):
+            yield self.client.get("d")
+        self.assertEqual(len(self.client.waiting),1)
+        self.assertEqual(self.client.rejected,1)
+        self.answer("1","2","3")
+        self.assertEqual((yield futures),["1","2","3"])
+
+    @gen_test
+    def test_water_marks(self):
+        yield self.connect(high_water_mark=1024*1024,low_water_mark=0)
+        events = []
+        self.client.on("high_water",lambda: events.append("high"))
+        value = "x" * (1024*1024)
+        for i in xrange(16):
+            self.client.set("k",value,lambda reply,error=None: None)
+        self.assertEqual(events,["high"])
+        self.assertTrue(self.client.throttled)
+
+        self.conn,_ = self.listener.accept()
+        def read_all():
+            try:
+                while self.conn.recv(65536):
+                    pass
+            except socket.error:
+                pass
+        reader = threading.Thread(target=read_all)
+        reader.daemon = True
+        reader.start()
+        yield self.client.when_writable()
+        self.assertFalse(self.client.throttled)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,133 @@
+from tornado.testing import AsyncTestCase,gen_test
+import unittest
+
+from tornado_redis.client import RedisClient
+
+
+class BatchTestCase(AsyncTestCase):
+    def setUp(self):
+        super(BatchTestCase,self).setUp()
+        self.clients = []
+        self.client = self.create_client(batch_reads=True,batch_hget=True)
+
+    def tearDown(self):
+        for client in self.clients:
+            client.end()
+        super(BatchTestCase,self).tearDown()
+
+    def create_client(self,**options):
+        client = RedisClient(io_loop=self.io_loop,**options)
+        self.clients.append(client)
+        return client
+
+    def sent(self):
+        return self.client.commands_sent
+
+    @gen_test
+    def test_gets_become_one_mget(self):
+        yield self.client.mset("tornado_redis:batch:1","a","tornado_redis:batch:2","b")
+        sent = self.sent()
+        replies = yield [self.client.get("tornado_redis:batch:1"),self.client.get("tornado_redis:batch:2"),
+                         self.client.get("tornado_redis:batch:none"),self.client.get("tornado_redis:batch:1")]
+        self.assertEqual(replies,["a","b",None,"a"])
+        # one MGET, and a GET to check the nil is not another type
+        self.assertEqual(self.sent() - sent,2)
+        self.assertEqual(self.client.stats().batched,3)
+
+    @gen_test
+    def test_max_batch(self):
+        client = self.create_client(batch_reads=True,max_batch=4)
+        yield client.set("tornado_redis:batch:1","a")
+        sent = client.commands_sent
+        replies = yield [client.get("tornado_redis:batch:1") for i in xrange(10)]
+        self.assertEqual(replies,["a"] * 10)
+        # two full batches sent right away, then the remaining two
+        self.assertEqual(client.commands_sent - sent,3)
+
+    @gen_test
+    def test_other_commands_keep_their_order(self):
+        yield self.client.set("tornado_redis:batch:1","old")
+        before = self.client.get("tornado_redis:batch:1")
+        self.client.set("tornado_redis:batch:1","new")
+        after = self.client.get("tornado_redis:batch:1")
+        self.assertEqual((yield before),"old")
+        self.assertEqual((yield after),"new")
+
+    @gen_test
+    def test_hgets_of_one_hash(self):
+        yield self.client.hmset("tornado_redis:batch:h","f1","1","f2","2")
+        yield self.client.set("tornado_redis:batch:1","a")
+        sent = self.sent()
+        replies = yield [self.client.hget("tornado_redis:batch:h","f1"),
+                         self.client.get("tornado_redis:batch:1"),
+                         self.client.hget("tornado_redis:batch:h","f2"),
+                         self.client.hget("tornado_redis:batch:h","none")]
+        self.assertEqual(replies,["1","a","2",None])
+        # one HMGET, and the lone GET sent as it is
+        self.assertEqual(self.sent() - sent,2)
+
+    @gen_test
+    def test_errors_reach_every_caller(self):
+        yield self.client.set("tornado_redis:batch:1","a")
+        futures = [self.client.hget("tornado_redis:batch:1","f1"),
+                   self.client.hget("tornado_redis:batch:1","f2")]
+        for future in futures:
+            with self.assertRaises(Exception):
+                yield future
+
+    @gen_test
+    def test_not_batched_inside_multi(self):
+        yield self.client.mset("tornado_redis:batch:1","A","tornado_redis:batch:2","B")
+        self.client.multi()
+        first = self.client.get("tornado_redis:batch:1")
+        second = self.client.get("tornado_redis:batch:2")
+        replies = yield self.client.send_command("exec")
+        self.assertEqual((yield [first,second]),["QUEUED","QUEUED"])
+        self.assertEqual(replies,["A","B"])
+        # batching resumes after EXEC
+        sent = self.sent()
+        yield [self.client.get("tornado_redis:batch:1"),self.client.get("tornado_redis:batch:2")]
+        self.assertEqual(self.sent() - sent,1)
+
+    @gen_test
+    def test_batched_get_of_another_type(self):
+        yield self.client.hset("tornado_redis:batch:h","f1","1")
+        yield self.client.set("tornado_redis:batch:1","a")
+        wrong = self.client.get("tornado_redis:batch:h")
+        right = self.client.get("tornado_redis:batch:1")
+        self.assertEqual((yield right),"a")
+        with self.assertRaises(Exception):
+            yield wrong
+
+    @gen_test
+    def test_nil_checked_after_a_write(self):
+        yield self.client.send_command("del","tornado_redis:batch:late")
+        yield self.client.set("tornado_redis:batch:1","a")
+        missing = self.client.get("tornado_redis:batch:late")
+        self.client.get("tornado_redis:batch:1")
+        self.client.set("tornado_redis:batch:late","late")
+        # the GET was answered before the SET, whatever the check finds
+        self.assertIsNone((yield missing))
+        yield self.client.send_command("del","tornado_redis:batch:late")
+
+    @gen_test
+    def test_flush_now(self):
+        yield self.client.ping()
+        sent = self.sent()
+        first = self.client.get("tornado_redis:batch:1")
+        self.assertEqual(self.sent(),sent)
+        self.client.flush_batches()
+        self.assertEqual(self.sent() - sent,1)
+        yield first
+
+    @gen_test
+    def test_hget_needs_batch_hget(self):
+        client = self.create_client(batch_reads=True)
+        yield client.hmset("tornado_redis:batch:h","f1","1","f2","2")
+        sent = client.commands_sent
+        yield [client.hget("tornado_redis:batch:h","f1"),client.hget("tornado_redis:batch:h","f2")]
+        self.assertEqual(client.commands_sent - sent,2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,73 @@
+from tornado.testing import AsyncTestCase
+import unittest
+
+from tornado_redis.client import RedisClient
+from tornado_redis.cache import ReadCache
+
+
+class ReadCacheTestCase(AsyncTestCase):
+    def setUp(self):
+        super(ReadCacheTestCase,self).setUp()
+        self.client = RedisClient(io_loop=self.io_loop)
+        self.client.on("error",self.stop)
+        self.other = RedisClient(io_loop=self.io_loop)
+        self.other.on("error",self.stop)
+        self.client.config("set","notify-keyspace-events","KA")
+        self.client.set("tornado_redis:cache","1",self.on_reply)
+        self.wait()
+
+    def tearDown(self):
+        self.cache.end()
+        self.client.end()
+        self.other.end()
+        super(ReadCacheTestCase,self).tearDown()
+
+    def on_reply(self,reply,error=None):
+        self.stop(reply)
+
+    def listen(self,cache):
+        self.cache = cache
+        if not cache.listening:
+            cache.subscriber.on("subscribe",lambda *args: self.stop())
+            cache.subscriber.on("psubscribe",lambda *args: self.stop())
+            self.wait()
+
+    def test_hit_and_miss(self):
+        self.listen(ReadCache(self.client))
+        self.cache.get("tornado_redis:cache",self.on_reply)
+        self.assertEqual(self.wait(),"1")
+        self.cache.get("tornado_redis:cache",self.on_reply)
+        self.assertEqual(self.wait(),"1")
+        stats = self.cache.stats()
+        self.assertEqual((stats.hits,stats.misses,stats.size),(1,1,1))
+
+    def test_keyspace_invalidation(self):
+        self.listen(ReadCache(self.client))
+        self.cache.get("tornado_redis:cache",self.on_reply)
+        self.wait()
+        self.other.set("tornado_redis:cache","2")
+        self.cache.subscriber.on("pmessage",lambda *args: self.stop())
+        self.wait()
+        self.cache.get("tornado_redis:cache",self.on_reply)
+        self.assertEqual(self.wait(),"2")
+        self.assertEqual(self.cache.stats().invalidations,1)
+
+    def test_channel_invalidation(self):
+        self.listen(ReadCache(self.client,channel="tornado_redis:invalidate"))
+        self.cache.get("tornado_redis:cache",self.on_reply)
+        self.wait()
+        self.other.publish("tornado_redis:invalidate","tornado_redis:cache")
+        self.cache.subscriber.on("message",lambda *args: self.stop())
+        self.wait()
+        self.assertEqual(self.cache.stats().size,0)
+
+    def test_eviction(self):
+        self.listen(ReadCache(self.client,max_keys=1))
+        self.cache.get("tornado_redis:cache")
+        self.cache.get("tornado_redis:cache:other",self.on_reply)
+        self.wait()
+        stats = self.cache.stats()
+        self.assertEqual((stats.evictions,stats.size),(1,1))
+
+if __name__ == '__main__':
+    unittest.main()
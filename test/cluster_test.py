@@ -0,0 +1,101 @@
+from tornado.testing import AsyncTestCase
+import unittest
+
+from tornado_redis.cluster import ClusterClient,key_slot,crc16
+from tornado_redis.testing import FakeCluster
+
+BASE_PORT = 17100
+
+class KeySlotTestCase(unittest.TestCase):
+    def test_crc16(self):
+        self.assertEqual(crc16("123456789"),0x31c3)
+        self.assertEqual(key_slot("foo"),12182)
+
+    def test_hash_tags(self):
+        self.assertEqual(key_slot("{user1000}.following"),key_slot("{user1000}.followers"))
+        # an empty tag means the whole key is hashed
+        self.assertEqual(key_slot("foo{}{bar}"),crc16("foo{}{bar}") % 16384)
+        self.assertEqual(key_slot("foo{{bar}}zap"),key_slot("{bar"))
+
+
+class ClusterTestCase(AsyncTestCase):
+    migrating = None
+
+    def setUp(self):
+        super(ClusterTestCase,self).setUp()
+        self.cluster = FakeCluster(BASE_PORT,migrating=self.migrating)
+        self.client = ClusterClient(self.cluster.addresses[:1],io_loop=self.io_loop)
+        self.client.on("error",self.stop)
+        self.client.on("ready",self.stop)
+        self.wait()
+
+    def tearDown(self):
+        self.client.end()
+        self.cluster.stop()
+        super(ClusterTestCase,self).tearDown()
+
+    def on_reply(self,reply,error=None):
+        self.stop((reply,error))
+
+
+class RoutingTestCase(ClusterTestCase):
+    def test_routes_by_slot(self):
+        keys = ["a","b","c","d","e","f"]
+        for key in keys:
+            self.client.set(key,key.upper())
+        self.client.get("f",self.on_reply)
+        self.assertEqual(self.wait(),("F",None))
+        self.assertEqual(len(self.client.nodes),3)
+        self.assertEqual(self.client.redirects,0)
+
+    def test_split_multi_key(self):
+        self.client.mset("a","1","b","2","c","3","{a}x","4",self.on_reply)
+        self.assertEqual(self.wait(),("OK",None))
+        self.client.mget("c","missing","a","{a}x","b",self.on_reply)
+        self.assertEqual(self.wait(),(["3",None,"1","4","2"],None))
+        self.client.send_command("del","a","b","missing",self.on_reply)
+        self.assertEqual(self.wait(),(2,None))
+
+    def test_follows_moved(self):
+        slot = key_slot("a")
+        owner = self.client.slots[slot]
+        wrong = [a for a in self.cluster.addresses if a != owner][0]
+        self.client.slots[slot] = wrong
+        self.client.set("a","1",self.on_reply)
+        self.assertEqual(self.wait(),("OK",None))
+        self.assertEqual(self.client.redirects,1)
+
+
+class AskTestCase(ClusterTestCase):
+    migrating = {key_slot("a"): 0}
+
+    def test_follows_ask(self):
+        self.client.set("a","1",self.on_reply)
+        self.assertEqual(self.wait(),("OK",None))
+        self.client.get("a",self.on_reply)
+        self.assertEqual(self.wait(),("1",None))
+        self.assertEqual(self.client.redirects,2)
+
+class UnreachableStartupNodeTestCase(AsyncTestCase):
+    def setUp(self):
+        super(UnreachableStartupNodeTestCase,self).setUp()
+        self.cluster = FakeCluster(BASE_PORT)
+
+    def tearDown(self):
+        self.client.end()
+        self.cluster.stop()
+        super(UnreachableStartupNodeTestCase,self).tearDown()
+
+    def test_loads_slots_from_next_address(self):
+        dead = ("127.0.0.1",BASE_PORT + 99) # nothing listens here
+        self.client = ClusterClient([dead] + self.cluster.addresses[:1],io_loop=self.io_loop)
+        self.client.on("ready",self.stop)
+        self.wait()
+        self.assertFalse(self.client.refreshing)
+        self.assertNotIn(dead,self.client.nodes)
+        self.client.set("a","1")
+        self.client.get("a",lambda reply,error=None: self.stop((reply,error)))
+        self.assertEqual(self.wait(),("1",None))
+
+if __name__ == '__main__':
+    unittest.main()
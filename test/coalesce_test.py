@@ -0,0 +1,99 @@
+from tornado.testing import AsyncTestCase,gen_test
+import unittest
+
+from tornado_redis.client import RedisClient
+
+
+class CoalesceTestCase(AsyncTestCase):
+    def setUp(self):
+        super(CoalesceTestCase,self).setUp()
+        self.client = RedisClient(io_loop=self.io_loop,coalesce_reads=True)
+
+    def tearDown(self):
+        self.client.end()
+        super(CoalesceTestCase,self).tearDown()
+
+    @gen_test
+    def test_identical_reads_share_one_request(self):
+        yield self.client.set("tornado_redis:coalesce","hot")
+        sent = self.client.commands_sent
+        replies = yield [self.client.get("tornado_redis:coalesce") for i in xrange(100)]
+        self.assertEqual(replies,["hot"] * 100)
+        self.assertEqual(self.client.commands_sent - sent,1)
+        self.assertEqual(self.client.stats().coalesced,99)
+
+        # once answered, the next read is sent again
+        yield self.client.set("tornado_redis:coalesce","cold")
+        self.assertEqual((yield self.client.get("tornado_redis:coalesce")),"cold")
+
+    @gen_test
+    def test_callbacks_and_futures_mix(self):
+        yield self.client.set("tornado_redis:coalesce","hot")
+        got = []
+        self.client.get("tornado_redis:coalesce",lambda reply,error=None: got.append(reply))
+        reply = yield self.client.get("tornado_redis:coalesce")
+        self.assertEqual(got,["hot"])
+        self.assertEqual(reply,"hot")
+
+    @gen_test
+    def test_different_arguments_and_writes_are_sent(self):
+        yield self.client.ping()
+        sent = self.client.commands_sent
+        yield [self.client.get("tornado_redis:coalesce:a"),self.client.get("tornado_redis:coalesce:b"),
+               self.client.incr("tornado_redis:coalesce:n"),self.client.incr("tornado_redis:coalesce:n")]
+        self.assertEqual(self.client.commands_sent - sent,4)
+        self.assertEqual(self.client.coalesced,0)
+
+    @gen_test
+    def test_reads_after_a_write_are_sent(self):
+        self.client.set("tornado_redis:coalesce","old")
+        before = self.client.get("tornado_redis:coalesce")
+        self.client.set("tornado_redis:coalesce","new")
+        after = self.client.get("tornado_redis:coalesce")
+        self.assertEqual((yield [before,after]),["old","new"])
+        self.assertEqual(self.client.coalesced,0)
+
+    @gen_test
+    def test_reads_after_a_pipeline_are_sent(self):
+        yield self.client.set("tornado_redis:coalesce","old")
+        before = self.client.get("tornado_redis:coalesce")
+        pipeline = self.client.pipeline()
+        pipeline.set("tornado_redis:coalesce","new")
+        done = pipeline.execute()
+        after = self.client.get("tornado_redis:coalesce")
+        yield done
+        self.assertEqual((yield [before,after]),["old","new"])
+
+    @gen_test
+    def test_errors_reach_every_caller(self):
+        yield self.client.hset("tornado_redis:coalesce:hash","f","v")
+        futures = [self.client.get("tornado_redis:coalesce:hash") for i in xrange(3)]
+        for future in futures:
+            with self.assertRaises(Exception):
+                yield future
+        self.assertEqual(self.client.coalesced,2)
+
+    @gen_test
+    def test_not_inside_multi(self):
+        yield self.client.set("tornado_redis:coalesce","hot")
+        outside = self.client.get("tornado_redis:coalesce")
+        self.client.multi()
+        queued = self.client.get("tornado_redis:coalesce")
+        replies = yield self.client.send_command("exec")
+        self.assertEqual((yield outside),"hot")
+        self.assertEqual((yield queued),"QUEUED")
+        self.assertEqual(replies,["hot"])
+        self.assertEqual(self.client.coalesced,0)
+
+    @gen_test
+    def test_off_by_default(self):
+        client = RedisClient(io_loop=self.io_loop)
+        try:
+            yield [client.get("tornado_redis:coalesce") for i in xrange(3)]
+            self.assertEqual(client.stats().coalesced,0)
+        finally:
+            client.end()
+
+
+if __name__ == '__main__':
+    unittest.main()
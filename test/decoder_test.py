@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+from tornado.testing import AsyncTestCase,gen_test
+import unittest
+
+from tornado_redis.client import RedisClient
+from tornado_redis.decoders import decode_hash,decode_info,decode_scores
+from tornado_redis.parser import PARSERS
+
+
+class DecoderTestCase(unittest.TestCase):
+    def test_hash(self):
+        self.assertEqual(decode_hash(["a","1","b","2"]),{"a": "1","b": "2"})
+        self.assertEqual(decode_hash([]),{})
+        self.assertEqual(decode_hash([memoryview("a"),"1"]),{"a": "1"})
+
+    def test_scores(self):
+        self.assertEqual(decode_scores(["a","1","b","2.5"],[0,-1,"WITHSCORES"]),[("a",1.0),("b",2.5)])
+        self.assertEqual(decode_scores(["a","b"],[0,-1]),["a","b"])
+
+    def test_info(self):
+        info = decode_info("# Server\r\nredis_version:2.6.0\r\n\r\n# Keyspace\r\ndb0:keys=3,expires=1\r\n")
+        self.assertEqual(info.redis_version,"2.6.0")
+        self.assertEqual(info.db0,{"keys": "3","expires": "1"})
+
+
+class ClientDecoderTestCase(AsyncTestCase):
+    def setUp(self):
+        super(ClientDecoderTestCase,self).setUp()
+        self.client = RedisClient(io_loop=self.io_loop)
+
+    def tearDown(self):
+        self.client.end()
+        super(ClientDecoderTestCase,self).tearDown()
+
+    @gen_test
+    def test_typed_replies(self):
+        yield self.client.send_command("del","tornado_redis:hash","tornado_redis:zset")
+        yield self.client.hmset("tornado_redis:hash","a","1","b","2")
+        yield self.client.zadd("tornado_redis:zset",1,"x",2.5,"y")
+        self.assertEqual((yield self.client.hgetall("tornado_redis:hash")),{"a": "1","b": "2"})
+        self.assertEqual((yield self.client.hgetall("tornado_redis:missing")),{})
+        self.assertEqual((yield self.client.zrange("tornado_redis:zset",0,-1,"withscores")),
+                         [("x",1.0),("y",2.5)])
+        self.assertEqual((yield self.client.config("get","maxmemory")).keys(),["maxmemory"])
+        self.assertTrue((yield self.client.info()).redis_version)
+
+    @gen_test
+    def test_register_decoder(self):
+        self.client.register_decoder("get",lambda reply,args: int(reply))
+        yield self.client.set("tornado_redis:decode","12")
+        self.assertEqual((yield self.client.get("tornado_redis:decode")),12)
+        self.client.register_decoder("get",None)
+        self.assertEqual((yield self.client.get("tornado_redis:decode")),"12")
+
+    @gen_test
+    def test_decoder_error_fails_only_its_command(self):
+        def broken(reply,args):
+            raise ValueError("cannot decode")
+        self.client.register_decoder("get",broken)
+        yield self.client.set("tornado_redis:decode","12")
+        failing = self.client.get("tornado_redis:decode")
+        after = self.client.ping()
+        with self.assertRaises(ValueError):
+            yield failing
+        self.assertEqual((yield after),"PONG")
+
+    @gen_test
+    def test_memoryview_replies(self):
+        client = RedisClient(io_loop=self.io_loop,parser="python",bulk_as_memoryview=True)
+        try:
+            yield client.send_command("del","tornado_redis:zset")
+            yield client.zadd("tornado_redis:zset",1,"x",2.5,"y")
+            scores = yield client.zrange("tornado_redis:zset",0,-1,"withscores")
+            config = yield client.config("get","maxmemory")
+            self.assertEqual((yield client.ping()),"PONG")
+        finally:
+            client.end()
+        self.assertEqual([(member.tobytes(),score) for member,score in scores],[("x",1.0),("y",2.5)])
+        self.assertEqual(config.keys(),["maxmemory"])
+
+    @gen_test
+    def test_transaction_results_decoded(self):
+        tx = self.client.pipeline(transaction=True)
+        tx.hmset("tornado_redis:hash","a","1")
+        tx.hgetall("tornado_redis:hash")
+        replies = yield tx.execute()
+        self.assertEqual(replies[1]["a"],"1")
+
+    @gen_test
+    def test_decode_replies(self):
+        for parser in PARSERS:
+            client = RedisClient(io_loop=self.io_loop,parser=parser,decode_replies=True)
+            try:
+                yield client.set("tornado_redis:decode",u"caf\xe9")
+                reply = yield client.get("tornado_redis:decode")
+            finally:
+                client.end()
+            self.assertEqual(reply,u"caf\xe9")
+            self.assertTrue(isinstance(reply,unicode))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+import unittest
+
+from tornado_redis.encoder import Encoder
+
+
+class EncoderTestCase(unittest.TestCase):
+    def test_pack(self):
+        encoder = Encoder(["set"])
+        self.assertEqual(encoder.pack("set",["key",12]),
+                         "*3\r\n$3\r\nset\r\n$3\r\nkey\r\n$2\r\n12\r\n")
+
+    def test_argument_types(self):
+        encoder = Encoder()
+        self.assertEqual(encoder.pack("echo",[u"é"]),"*2\r\n$4\r\necho\r\n$2\r\n\xc3\xa9\r\n")
+        self.assertEqual(encoder.pack("echo",[-5]),"*2\r\n$4\r\necho\r\n$2\r\n-5\r\n")
+        self.assertEqual(encoder.pack("echo",[100000L]),"*2\r\n$4\r\necho\r\n$6\r\n100000\r\n")
+        big = "x" * 5000
+        self.assertEqual(encoder.pack("echo",[big]),"*2\r\n$4\r\necho\r\n$5000\r\n%s\r\n" % big)
+
+    def test_pack_into_shared_buffer(self):
+        encoder = Encoder()
+        out = []
+        encoder.pack_into(out,"ping",[])
+        encoder.pack_into(out,"get",["a"])
+        self.assertEqual(''.join(out),"*1\r\n$4\r\nping\r\n*2\r\n$3\r\nget\r\n$1\r\na\r\n")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,57 @@
+from tornado.testing import AsyncTestCase,gen_test
+import unittest
+
+from tornado_redis.client import RedisClient
+from tornado_redis.pool import RedisPool
+
+
+class FutureTestCase(AsyncTestCase):
+    def setUp(self):
+        super(FutureTestCase,self).setUp()
+        self.client = RedisClient(io_loop=self.io_loop)
+
+    def tearDown(self):
+        self.client.end()
+        super(FutureTestCase,self).tearDown()
+
+    @gen_test
+    def test_returns_future(self):
+        yield self.client.set("tornado_redis:future","1")
+        reply = yield self.client.get("tornado_redis:future")
+        self.assertEqual(reply,"1")
+
+    @gen_test
+    def test_concurrent_futures(self):
+        yield self.client.mset("tornado_redis:future:a","1","tornado_redis:future:b","2")
+        a,b = yield [self.client.get("tornado_redis:future:a"),self.client.get("tornado_redis:future:b")]
+        self.assertEqual((a,b),("1","2"))
+
+    @gen_test
+    def test_error_raises(self):
+        yield self.client.set("tornado_redis:future","x")
+        with self.assertRaises(Exception):
+            yield self.client.incr("tornado_redis:future")
+
+    @gen_test
+    def test_gather(self):
+        replies = yield self.client.gather(("set","tornado_redis:future:g","3"),
+                                           ("incr","tornado_redis:future:g"),
+                                           ("get","tornado_redis:future:g"))
+        self.assertEqual(replies,["OK",4,"4"])
+
+    def test_callback_still_supported(self):
+        result = self.client.ping(lambda reply,error=None: self.stop(reply))
+        self.assertEqual(result,None)
+        self.assertEqual(self.wait(),"PONG")
+
+    @gen_test
+    def test_pool_returns_future(self):
+        pool = RedisPool(io_loop=self.io_loop,size=2)
+        try:
+            reply = yield pool.ping()
+            self.assertEqual(reply,"PONG")
+        finally:
+            pool.end()
+
+if __name__ == '__main__':
+    unittest.main()
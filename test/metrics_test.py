@@ -0,0 +1,47 @@
+from tornado.testing import AsyncTestCase,gen_test
+import unittest
+
+from tornado_redis.client import RedisClient
+from tornado_redis.metrics import Histogram,bucket_index,bucket_bounds
+
+
+class HistogramTestCase(unittest.TestCase):
+    def test_buckets_cover_values(self):
+        for value in range(0,5000) + [2**20,2**20 + 12345,2**40 + 1]:
+            lower,upper = bucket_bounds(bucket_index(value))
+            self.assertTrue(lower <= value < upper,value)
+
+    def test_percentiles(self):
+        histogram = Histogram()
+        for ms in xrange(1,101):
+            histogram.record(ms / 1000.0)
+        self.assertEqual(histogram.count,100)
+        self.assertAlmostEqual(histogram.percentile(50),0.050,delta=0.050 / 16)
+        self.assertAlmostEqual(histogram.percentile(99),0.099,delta=0.099 / 16)
+        self.assertEqual(histogram.percentile(100),0.1)
+
+
+class ClientMetricsTestCase(AsyncTestCase):
+    @gen_test
+    def test_stats(self):
+        client = RedisClient(io_loop=self.io_loop,metrics=True)
+        try:
+            yield client.set("tornado_redis:metrics","1")
+            yield [client.get("tornado_redis:metrics") for i in xrange(10)]
+            with self.assertRaises(Exception):
+                yield client.hget("tornado_redis:metrics","field")
+            stats = client.stats()
+        finally:
+            client.end()
+        self.assertEqual(stats.in_flight,0)
+        self.assertEqual(stats.commands["get"]["reply"]["count"],10)
+        self.assertEqual(stats.commands["hget"]["errors"],1)
+        self.assertTrue(stats.bytes_written > 0 and stats.bytes_read > 0)
+
+    def test_disabled(self):
+        client = RedisClient(io_loop=self.io_loop)
+        self.assertEqual(client.stats().commands,None)
+        client.end()
+
+if __name__ == '__main__':
+    unittest.main()
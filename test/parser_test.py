@@ -0,0 +1,53 @@
+import unittest
+
+from tornado_redis.parser import Parser,PythonReader,ReplyError,PARSERS
+
+
+class PythonReaderTestCase(unittest.TestCase):
+    def replies(self,reader,*chunks):
+        replies = []
+        for chunk in chunks:
+            reader.feed(chunk)
+            while True:
+                reply = reader.gets()
+                if reply is False: break
+                replies.append(reply)
+        return replies
+
+    def test_types(self):
+        replies = self.replies(PythonReader(),"+OK\r\n:42\r\n$3\r\nfoo\r\n$-1\r\n*-1\r\n*0\r\n-ERR bad\r\n")
+        self.assertEqual(replies[:6],["OK",42,"foo",None,None,[]])
+        self.assertTrue(isinstance(replies[6],ReplyError))
+        self.assertEqual(str(replies[6]),"ERR bad")
+
+    def test_partial_nested_multi_bulk(self):
+        data = "*3\r\n$1\r\na\r\n*2\r\n:1\r\n$0\r\n\r\n$5\r\nhello\r\n:7\r\n"
+        chunks = [data[i:i+3] for i in range(0,len(data),3)]
+        self.assertEqual(self.replies(PythonReader(),*chunks),[["a",[1,""],"hello"],7])
+
+    def test_bulk_as_memoryview(self):
+        reader = PythonReader(bulk_as_memoryview=True)
+        replies = self.replies(reader,"*2\r\n$3\r\nfoo\r\n$3\r\nbar\r\n","$2\r\nhi\r\n")
+        self.assertTrue(isinstance(replies[0][0],memoryview))
+        self.assertEqual([r.tobytes() for r in replies[0]],["foo","bar"])
+        self.assertEqual(replies[1].tobytes(),"hi")
+
+    def test_backends_agree(self):
+        data = "*4\r\n$3\r\nfoo\r\n:12\r\n$-1\r\n*1\r\n+OK\r\n"
+        for name in PARSERS:
+            replies = []
+            parser = Parser(name=name)
+            parser.on("reply",replies.append)
+            parser.execute(data[:9])
+            parser.execute(data[9:])
+            self.assertEqual(replies,[["foo",12,None,["OK"]]])
+
+    def test_nil_reply_does_not_stop_parsing(self):
+        replies = []
+        parser = Parser(name="python")
+        parser.on("reply",replies.append)
+        parser.execute("$-1\r\n:1\r\n")
+        self.assertEqual(replies,[None,1])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,61 @@
+from tornado.testing import AsyncTestCase
+import unittest
+
+from tornado_redis.client import RedisClient
+
+
+class PipelineTestCase(AsyncTestCase):
+    def setUp(self):
+        super(PipelineTestCase,self).setUp()
+        self.client = RedisClient(io_loop=self.io_loop)
+        self.client.on("error",self.stop)
+        self.writes = []
+        write = self.client.stream.write
+        def counting_write(data):
+            self.writes.append(data)
+            write(data)
+        self.client.stream.write = counting_write
+
+    def tearDown(self):
+        self.client.end()
+        super(PipelineTestCase,self).tearDown()
+
+    def on_replies(self,replies,error=None):
+        self.stop(replies)
+
+    def test_single_write(self):
+        p = self.client.pipeline()
+        for i in range(200):
+            p.hset("tornado_redis:pipeline", "field%d" % i, i)
+        p.execute(self.on_replies)
+        replies = self.wait()
+        self.assertEqual(len(replies),200)
+        self.assertEqual(len([w for w in self.writes if "hset" in w]),1)
+
+    def test_ordered_replies_and_callbacks(self):
+        seen = []
+        p = self.client.pipeline()
+        p.set("tornado_redis:pipeline:a","1")
+        p.incr("tornado_redis:pipeline:a",lambda reply,error=None: seen.append(reply))
+        p.get("tornado_redis:pipeline:a")
+        p.execute(self.on_replies)
+        self.assertEqual(self.wait(),["OK",2,"2"])
+        self.assertEqual(seen,[2])
+
+    def test_error_in_place(self):
+        p = self.client.pipeline()
+        p.set("tornado_redis:pipeline:b","x")
+        p.incr("tornado_redis:pipeline:b")
+        p.get("tornado_redis:pipeline:b")
+        p.execute(self.on_replies)
+        replies = self.wait()
+        self.assertEqual(replies[0],"OK")
+        self.assertTrue(isinstance(replies[1],Exception))
+        self.assertEqual(replies[2],"x")
+
+    def test_empty(self):
+        self.client.pipeline().execute(self.on_replies)
+        self.assertEqual(self.wait(),[])
+
+if __name__ == '__main__':
+    unittest.main()
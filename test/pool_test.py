@@ -0,0 +1,52 @@
+from tornado.testing import AsyncTestCase
+import unittest
+
+from tornado_redis.pool import RedisPool
+
+
+class PoolTestCase(AsyncTestCase):
+    def setUp(self):
+        super(PoolTestCase,self).setUp()
+        self.pool = RedisPool(io_loop=self.io_loop,size=3,replace_delay=.01)
+        self.pool.on("error",self.stop)
+        self.pool.on("ready",self.stop)
+        self.wait()
+
+    def tearDown(self):
+        self.pool.end()
+        super(PoolTestCase,self).tearDown()
+
+    def test_least_outstanding(self):
+        self.pool.ping()
+        self.pool.ping()
+        self.pool.ping(lambda reply,error=None: self.stop(reply))
+        self.assertEqual([len(c.command_queue) for c in self.pool.clients],[1,1,1])
+        self.assertEqual(self.wait(),"PONG")
+
+    def test_replace_failed_connection(self):
+        failed = self.pool.clients[0]
+        self.pool.on("replaced",self.stop)
+        failed.stream.close()
+        replacement = self.wait()
+        self.assertTrue(failed not in self.pool.clients)
+        self.assertTrue(replacement in self.pool.clients)
+        self.assertEqual(self.pool.replacements,1)
+
+    def test_replacement_takes_waiting_commands(self):
+        failed = self.pool.clients[0]
+        def on_end():
+            # hold the next command with the "wait" policy
+            failed.max_offline_queue = 0
+            failed.overflow = "wait"
+            failed.ping(lambda reply,error=None: self.stop((reply,error)))
+            self.assertEqual(len(failed.waiting),1)
+        failed.on("end",on_end)
+        failed.stream.close()
+        self.assertEqual(self.wait(),("PONG",None))
+        self.assertEqual(len(failed.waiting),0)
+
+    def test_connection_commands_rejected(self):
+        self.assertRaises(ValueError,self.pool.subscribe,"channel")
+
+if __name__ == '__main__':
+    unittest.main()
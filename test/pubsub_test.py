@@ -0,0 +1,81 @@
+from tornado.testing import AsyncTestCase,gen_test
+import unittest
+
+from tornado_redis.client import RedisClient
+from tornado_redis.pubsub import PubSubHub
+
+
+class PubSubHubTestCase(AsyncTestCase):
+    def setUp(self):
+        super(PubSubHubTestCase,self).setUp()
+        self.hub = PubSubHub(io_loop=self.io_loop)
+        self.hub.on("error",self.stop)
+        self.publisher = RedisClient(io_loop=self.io_loop)
+        self.sent = []
+        send_command = self.hub.client.send_command
+        def recording_send(command,*args):
+            self.sent.append((command,) + args)
+            return send_command(command,*args)
+        self.hub.client.send_command = recording_send
+        self.hub.client.on("ready",self.stop)
+        self.wait()
+        del self.sent[:]
+
+    def tearDown(self):
+        self.hub.end()
+        self.publisher.end()
+        super(PubSubHubTestCase,self).tearDown()
+
+    def test_reference_counted_subscriptions(self):
+        first = lambda channel,message: None
+        second = lambda channel,message: None
+        self.hub.subscribe("tornado_redis:a",first)
+        self.hub.subscribe("tornado_redis:a",second)
+        self.assertEqual(self.sent,[("subscribe","tornado_redis:a")])
+        self.hub.unsubscribe("tornado_redis:a",first)
+        self.assertEqual(len(self.sent),1)
+        self.hub.unsubscribe("tornado_redis:a",second)
+        self.assertEqual(self.sent[-1],("unsubscribe","tornado_redis:a"))
+
+    def test_routes_to_channel_handlers(self):
+        received = []
+        self.hub.subscribe("tornado_redis:a",lambda channel,message: received.append(("a",message)))
+        self.hub.subscribe("tornado_redis:b",lambda channel,message: received.append(("b",message)))
+        self.hub.psubscribe("tornado_redis:p*",lambda channel,message: self.stop((channel,message)))
+        self.hub.client.on("psubscribe",lambda *args: self.stop())
+        self.wait()
+        self.publisher.publish("tornado_redis:a","1")
+        self.publisher.publish("tornado_redis:b","2")
+        self.publisher.publish("tornado_redis:pq","3")
+        self.assertEqual(self.wait(),("tornado_redis:pq","3"))
+        self.assertEqual(received,[("a","1"),("b","2")])
+
+
+class SubscribeFutureTestCase(AsyncTestCase):
+    def setUp(self):
+        super(SubscribeFutureTestCase,self).setUp()
+        self.client = RedisClient(io_loop=self.io_loop)
+
+    def tearDown(self):
+        self.client.end()
+        super(SubscribeFutureTestCase,self).tearDown()
+
+    @gen_test(timeout=2)
+    def test_acknowledgements_resolve_futures(self):
+        self.assertEqual((yield self.client.subscribe("tornado_redis:a","tornado_redis:b")),2)
+        self.assertEqual((yield self.client.psubscribe("tornado_redis:p*")),3)
+        self.assertEqual((yield self.client.unsubscribe("tornado_redis:a")),2)
+        self.assertEqual((yield self.client.punsubscribe()),1)
+        self.assertEqual((yield self.client.unsubscribe()),0)
+        self.assertFalse(self.client.subscriptions)
+        self.assertEqual((yield self.client.ping()),"PONG")
+
+    @gen_test(timeout=2)
+    def test_callback(self):
+        acked = []
+        self.client.subscribe("tornado_redis:a",lambda reply,error=None: acked.append((reply,error)))
+        yield self.client.unsubscribe("tornado_redis:a")
+        self.assertEqual(acked,[(1,None)])
+
+if __name__ == '__main__':
+    unittest.main()
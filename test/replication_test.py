@@ -0,0 +1,86 @@
+from tornado.testing import AsyncTestCase,gen_test
+import unittest
+
+from tornado_redis.client import RedisClient
+from tornado_redis.replication import ReplicatedClient
+from tornado_redis.testing import ServerProcess
+
+PRIMARY = ("127.0.0.1",17400)
+REPLICAS = [("127.0.0.1",17401),("127.0.0.1",17402),("127.0.0.1",17403),("127.0.0.1",17404)]
+INFO = [{"role": "master","master_repl_offset": 5000},
+        {"role": "slave","master_link_status": "up","slave_repl_offset": 5000},
+        {"role": "slave","master_link_status": "up","slave_repl_offset": 4990},
+        {"role": "slave","master_link_status": "up","slave_repl_offset": 100},
+        {"role": "slave","master_link_status": "down","slave_repl_offset": 5000}]
+
+
+class ReplicatedClientTestCase(AsyncTestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.servers = [ServerProcess(address[1],info=info)
+                       for address,info in zip([PRIMARY] + REPLICAS,INFO)]
+
+    @classmethod
+    def tearDownClass(cls):
+        for server in cls.servers:
+            server.stop()
+
+    def setUp(self):
+        super(ReplicatedClientTestCase,self).setUp()
+        self.client = ReplicatedClient(PRIMARY,REPLICAS,max_lag=100,check_interval=.05,
+                                       io_loop=self.io_loop)
+        up = []
+        def on_up(address):
+            up.append(address)
+            if len(up) == 2:
+                self.stop()
+        self.client.on("replica_up",on_up)
+        self.wait()
+
+    def tearDown(self):
+        self.client.end()
+        super(ReplicatedClientTestCase,self).tearDown()
+
+    def test_health(self):
+        self.assertEqual([replica.healthy for replica in self.client.replicas],[True,True,False,False])
+        self.assertEqual(self.client.replicas[1].lag,10)
+
+    @gen_test
+    def test_reads_go_to_replicas(self):
+        direct = RedisClient(REPLICAS[0][1],REPLICAS[0][0],io_loop=self.io_loop)
+        other = RedisClient(REPLICAS[1][1],REPLICAS[1][0],io_loop=self.io_loop)
+        try:
+            yield direct.set("tornado_redis:replica","replica")
+            yield other.set("tornado_redis:replica","replica")
+        finally:
+            direct.end()
+            other.end()
+        yield self.client.set("tornado_redis:replica","primary")
+        self.assertEqual((yield self.client.get("tornado_redis:replica")),"replica")
+        self.assertEqual((yield self.client.primary.get("tornado_redis:replica")),"primary")
+
+    @gen_test
+    def test_scans_go_to_primary(self):
+        direct = RedisClient(REPLICAS[0][1],REPLICAS[0][0],io_loop=self.io_loop)
+        try:
+            yield direct.set("tornado_redis:replica:only","replica")
+        finally:
+            direct.end()
+        yield self.client.set("tornado_redis:replica:scan","primary")
+        cursor,keys = yield self.client.scan(0)
+        self.assertIn("tornado_redis:replica:scan",keys)
+        self.assertNotIn("tornado_redis:replica:only",keys)
+        self.assertEqual(sum(replica.reads for replica in self.client.replicas),0)
+
+    def test_picks_least_loaded(self):
+        first,second = self.client.replicas[:2]
+        first.rtt,second.rtt = .001,.002
+        self.assertTrue(self.client.pick_replica() is first)
+        first.client.command_queue.extend([None] * 3)
+        try:
+            self.assertTrue(self.client.pick_replica() is second)
+        finally:
+            first.client.command_queue.clear()
+
+if __name__ == '__main__':
+    unittest.main()
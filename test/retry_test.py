@@ -0,0 +1,92 @@
+from tornado.concurrent import Future
+from tornado.testing import AsyncTestCase,gen_test
+import time
+import unittest
+
+from tornado_redis.client import RedisClient,ConnectionLostError
+from tornado_redis.testing import ServerProcess
+
+PORT = 17510 # nothing listens here until a test starts a server
+
+
+class RetryTestCase(AsyncTestCase):
+    def setUp(self):
+        super(RetryTestCase,self).setUp()
+        self.server = None
+        self.client = None
+
+    def tearDown(self):
+        if self.client:
+            self.client.closing = True
+            self.client.end()
+        if self.server:
+            self.server.stop()
+        super(RetryTestCase,self).tearDown()
+
+    def connect(self,**options):
+        self.client = RedisClient(PORT,io_loop=self.io_loop,**options)
+        self.delays = []
+        self.client.on("reconnecting",lambda arg: self.delays.append(arg.delay))
+        return self.client
+
+    def event(self,name):
+        future = Future()
+        self.client.once(name,lambda *args: future.set_result(args))
+        return future
+
+    @gen_test
+    def test_capped_exponential_backoff(self):
+        self.connect(retry_delay=.001,retry_backoff=2,retry_max_delay=.006,
+                     retry_jitter=0,max_attempts=5)
+        yield self.event("error")
+        self.assertEqual(self.delays,[.002,.004,.006,.006,.006])
+
+    @gen_test
+    def test_jitter(self):
+        self.connect(retry_delay=.001,retry_backoff=2,retry_max_delay=.004,
+                     retry_jitter=.5,max_attempts=9)
+        yield self.event("error")
+        for delay in self.delays[2:]:
+            self.assertTrue(.002 <= delay <= .004,delay)
+        self.assertGreater(len(set(self.delays[2:])),1)
+
+    @gen_test
+    def test_give_up_fails_queued_commands(self):
+        client = self.connect(retry_delay=.001,max_attempts=2)
+        queued = client.get("tornado_redis:retry")
+        yield self.event("error")
+        with self.assertRaises(ConnectionLostError):
+            yield queued
+        with self.assertRaises(ConnectionLostError):
+            yield client.get("tornado_redis:retry")
+
+    @gen_test
+    def test_expired_commands_fail_fast(self):
+        client = self.connect(retry_delay=10,max_offline_age=.05)
+        start = time.time()
+        with self.assertRaises(ConnectionLostError):
+            yield client.get("tornado_redis:retry")
+        self.assertLess(time.time() - start,1)
+        self.assertEqual(client.stats().expired,1)
+
+    @gen_test
+    def test_offline_queue_replayed_in_one_write(self):
+        client = self.connect(retry_delay=.01,retry_jitter=0)
+        batches = []
+        write_commands = client.write_commands
+        def record(command_objs):
+            batches.append(len(command_objs))
+            write_commands(command_objs)
+        client.write_commands = record
+
+        replies = [client.set("tornado_redis:retry:%d" % i,i) for i in xrange(50)]
+        yield self.event("reconnecting")
+        self.server = ServerProcess(PORT)
+        yield self.event("ready")
+        self.assertEqual(batches,[50])
+        self.assertEqual((yield replies[-1]),"OK")
+        self.assertEqual((yield client.get("tornado_redis:retry:49")),"49")
+
+
+if __name__ == '__main__':
+    unittest.main()
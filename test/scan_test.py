@@ -0,0 +1,69 @@
+from tornado.testing import AsyncTestCase,gen_test
+import unittest
+
+from tornado_redis.client import RedisClient
+
+
+class ScanTestCase(AsyncTestCase):
+    def setUp(self):
+        super(ScanTestCase,self).setUp()
+        self.client = RedisClient(io_loop=self.io_loop)
+
+    def tearDown(self):
+        self.client.end()
+        super(ScanTestCase,self).tearDown()
+
+    @gen_test
+    def test_scan_batches(self):
+        keys = ["tornado_redis:scan:%d" % i for i in xrange(250)]
+        yield self.client.mset(*[item for key in keys for item in (key,"1")])
+        it = self.client.scan_iter(match="tornado_redis:scan:*",count=50)
+        seen = set()
+        batches = 0
+        while True:
+            batch = yield it.next()
+            if batch is None:
+                break
+            batches += 1
+            seen.update(batch)
+            self.assertTrue(len(it.pages) <= 1)
+        self.assertEqual(seen,set(keys))
+        self.assertTrue(batches > 1)
+        self.assertEqual((yield it.next()),None)
+
+    @gen_test
+    def test_hscan_pairs(self):
+        yield self.client.send_command("del","tornado_redis:hscan")
+        fields = dict(("f%d" % i,str(i)) for i in xrange(300))
+        yield self.client.hmset("tornado_redis:hscan",*[item for pair in fields.items() for item in pair])
+        it = self.client.hscan_iter("tornado_redis:hscan",count=100)
+        seen = {}
+        while True:
+            batch = yield it.next()
+            if batch is None:
+                break
+            seen.update(batch)
+        self.assertEqual(seen,fields)
+
+    def test_each(self):
+        self.client.send_command("del","tornado_redis:zscan")
+        self.client.zadd("tornado_redis:zscan",1,"a",2.5,"b")
+        batches = []
+        self.client.zscan_iter("tornado_redis:zscan").each(batches.append,
+                                                           lambda error=None: self.stop(error))
+        self.assertEqual(self.wait(),None)
+        self.assertEqual(sorted(pair for batch in batches for pair in batch),[("a",1.0),("b",2.5)])
+
+    @gen_test
+    def test_zscan_memoryview_scores(self):
+        client = RedisClient(io_loop=self.io_loop,parser="python",bulk_as_memoryview=True)
+        try:
+            yield client.send_command("del","tornado_redis:zscan")
+            yield client.zadd("tornado_redis:zscan",1,"a",2.5,"b")
+            batch = yield client.zscan_iter("tornado_redis:zscan").next()
+        finally:
+            client.end()
+        self.assertEqual(sorted((member.tobytes(),score) for member,score in batch),[("a",1.0),("b",2.5)])
+
+if __name__ == '__main__':
+    unittest.main()
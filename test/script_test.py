@@ -0,0 +1,52 @@
+from tornado.testing import AsyncTestCase,gen_test
+import hashlib
+import unittest
+
+from tornado_redis.client import RedisClient
+
+INCR_BY = "return redis.call('incrby', KEYS[1], ARGV[1])"
+
+
+class ScriptTestCase(AsyncTestCase):
+    def setUp(self):
+        super(ScriptTestCase,self).setUp()
+        self.client = RedisClient(io_loop=self.io_loop)
+        self.script = self.client.register_script(INCR_BY)
+
+    def tearDown(self):
+        self.client.end()
+        super(ScriptTestCase,self).tearDown()
+
+    def test_sha(self):
+        self.assertEqual(self.script.sha,hashlib.sha1(INCR_BY).hexdigest())
+        self.assertTrue(self.client.register_script(INCR_BY) is self.script)
+
+    @gen_test
+    def test_loaded_on_ready(self):
+        yield self.client.set("tornado_redis:script","1")
+        exists = yield self.client.script("exists",self.script.sha)
+        self.assertEqual(exists,[1])
+        reply = yield self.script(keys=["tornado_redis:script"],args=[2])
+        self.assertEqual(reply,3)
+        self.assertEqual(self.script.fallbacks,0)
+
+    @gen_test
+    def test_noscript_falls_back_to_eval(self):
+        yield self.client.set("tornado_redis:script","1")
+        yield self.client.script("flush")
+        reply = yield self.script(keys=["tornado_redis:script"],args=[2])
+        self.assertEqual(reply,3)
+        self.assertEqual(self.script.fallbacks,1)
+        reply = yield self.script(keys=["tornado_redis:script"],args=[2])
+        self.assertEqual(reply,5)
+        self.assertEqual(self.script.fallbacks,1)
+
+    @gen_test
+    def test_load_scripts(self):
+        yield self.client.script("flush")
+        self.client.load_scripts()
+        exists = yield self.client.script("exists",self.script.sha)
+        self.assertEqual(exists,[1])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+from tornado.testing import AsyncTestCase
+import unittest
+
+from tornado_redis.sharding import HashRing,ShardedClient
+from tornado_redis.testing import ServerProcess
+
+BASE_PORT = 17200
+
+class HashRingTestCase(unittest.TestCase):
+    def test_hash_tags_share_a_node(self):
+        ring = HashRing([("a",1),("b",2),("c",3)])
+        self.assertEqual(ring.get_node("{user:1}:name"),ring.get_node("{user:1}:email"))
+
+    def test_adding_a_node_moves_few_keys(self):
+        nodes = [("10.0.0.%d" % i,6379) for i in range(4)]
+        keys = ["key:%d" % i for i in range(10000)]
+        ring = HashRing(nodes)
+        before = [ring.get_node(key) for key in keys]
+        ring.add_node(("10.0.0.4",6379))
+        after = [ring.get_node(key) for key in keys]
+        moved = [b for b,a in zip(before,after) if b != a]
+        # ideally 1/5 of the keys move, all of them to the new node
+        self.assertTrue(0.1 < len(moved) / 10000.0 < 0.3)
+        self.assertEqual(set(a for b,a in zip(before,after) if b != a),set([("10.0.0.4",6379)]))
+
+
+class ShardedClientTestCase(AsyncTestCase):
+    def setUp(self):
+        super(ShardedClientTestCase,self).setUp()
+        self.servers = [ServerProcess(BASE_PORT + i) for i in range(3)]
+        self.client = ShardedClient([s.address for s in self.servers],io_loop=self.io_loop)
+        self.client.on("error",self.stop)
+
+    def tearDown(self):
+        self.client.end()
+        for server in self.servers:
+            server.stop()
+        super(ShardedClientTestCase,self).tearDown()
+
+    def on_reply(self,reply,error=None):
+        self.stop((reply,error))
+
+    def test_split_multi_key(self):
+        keys = ["key:%d" % i for i in range(20)]
+        args = [item for key in keys for item in (key,key.upper())]
+        self.client.mset(*(args + [self.on_reply]))
+        self.assertEqual(self.wait(),("OK",None))
+        self.client.mget(*(keys + ["missing",self.on_reply]))
+        self.assertEqual(self.wait(),([key.upper() for key in keys] + [None],None))
+        self.assertEqual(len(set(self.client.ring.get_node(key) for key in keys)),3)
+        self.client.send_command("del",*(keys[:5] + ["missing",self.on_reply]))
+        self.assertEqual(self.wait(),(5,None))
+
+    def test_single_key(self):
+        self.client.set("a","1")
+        self.client.get("a",self.on_reply)
+        self.assertEqual(self.wait(),("1",None))
+
+    def test_unshardable(self):
+        self.assertRaises(ValueError,self.client.keys,"*")
+
+if __name__ == '__main__':
+    unittest.main()
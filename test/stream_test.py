@@ -1,11 +1,11 @@
-from tornado.testing import AsyncHTTPTestCase
+from tornado.testing import AsyncHTTPTestCase,AsyncTestCase
 from tornado.web import RequestHandler,Application
 import unittest
 
 import socket
 import sys
 sys.path.append('../')
-from stream import Stream
+from stream import Stream,SHRINK_AFTER
 
 class HelloHandler(RequestHandler):
     def get(self):
@@ -27,6 +27,97 @@ class StreamTestCase(AsyncHTTPTestCase):
         self.assertEquals(data.split("\r\n\r\n")[-1],"Hello")
         self.stop()
 
+class ShortSendSocket(object):
+    """Accepts at most 5 bytes per send to force partial writes."""
+    def __init__(self,sock):
+        self.sock = sock
+        self.sends = []
+
+    def send(self,data):
+        self.sends.append(data)
+        return self.sock.send(data[:5])
+
+    def __getattr__(self,name):
+        return getattr(self.sock,name)
+
+class StreamWriteTestCase(AsyncTestCase):
+    def setUp(self):
+        super(StreamWriteTestCase,self).setUp()
+        left,self.right = socket.socketpair()
+        self.left = ShortSendSocket(left)
+        self.sends = self.left.sends
+        self.stream = Stream(self.left,io_loop=self.io_loop)
+
+    def tearDown(self):
+        self.stream.close()
+        self.right.close()
+        super(StreamWriteTestCase,self).tearDown()
+
+    def read_all(self,size):
+        data = ""
+        while len(data) < size:
+            data += self.right.recv(size)
+        return data
+
+    def test_coalesced_partial_writes(self):
+        for word in ["hello ","there ","world"]:
+            self.stream.write(word)
+        self.assertEqual(self.sends,[])
+        self.stream.on("drain",self.stop)
+        self.wait()
+        self.assertEqual(self.sends[0],"hello there world")
+        self.assertEqual(self.read_all(17),"hello there world")
+        self.assertFalse(self.stream.writing())
+
+    def test_high_water_mark(self):
+        self.stream.write_high_water_mark = 10
+        self.stream.write("abc")
+        self.assertEqual(self.sends,[])
+        self.stream.write("defghijk")
+        self.assertEqual(self.read_all(11),"abcdefghijk")
+
+class StreamReadTestCase(AsyncTestCase):
+    def setUp(self):
+        super(StreamReadTestCase,self).setUp()
+        self.left,self.right = socket.socketpair()
+        self.received = []
+
+    def tearDown(self):
+        self.stream.close()
+        self.right.close()
+        super(StreamReadTestCase,self).tearDown()
+
+    def test_direct_dispatch(self):
+        self.stream = Stream(self.left,io_loop=self.io_loop,read_chunk_size=4,
+                             direct_dispatch=True)
+        self.stream.on("data",lambda data: self.received.append(data.tobytes()))
+        self.right.sendall("0123456789")
+        self.stream._handle_read()
+        self.assertEqual(self.received,["0123456789"])
+        # the buffer grew 4 -> 8 -> 16 bytes to take the reply in one dispatch
+        self.assertEqual(len(self.stream._read_buffer),16)
+        self.assertEqual(self.stream.bytes_read,10)
+
+    def test_adaptive_read_size(self):
+        self.stream = Stream(self.left,io_loop=self.io_loop,read_chunk_size=4,
+                             max_buffer_size=16)
+        self.assertEqual(self.stream._adapt_read_size(4,4),8)
+        self.assertEqual(self.stream._adapt_read_size(16,16),16)
+        size = 16
+        for i in range(SHRINK_AFTER):
+            size = self.stream._adapt_read_size(1,size)
+        self.assertEqual(size,8)
+
+    def test_deferred_dispatch(self):
+        self.stream = Stream(self.left,io_loop=self.io_loop,read_chunk_size=4)
+        self.stream.on("data",self.received.append)
+        self.right.sendall("0123456789")
+        self.stream._handle_read()
+        self.assertEqual(self.received,[])
+        self.io_loop.add_callback(self.stop)
+        self.wait()
+        self.assertEqual(self.received,["0123","456789"])
+
 if __name__ == '__main__':
     unittest.main()
     
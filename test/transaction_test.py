@@ -0,0 +1,73 @@
+from tornado.testing import AsyncTestCase,gen_test
+from tornado import gen
+import unittest
+
+from tornado_redis.client import RedisClient,WatchError
+
+
+class TransactionTestCase(AsyncTestCase):
+    def setUp(self):
+        super(TransactionTestCase,self).setUp()
+        self.client = RedisClient(io_loop=self.io_loop)
+        self.other = RedisClient(io_loop=self.io_loop)
+
+    def tearDown(self):
+        self.client.end()
+        self.other.end()
+        super(TransactionTestCase,self).tearDown()
+
+    @gen_test
+    def test_results_map_to_commands(self):
+        yield self.client.send_command("del","tornado_redis:tx")
+        results = []
+        tx = self.client.pipeline(transaction=True)
+        tx.incr("tornado_redis:tx",lambda reply,error=None: results.append(reply))
+        tx.hget("tornado_redis:tx","field",lambda reply,error=None: results.append(error))
+        tx.incrby("tornado_redis:tx",5,lambda reply,error=None: results.append(reply))
+        replies = yield tx.execute()
+        self.assertEqual(results[0],1)
+        self.assertTrue(isinstance(results[1],Exception))
+        self.assertEqual(results[2],6)
+        self.assertEqual(replies[2],6)
+
+    @gen_test
+    def test_queue_error_aborts(self):
+        errors = []
+        tx = self.client.pipeline(transaction=True)
+        tx.set("tornado_redis:tx","1",lambda reply,error=None: errors.append(error))
+        tx.send_command("set","tornado_redis:tx",lambda reply,error=None: errors.append(error))
+        with self.assertRaises(Exception):
+            yield tx.execute()
+        self.assertTrue(all(errors))
+        self.assertTrue(str(errors[1]).startswith("ERR"))
+
+    @gen_test
+    def test_watch_retries(self):
+        yield self.client.set("tornado_redis:tx","0")
+        attempts = []
+
+        @gen.coroutine
+        def increment(tx):
+            value = yield self.client.get("tornado_redis:tx")
+            if not attempts:
+                # another client changes the key after it was read
+                yield self.other.set("tornado_redis:tx","10")
+            attempts.append(value)
+            tx.set("tornado_redis:tx",int(value) + 1)
+
+        replies = yield self.client.transaction(increment,"tornado_redis:tx",backoff=0)
+        self.assertEqual(replies,["OK"])
+        self.assertEqual(attempts,["0","10"])
+        self.assertEqual((yield self.client.get("tornado_redis:tx")),"11")
+
+    @gen_test
+    def test_watch_gives_up(self):
+        def conflict(tx):
+            future = self.other.set("tornado_redis:tx","x")
+            tx.set("tornado_redis:tx","y")
+            return future
+        with self.assertRaises(WatchError):
+            yield self.client.transaction(conflict,"tornado_redis:tx",retries=2,backoff=0)
+
+if __name__ == '__main__':
+    unittest.main()
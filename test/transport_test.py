@@ -0,0 +1,136 @@
+from tornado import gen
+from tornado.concurrent import Future
+from tornado.testing import AsyncTestCase,gen_test
+import os
+import socket
+import tempfile
+import unittest
+
+from tornado_redis.client import RedisClient
+from tornado_redis.testing import ServerProcess
+
+PORT = 17500
+PATH = os.path.join(tempfile.gettempdir(),"tornado_redis_test.sock")
+
+def has_ipv6():
+    if not socket.has_ipv6:
+        return False
+    sock = socket.socket(socket.AF_INET6)
+    try:
+        sock.bind(("::1",0))
+        return True
+    except socket.error:
+        return False
+    finally:
+        sock.close()
+
+
+class TransportTestCase(AsyncTestCase):
+    def setUp(self):
+        super(TransportTestCase,self).setUp()
+        self.servers = []
+        self.clients = []
+
+    def tearDown(self):
+        for client in self.clients:
+            client.closing = True
+            client.end()
+        for server in self.servers:
+            server.stop()
+        super(TransportTestCase,self).tearDown()
+
+    def serve(self,**options):
+        server = ServerProcess(**options)
+        self.servers.append(server)
+        return server
+
+    def connect(self,*args,**options):
+        client = RedisClient(*args,io_loop=self.io_loop,**options)
+        self.clients.append(client)
+        future = Future()
+        client.once("ready",lambda: future.set_result(client))
+        return future
+
+    def event(self,client,name):
+        future = Future()
+        client.once(name,lambda *args: future.set_result(args))
+        return future
+
+    @gen_test
+    def test_unix_socket(self):
+        self.serve(path=PATH)
+        client = yield self.connect(unix_socket_path=PATH)
+        self.assertEqual(client.stream.socket.family,socket.AF_UNIX)
+        yield client.set("tornado_redis:unix","value")
+        self.assertEqual((yield client.get("tornado_redis:unix")),"value")
+
+    @unittest.skipUnless(has_ipv6(),"IPv6 loopback not available")
+    @gen_test
+    def test_ipv6(self):
+        self.serve(port=PORT,host="::1")
+        client = yield self.connect(PORT,"::1")
+        self.assertEqual(client.stream.socket.family,socket.AF_INET6)
+        yield client.set("tornado_redis:ipv6","value")
+        self.assertEqual((yield client.get("tornado_redis:ipv6")),"value")
+
+    @gen_test
+    def test_socket_options(self):
+        self.serve(port=PORT)
+        client = yield self.connect(PORT,tcp_keepalive=True,tcp_keepalive_idle=30,
+                                    receive_buffer_size=65536)
+        sock = client.stream.socket
+        self.assertTrue(sock.getsockopt(socket.IPPROTO_TCP,socket.TCP_NODELAY))
+        self.assertTrue(sock.getsockopt(socket.SOL_SOCKET,socket.SO_KEEPALIVE))
+        if hasattr(socket,"TCP_KEEPIDLE"):
+            self.assertEqual(sock.getsockopt(socket.IPPROTO_TCP,socket.TCP_KEEPIDLE),30)
+        # linux doubles the requested size for bookkeeping
+        self.assertGreaterEqual(sock.getsockopt(socket.SOL_SOCKET,socket.SO_RCVBUF),65536)
+
+        client = yield self.connect(PORT,tcp_nodelay=False)
+        self.assertFalse(client.stream.socket.getsockopt(socket.IPPROTO_TCP,socket.TCP_NODELAY))
+
+    @gen_test
+    def test_refused_unix_socket_reconnects(self):
+        if os.path.exists(PATH):
+            os.unlink(PATH)
+        client = RedisClient(unix_socket_path=PATH,io_loop=self.io_loop)
+        self.clients.append(client)
+        yield self.event(client,"reconnecting")
+        ready = self.event(client,"ready")
+        self.serve(path=PATH)
+        yield ready
+        self.assertEqual((yield client.ping()),"PONG")
+
+    @gen.coroutine
+    def restart(self,client,server_options):
+        """Restarts the server, sending a command while the client is offline."""
+        gone = self.event(client,"reconnecting")
+        self.servers.pop().stop()
+        yield gone
+        ready = self.event(client,"ready")
+        reply = client.set("tornado_redis:reconnect","again")
+        self.serve(**server_options)
+        yield ready
+        # commands sent while disconnected are replayed once ready
+        self.assertEqual((yield reply),"OK")
+        self.assertEqual((yield client.get("tornado_redis:reconnect")),"again")
+
+    @gen_test
+    def test_reconnect_tcp(self):
+        self.serve(port=PORT)
+        client = yield self.connect(PORT)
+        self.assertEqual((yield client.ping()),"PONG")
+        yield self.restart(client,{"port": PORT})
+        self.assertEqual(client.stats().connections,2)
+
+    @gen_test
+    def test_reconnect_unix(self):
+        self.serve(path=PATH)
+        client = yield self.connect(unix_socket_path=PATH)
+        self.assertEqual((yield client.ping()),"PONG")
+        yield self.restart(client,{"path": PATH})
+        self.assertEqual(client.stream.socket.family,socket.AF_UNIX)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,152 @@
+from tornado.concurrent import Future,dummy_executor
+from tornado.testing import AsyncTestCase,gen_test
+import time
+import unittest
+
+from tornado_redis.client import RedisClient
+from tornado_redis.values import ValueStore,ValueCodec,PLAIN,ZLIB
+
+try:
+    from concurrent.futures import ThreadPoolExecutor
+except ImportError:
+    ThreadPoolExecutor = None
+
+
+class DelayedExecutor(object):
+    """Runs each call on the IOLoop after `delay` seconds."""
+    def __init__(self,io_loop,delay):
+        self.io_loop = io_loop
+        self.delay = delay
+
+    def submit(self,fn,*args):
+        future = Future()
+        def run():
+            future.set_result(fn(*args))
+        self.io_loop.add_timeout(time.time() + self.delay,run)
+        return future
+
+
+class ValueStoreTestCase(AsyncTestCase):
+    def setUp(self):
+        super(ValueStoreTestCase,self).setUp()
+        self.client = RedisClient(io_loop=self.io_loop)
+
+    def tearDown(self):
+        self.client.end()
+        super(ValueStoreTestCase,self).tearDown()
+
+    @gen_test
+    def test_codecs_by_prefix(self):
+        store = ValueStore(self.client,"json",prefixes={"tornado_redis:values:p:": "pickle",
+                                                        "tornado_redis:values:p:raw:": "raw"})
+        yield store.set("tornado_redis:values:j",{"a": [1,2]})
+        yield store.set("tornado_redis:values:p:1",set([1,2]))
+        yield store.set("tornado_redis:values:p:raw:1",u"caf\xe9")
+        self.assertEqual((yield store.get("tornado_redis:values:j")),{"a": [1,2]})
+        self.assertEqual((yield store.get("tornado_redis:values:p:1")),set([1,2]))
+        self.assertEqual((yield store.get("tornado_redis:values:p:raw:1")),"caf\xc3\xa9")
+        # without compression the stored value is plain JSON
+        self.assertEqual((yield self.client.get("tornado_redis:values:j")),'{"a":[1,2]}')
+        self.assertIsNone((yield store.get("tornado_redis:values:missing")))
+
+    @gen_test
+    def test_compression_header(self):
+        store = ValueStore(self.client,"raw",compress_threshold=100)
+        big = "tornado " * 1000
+        yield store.set("tornado_redis:values:big",big)
+        yield store.set("tornado_redis:values:small","tornado")
+        stored = yield self.client.get("tornado_redis:values:big")
+        self.assertEqual(stored[:1],ZLIB)
+        self.assertLess(len(stored),len(big) / 10)
+        self.assertEqual((yield self.client.get("tornado_redis:values:small")),PLAIN + "tornado")
+        self.assertEqual((yield store.get("tornado_redis:values:big")),big)
+        self.assertEqual((yield store.get("tornado_redis:values:small")),"tornado")
+        self.assertEqual(store.codec.compressed,1)
+        self.assertEqual(store.codec.bytes_saved,len(big) - len(stored) + 1)
+
+    @gen_test
+    def test_header_bytes_kept_without_compression(self):
+        store = ValueStore(self.client,"raw")
+        yield store.set("tornado_redis:values:zero","\x00abc")
+        yield store.set("tornado_redis:values:one","\x01abc")
+        self.assertEqual((yield store.get("tornado_redis:values:zero")),"\x00abc")
+        self.assertEqual((yield store.get("tornado_redis:values:one")),"\x01abc")
+        self.assertEqual(ValueCodec("raw",compress_threshold=0).loads(PLAIN + "\x01abc"),"\x01abc")
+
+    @gen_test
+    def test_other_commands_pass_through(self):
+        store = ValueStore(self.client,"json")
+        yield store.set("tornado_redis:values:n",1)
+        self.assertEqual((yield store.incr("tornado_redis:values:n")),2)
+        self.assertEqual((yield store.get("tornado_redis:values:n")),2)
+        with self.assertRaises(AttributeError):
+            store.nonsense
+
+    @gen_test
+    def test_multi_key_and_hash(self):
+        store = ValueStore(self.client,"json",prefixes={"tornado_redis:values:z:": ValueCodec("json",10)})
+        yield store.mset({"tornado_redis:values:m1": [1],"tornado_redis:values:z:m2": {"b": "x" * 50}})
+        values = yield store.mget(["tornado_redis:values:m1","tornado_redis:values:z:m2","tornado_redis:values:none"])
+        self.assertEqual(values,[[1],{"b": "x" * 50},None])
+
+        yield self.client.send_command("del","tornado_redis:values:h")
+        yield store.hset("tornado_redis:values:h","f1",{"n": 1})
+        yield store.hset("tornado_redis:values:h","f2",[2])
+        self.assertEqual((yield store.hget("tornado_redis:values:h","f1")),{"n": 1})
+        self.assertEqual((yield store.hgetall("tornado_redis:values:h")),{"f1": {"n": 1},"f2": [2]})
+
+    @gen_test
+    def test_offload(self):
+        store = ValueStore(self.client,"pickle",executor=dummy_executor,offload_threshold=100)
+        yield store.set("tornado_redis:values:o",range(10))
+        self.assertEqual(store.offloaded,1)
+        self.assertEqual((yield store.get("tornado_redis:values:o")),range(10))
+        self.assertEqual(store.offloaded,1) # the pickle is under 100 bytes
+        yield store.set("tornado_redis:values:o","x")
+        self.assertEqual(store.offloaded,1)
+
+    @gen_test
+    def test_offloaded_writes_keep_their_order(self):
+        store = ValueStore(self.client,"raw",executor=DelayedExecutor(self.io_loop,.05),offload_threshold=100)
+        first = store.set("tornado_redis:values:order","x" * 200)
+        second = store.set("tornado_redis:values:order","small")
+        yield [first,second]
+        self.assertEqual((yield store.get("tornado_redis:values:order")),"small")
+
+    @gen_test
+    def test_reads_and_other_commands_wait_for_offloaded_writes(self):
+        store = ValueStore(self.client,"raw",executor=DelayedExecutor(self.io_loop,.05),offload_threshold=100)
+        yield store.set("tornado_redis:values:order","old")
+        big = "x" * 200
+        store.set("tornado_redis:values:order",big)
+        self.assertEqual((yield store.get("tornado_redis:values:order")),big)
+
+        store.set("tornado_redis:values:order",big)
+        yield store.expire("tornado_redis:values:order",100)
+        self.assertGreater((yield self.client.ttl("tornado_redis:values:order")),0)
+
+    @gen_test
+    def test_set_with_trailing_callback(self):
+        store = ValueStore(self.client,"json")
+        done = Future()
+        store.set("tornado_redis:values:cb",[1],"EX",100,lambda reply,error=None: done.set_result((reply,error)))
+        self.assertEqual((yield done),("OK",None))
+        self.assertGreater((yield self.client.ttl("tornado_redis:values:cb")),0)
+
+    @unittest.skipIf(ThreadPoolExecutor is None,"concurrent.futures not installed")
+    @gen_test
+    def test_thread_pool(self):
+        executor = ThreadPoolExecutor(2)
+        try:
+            store = ValueStore(self.client,"json",compress_threshold=1024,executor=executor,
+                               offload_threshold=1024)
+            value = {"k%d" % i: "v" * 100 for i in xrange(1000)}
+            yield store.set("tornado_redis:values:pool",value)
+            self.assertEqual((yield store.get("tornado_redis:values:pool")),value)
+            self.assertGreaterEqual(store.offloaded,1)
+        finally:
+            executor.shutdown()
+
+
+if __name__ == '__main__':
+    unittest.main()
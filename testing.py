@@ -0,0 +1,336 @@
+"""A small RESP server that stands in for Redis in tests.
+
+It keeps string and hash values in memory and understands enough of the
+protocol to exercise the client: basic string, hash and key commands,
+channel pub/sub, INFO for the ready check and, when given a slot map, the cluster
+redirects (MOVED, ASK and ASKING) and CLUSTER SLOTS. Each server can run
+in its own process, so several of them make a local fake cluster.
+"""
+from cluster import key_slot
+import SocketServer
+import multiprocessing
+import os
+import socket
+import threading
+
+CLUSTER_SLOTS = 16384
+
+class ReplyError(Exception):
+    pass
+
+def read_request(rfile):
+    line = rfile.readline()
+    if not line:
+        return None
+    if line[0] != '*':
+        # inline command
+        return line.split()
+    args = []
+    for i in xrange(int(line[1:])):
+        length = int(rfile.readline()[1:])
+        args.append(rfile.read(length + 2)[:-2])
+    return args
+
+def encode_reply(reply):
+    if reply is None:
+        return "$-1\r\n"
+    if isinstance(reply,Status):
+        return "+%s\r\n" % reply
+    if isinstance(reply,ReplyError):
+        return "-%s\r\n" % reply
+    if isinstance(reply,(int,long)):
+        return ":%d\r\n" % reply
+    if isinstance(reply,(list,tuple)):
+        return "*%d\r\n%s" % (len(reply),"".join([encode_reply(r) for r in reply]))
+    reply = str(reply)
+    return "$%d\r\n%s\r\n" % (len(reply),reply)
+
+class Status(str):
+    pass
+
+OK = Status("OK")
+
+# Returned by commands that have already written their replies.
+NO_REPLY = object()
+
+
+class RespHandler(SocketServer.StreamRequestHandler):
+    def setup(self):
+        SocketServer.StreamRequestHandler.setup(self)
+        # replies larger than a segment would otherwise wait out the peer's delayed ACK
+        if self.connection.family != socket.AF_UNIX:
+            self.connection.setsockopt(socket.IPPROTO_TCP,socket.TCP_NODELAY,1)
+        self.write_lock = threading.Lock()
+        self.channels = set()
+
+    def finish(self):
+        with self.server.subscribers_lock:
+            for channel in self.channels:
+                self.server.subscribers[channel].discard(self)
+        try:
+            SocketServer.StreamRequestHandler.finish(self)
+        except socket.error:
+            pass
+
+    def send(self,data):
+        with self.write_lock:
+            self.wfile.write(data)
+            self.wfile.flush()
+
+    def handle(self):
+        self.asking = False
+        while True:
+            try:
+                request = read_request(self.rfile)
+            except (socket.error,ValueError):
+                return
+            if not request:
+                return
+            try:
+                reply = self.server.execute(self,request[0].lower(),request[1:])
+            except ReplyError,e:
+                reply = e
+            except Exception,e:
+                reply = ReplyError("ERR %s" % e)
+            if reply is NO_REPLY:
+                continue
+            try:
+                self.send(encode_reply(reply))
+            except socket.error:
+                return
+
+
+class RespServer(SocketServer.ThreadingMixIn,SocketServer.TCPServer):
+    """Serves RESP on `address` from an in-memory dict.
+
+    `slots` is a list of (start, end, (host, port)) ranges covering the
+    cluster; keys in slots owned by another address get a MOVED reply.
+    `migrating` maps slots this node is moving away to their new owner
+    (keys missing here get an ASK reply); `importing` lists slots this
+    node serves only after an ASKING command. `info` adds fields to the
+    INFO reply, e.g. to pose as a replica.
+    `address` may also be a unix socket path or an IPv6 (host, port).
+    """
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self,address,slots=None,migrating=None,importing=(),info=None):
+        if isinstance(address,basestring):
+            self.address_family = socket.AF_UNIX
+            if os.path.exists(address):
+                os.unlink(address)
+        elif ":" in address[0]:
+            self.address_family = socket.AF_INET6
+        SocketServer.TCPServer.__init__(self,address,RespHandler)
+        self.data = {}
+        self.slots = slots
+        self.migrating = migrating or {}
+        self.importing = set(importing)
+        self.info = info or {}
+        self.subscribers = {}
+        self.subscribers_lock = threading.Lock()
+        self.owners = None
+        if slots:
+            self.owners = [None] * CLUSTER_SLOTS
+            for start,end,owner in slots:
+                self.owners[start:end+1] = [tuple(owner)] * (end - start + 1)
+
+    @property
+    def address(self):
+        if self.address_family == socket.AF_UNIX:
+            return self.server_address
+        return self.server_address[:2]
+
+    def execute(self,handler,command,args):
+        if command == "asking":
+            handler.asking = True
+            return OK
+        if self.owners is not None and command != "cluster":
+            self.check_slot(handler,command,args)
+        handler.asking = False
+        if command in ("subscribe","unsubscribe"):
+            return getattr(self,"cmd_" + command)(handler,*args)
+        method = getattr(self,"cmd_" + command,None)
+        if method is None:
+            raise ReplyError("ERR unknown command '%s'" % command)
+        return method(*args)
+
+    def check_slot(self,handler,command,args):
+        if not args or command in ("ping","echo","info","flushdb","flushall","dbsize","config"):
+            return
+        keys = args[::2] if command == "mset" else (args if command in ("mget","del") else args[:1])
+        slots = set(key_slot(key) for key in keys)
+        if len(slots) > 1:
+            raise ReplyError("CROSSSLOT Keys in request don't hash to the same slot")
+        slot = slots.pop()
+        if slot in self.importing and handler.asking:
+            return
+        if slot in self.migrating and not all(key in self.data for key in keys):
+            raise ReplyError("ASK %d %s:%d" % ((slot,) + self.migrating[slot]))
+        owner = self.owners[slot]
+        if owner != self.address:
+            raise ReplyError("MOVED %d %s:%d" % ((slot,) + owner))
+
+    #### Commands ####
+
+    def cmd_ping(self,*args):
+        return Status("PONG")
+
+    def cmd_echo(self,value):
+        return value
+
+    def cmd_info(self,*args):
+        fields = [("redis_version","2.6.0"),("loading","0")] + sorted(self.info.items())
+        return "".join(["%s:%s\r\n" % field for field in fields])
+
+    def cmd_flushdb(self):
+        self.data.clear()
+        return OK
+
+    def cmd_dbsize(self):
+        return len(self.data)
+
+    def cmd_scan(self,cursor,*args):
+        return ["0",sorted(self.data)]
+
+    def cmd_get(self,key):
+        return self.data.get(key)
+
+    def cmd_set(self,key,value,*args):
+        self.data[key] = value
+        return OK
+
+    def cmd_mget(self,*keys):
+        return [self.data.get(key) for key in keys]
+
+    def cmd_mset(self,*args):
+        for i in xrange(0,len(args),2):
+            self.data[args[i]] = args[i+1]
+        return OK
+
+    def cmd_del(self,*keys):
+        return len([self.data.pop(key) for key in keys if key in self.data])
+
+    def cmd_exists(self,key):
+        return int(key in self.data)
+
+    def cmd_incr(self,key):
+        return self.cmd_incrby(key,1)
+
+    def cmd_incrby(self,key,amount):
+        value = int(self.data.get(key,0)) + int(amount)
+        self.data[key] = str(value)
+        return value
+
+    def cmd_hset(self,key,field,value):
+        h = self.data.setdefault(key,{})
+        new = field not in h
+        h[field] = value
+        return int(new)
+
+    def cmd_hget(self,key,field):
+        return self.data.get(key,{}).get(field)
+
+    def cmd_hgetall(self,key):
+        return [item for pair in self.data.get(key,{}).iteritems() for item in pair]
+
+    def cmd_hmset(self,key,*args):
+        h = self.data.setdefault(key,{})
+        for i in xrange(0,len(args),2):
+            h[args[i]] = args[i+1]
+        return OK
+
+    def cmd_subscribe(self,handler,*channels):
+        for channel in channels:
+            with self.subscribers_lock:
+                self.subscribers.setdefault(channel,set()).add(handler)
+            handler.channels.add(channel)
+            handler.send(encode_reply(["subscribe",channel,len(handler.channels)]))
+        return NO_REPLY
+
+    def cmd_unsubscribe(self,handler,*channels):
+        for channel in channels or list(handler.channels):
+            with self.subscribers_lock:
+                self.subscribers.get(channel,set()).discard(handler)
+            handler.channels.discard(channel)
+            try:
+                handler.send(encode_reply(["unsubscribe",channel,len(handler.channels)]))
+            except (socket.error,ValueError):
+                pass
+        return NO_REPLY
+
+    def cmd_publish(self,channel,message):
+        with self.subscribers_lock:
+            handlers = list(self.subscribers.get(channel,()))
+        data = encode_reply(["message",channel,message])
+        for handler in handlers:
+            try:
+                handler.send(data)
+            except (socket.error,ValueError):
+                pass
+        return len(handlers)
+
+    def cmd_cluster(self,subcommand,*args):
+        subcommand = subcommand.lower()
+        if subcommand == "slots" and self.slots:
+            return [[start,end,[owner[0],owner[1]]] for start,end,owner in self.slots]
+        raise ReplyError("ERR unsupported CLUSTER subcommand")
+
+
+def serve(address,ready=None,**options):
+    server = RespServer(address,**options)
+    if ready is not None:
+        ready.set()
+    server.serve_forever()
+
+class ServerProcess(object):
+    """Runs a RespServer in a child process, on a unix socket if `path` is given."""
+    def __init__(self,port=None,host="127.0.0.1",path=None,**options):
+        self.address = path or (host,port)
+        ready = multiprocessing.Event()
+        self.process = multiprocessing.Process(target=serve,args=(self.address,ready),kwargs=options)
+        self.process.daemon = True
+        self.process.start()
+        if not ready.wait(5):
+            raise RuntimeError("RESP stand-in on %s did not start" % (self.address,))
+
+    def stop(self):
+        self.process.terminate()
+        self.process.join()
+
+class FakeCluster(object):
+    """Splits the slot space evenly over `size` RespServer processes.
+
+    Node i listens on `base_port` + i. `migrating` maps a slot to the
+    index of the node it is moving to: the current owner answers ASK
+    for keys it does not hold and the target accepts them after ASKING.
+    """
+    def __init__(self,base_port,size=3,host="127.0.0.1",migrating=None):
+        migrating = migrating or {}
+        self.addresses = [(host,base_port + i) for i in xrange(size)]
+        step = CLUSTER_SLOTS // size
+        self.slots = []
+        for i,address in enumerate(self.addresses):
+            end = CLUSTER_SLOTS - 1 if i == size - 1 else (i + 1) * step - 1
+            self.slots.append((i * step,end,address))
+
+        self.nodes = []
+        for i,address in enumerate(self.addresses):
+            node_migrating = {}
+            node_importing = []
+            for slot,target in migrating.iteritems():
+                if self.owner(slot) == address:
+                    node_migrating[slot] = self.addresses[target]
+                if self.addresses[target] == address:
+                    node_importing.append(slot)
+            self.nodes.append(ServerProcess(address[1],host,slots=self.slots,
+                                            migrating=node_migrating,importing=node_importing))
+
+    def owner(self,slot):
+        for start,end,address in self.slots:
+            if start <= slot <= end:
+                return address
+
+    def stop(self):
+        for node in self.nodes:
+            node.stop()
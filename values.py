@@ -0,0 +1,311 @@
+"""Serialized values on top of RedisClient.
+
+A ValueStore encodes values with a codec before writing them and
+decodes them in replies, so callers deal in objects instead of strings.
+Codecs are chosen per store and may be overridden for keys starting
+with given prefixes, the longest matching prefix winning:
+
+    store = ValueStore(client,"json",prefixes={"session:": "pickle",
+                                               "blob:": ValueCodec("raw",compress_threshold=4096)})
+    yield store.set("session:1",{"user": 1})
+    session = yield store.get("session:1")
+
+With a `compress_threshold`, every value the codec writes starts with a
+header byte: PLAIN, or ZLIB when the serialized value reached the
+threshold and compressing it saved space. Without one values are
+stored exactly as serialized, so other clients can read them, and
+read back without looking for a header.
+
+Commands the store does not encode pass through to the client
+unchanged, so `store.incr(key)` or `store.expire(key,60)` work as on
+the client itself.
+
+Given an `executor` (e.g. a concurrent.futures.ThreadPoolExecutor),
+values of at least `offload_threshold` bytes are encoded and decoded on
+it so large payloads do not stall the IOLoop. The size of a value about
+to be encoded is estimated: the length of a string, or ITEM_SIZE bytes
+per item of a container; other values are encoded inline. Commands
+issued through the store still go out in call order: a GET or EXPIRE
+after a SET waits for that SET's value to be encoded.
+
+The client must not be created with decode_replies, which would turn
+binary values into unicode.
+"""
+from client import COMMANDS,future_callback
+from tornado.concurrent import Future
+from tornado.ioloop import IOLoop
+import cPickle
+import collections
+import functools
+import json
+import operator
+import zlib
+
+PLAIN = "\x00"
+ZLIB = "\x01"
+
+# Guessed serialized size of one item of a list, tuple, set or dict.
+ITEM_SIZE = 64
+
+class RawCodec(object):
+    """Strings as they are; unicode as utf-8 and anything else through str()."""
+    def dumps(self,value):
+        t = type(value)
+        if t is str:
+            return value
+        if t is unicode:
+            return value.encode("utf-8")
+        return str(value)
+
+    def loads(self,data):
+        return data
+
+class JsonCodec(object):
+    def dumps(self,value):
+        return json.dumps(value,separators=(",",":"))
+
+    def loads(self,data):
+        return json.loads(data)
+
+class PickleCodec(object):
+    """Only for data written by trusted clients: loading a pickle can run code."""
+    def dumps(self,value):
+        return cPickle.dumps(value,cPickle.HIGHEST_PROTOCOL)
+
+    def loads(self,data):
+        return cPickle.loads(data)
+
+CODECS = {"raw": RawCodec,"json": JsonCodec,"pickle": PickleCodec}
+
+class ValueCodec(object):
+    """A serializer, by name or instance, plus optional zlib compression."""
+    def __init__(self,serializer="raw",compress_threshold=None,compress_level=6):
+        if isinstance(serializer,basestring):
+            if serializer not in CODECS:
+                raise ValueError("Unknown codec %s, expected one of %s" % (serializer,", ".join(CODECS)))
+            serializer = CODECS[serializer]()
+        self.serializer = serializer
+        self.compress_threshold = compress_threshold
+        self.compress_level = compress_level
+        self.compressed = 0
+        self.bytes_saved = 0
+
+    def dumps(self,value):
+        data = self.serializer.dumps(value)
+        if self.compress_threshold is None:
+            return data
+        if len(data) >= self.compress_threshold:
+            compressed = zlib.compress(data,self.compress_level)
+            if len(compressed) < len(data):
+                self.compressed += 1
+                self.bytes_saved += len(data) - len(compressed)
+                return ZLIB + compressed
+        return PLAIN + data
+
+    def loads(self,data):
+        if type(data) is memoryview:
+            data = data.tobytes()
+        if self.compress_threshold is None:
+            return self.serializer.loads(data)
+        header = data[:1]
+        if header == ZLIB:
+            data = zlib.decompress(data[1:])
+        elif header == PLAIN:
+            data = data[1:]
+        return self.serializer.loads(data)
+
+def estimated_size(value):
+    if isinstance(value,basestring):
+        return len(value)
+    if isinstance(value,(list,tuple,set,dict)):
+        return len(value) * ITEM_SIZE
+    return 0
+
+class ValueStore(object):
+    """get/set/mget/mset/hget/hset/hgetall on `client` with encoded values.
+
+    Every method takes an optional callback(value, error=None) and
+    returns a Future without one, like RedisClient's commands.
+    """
+    def __init__(self,client,codec="raw",prefixes=None,compress_threshold=None,
+                 compress_level=6,executor=None,offload_threshold=1024 * 1024):
+        self.client = client
+        self.io_loop = client.options.io_loop or IOLoop.instance()
+        self.compress_threshold = compress_threshold
+        self.compress_level = compress_level
+        self.codec = self.make_codec(codec)
+        # longest prefixes first, so the first match is the most specific
+        self.prefixes = sorted(((prefix,self.make_codec(spec)) for prefix,spec in (prefixes or {}).iteritems()),
+                               key=lambda item: -len(item[0]))
+        self.executor = executor
+        self.offload_threshold = offload_threshold
+        self.offloaded = 0
+        self.sends = collections.deque()
+
+    def __getattr__(self,name):
+        if name in COMMANDS:
+            return functools.partial(self.send_command,name)
+        else:
+            raise AttributeError(name)
+
+    def send_command(self,command,*args):
+        """Sends a command with its arguments unchanged, in order with the store's other commands."""
+        args = list(args)
+        callback = args.pop(-1) if args and operator.isCallable(args[-1]) else None
+        return self.ordered(callback,lambda data,callback:
+            self.client.send_command(command,*(args + [callback])))
+
+    def make_codec(self,spec):
+        if isinstance(spec,ValueCodec):
+            return spec
+        return ValueCodec(spec,self.compress_threshold,self.compress_level)
+
+    def codec_for(self,key):
+        for prefix,codec in self.prefixes:
+            if key.startswith(prefix):
+                return codec
+        return self.codec
+
+    #### Encoding ####
+
+    def run(self,fn,arg,size,callback):
+        """Calls callback(fn(arg), error), on the executor if `size` is large enough."""
+        if self.executor is not None and size >= self.offload_threshold:
+            self.offloaded += 1
+            future = self.executor.submit(fn,arg)
+            future.add_done_callback(lambda future: self.io_loop.add_callback(
+                functools.partial(self.on_offloaded,future,callback)))
+            return
+        try:
+            result = fn(arg)
+        except Exception,e:
+            callback(None,e)
+            return
+        callback(result,None)
+
+    def on_offloaded(self,future,callback):
+        error = future.exception()
+        callback(None if error is not None else future.result(),error)
+
+    def encode(self,key,value,callback):
+        self.run(self.codec_for(key).dumps,value,estimated_size(value),callback)
+
+    def decode(self,key,data,callback):
+        if data is None:
+            callback(None,None)
+        else:
+            self.run(self.codec_for(key).loads,data,len(data),callback)
+
+    def run_all(self,step,pairs,callback):
+        """Runs step(key, item, callback) over (key, item) pairs; calls callback(results, error)."""
+        results = [None] * len(pairs)
+        state = {"remaining": len(pairs),"error": None}
+        if not pairs:
+            callback(results,None)
+            return
+        def on_result(i,result,error):
+            results[i] = result
+            state["error"] = state["error"] or error
+            state["remaining"] -= 1
+            if not state["remaining"]:
+                callback(results,state["error"])
+        for i,(key,item) in enumerate(pairs):
+            step(key,item,functools.partial(on_result,i))
+
+    #### Commands ####
+
+    def decoded(self,callback,keys,reply,error=None):
+        if error is not None:
+            callback(None,error=error)
+        elif isinstance(keys,basestring):
+            self.decode(keys,reply,lambda value,error: callback(value,error=error))
+        else:
+            self.run_all(self.decode,zip(keys,reply),lambda values,error: callback(values,error=error))
+
+    def decoding(self,callback,keys,*args):
+        """Sends a command and decodes its reply: one value for a key, a list for a list of keys."""
+        return self.ordered(callback,lambda data,callback:
+            self.client.send_command(*(args + (functools.partial(self.decoded,callback,keys),))))
+
+    def ordered(self,callback,send):
+        """Calls send(None, callback) once every command issued before it is sent."""
+        future = None
+        if callback is None:
+            future = Future()
+            callback = future_callback(future)
+        self.sends.append([True,None,send,callback])
+        self.flush_sends()
+        return future
+
+    def encoding(self,callback,pairs,send):
+        """Encodes (key, value) pairs, then calls send(list of data, callback).
+
+        Sends happen in call order, for every command issued through the
+        store, even when an earlier value is still being encoded on the
+        executor: a read or EXPIRE after a write sees that write.
+        """
+        future = None
+        if callback is None:
+            future = Future()
+            callback = future_callback(future)
+        entry = [None,None,send,callback]
+        self.sends.append(entry)
+        def on_encoded(data,error):
+            entry[0] = True
+            entry[1] = data if error is None else error
+            self.flush_sends()
+        self.run_all(self.encode,pairs,on_encoded)
+        return future
+
+    def flush_sends(self):
+        while self.sends and self.sends[0][0]:
+            done,data,send,callback = self.sends.popleft()
+            if isinstance(data,Exception):
+                callback(None,error=data)
+            else:
+                send(data,callback)
+
+    def get(self,key,callback=None):
+        return self.decoding(callback,key,"get",key)
+
+    def set(self,key,value,*args,**kwargs):
+        """SET with an encoded value; further args (EX, NX, ...) are passed on."""
+        args = list(args)
+        callback = kwargs.get("callback")
+        if callback is None and args and operator.isCallable(args[-1]):
+            callback = args.pop(-1)
+        return self.encoding(callback,[(key,value)],
+            lambda data,callback: self.client.send_command("set",key,data[0],*(args + [callback])))
+
+    def mget(self,keys,callback=None):
+        keys = list(keys)
+        return self.decoding(callback,keys,"mget",*keys)
+
+    def mset(self,mapping,callback=None):
+        pairs = list(mapping.iteritems())
+        def send(data,callback):
+            args = []
+            for (key,value),item in zip(pairs,data):
+                args += [key,item]
+            self.client.send_command("mset",*(args + [callback]))
+        return self.encoding(callback,pairs,send)
+
+    def hget(self,key,field,callback=None):
+        return self.decoding(callback,key,"hget",key,field)
+
+    def hset(self,key,field,value,callback=None):
+        return self.encoding(callback,[(key,value)],
+            lambda data,callback: self.client.send_command("hset",key,field,data[0],callback))
+
+    def hgetall(self,key,callback=None):
+        """A dict of the hash's fields to their decoded values."""
+        def on_reply(callback,reply,error=None):
+            if error is not None:
+                callback(None,error=error)
+                return
+            fields = list(reply)
+            self.run_all(self.decode,[(key,reply[field]) for field in fields],
+                         lambda values,error: callback(dict(zip(fields,values)) if error is None else None,
+                                                       error=error))
+        return self.ordered(callback,lambda data,callback:
+            self.client.send_command("hgetall",key,functools.partial(on_reply,callback)))